@@ -0,0 +1,253 @@
+"""
+
+Adaptive parameter sweeps: start from a coarse grid over the varied parameters of a sweep spec (see SweepSpec.py) and
+spend more runs only where neighbouring runs give very different results
+
+Most of a parameter space usually changes the cooling time and final crust thickness smoothly, while a few narrow regions
+(e.g. where quenching or heating starts to win) change them sharply, so a fine grid spends most of its runs where nothing
+happens. Here the coarse grid (levels values of each varied range) is run first, then the results of every pair of
+neighbouring runs (runs one grid step apart along one varied range) are compared. The pairs whose outputs differ by more
+than the tolerance (relative difference of the largest output, a failed run next to a finished one counts as 1) get a new
+run half way between them, and the new pairs are compared again, until no pair is above the tolerance, the pairs are
+maxDepth halvings apart or the sweep has used budget runs. Parameters given as value lists are not refined (every grid
+run is done for every value).
+
+The refinement settings are a refine section of the spec, e.g. in JSON
+
+    {"runNumberStart": 1,
+     "fixed": {...},
+     "varied": {"HeatingRate": {"min": 1e9, "max": 1e13, "scale": "log"}, "Emissivity": {"values": [0.5, 1.0]}},
+     "refine": {"levels": 5, "tolerance": 0.05, "budget": 200, "maxDepth": 6,
+                "outputs": ["Total Cooling Time (yrs)", "Final Crustal Thickness (m)"]}}
+
+The runs are done with SweepExecutor (each round runs the new runs, runs of earlier rounds are kept through the manifest),
+so the sweep writes the same GrandScoreCard.csv and SweepLog.csv as any other sweep, and an interrupted adaptive sweep
+started again redoes the same refinement without running the finished runs again. Run a spec with
+
+    python AdaptiveSweep.py mySweep.json [maxWorkers]
+
+from the directory of the sweep.
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import os
+import sys
+import itertools
+
+import MAIN
+import SweepSpec as SS
+import SweepExecutor as SE
+
+RefineDefaults = {'levels': 3,                                                                          # Values of each varied range in the coarse grid
+                  'tolerance': 0.1,                                                                     # Largest relative difference of neighbouring runs left unrefined
+                  'budget': 100,                                                                        # Largest number of runs in the sweep
+                  'maxDepth': 6,                                                                        # Largest number of halvings of a coarse grid step
+                  'outputs': ['Total Cooling Time (yrs)', 'Final Crustal Thickness (m)']}               # Scorecard columns compared
+
+
+# Refinement settings of a spec (defaults for the ones not given); raise ValueError for unknown settings or outputs
+def RefineSettings(spec):
+
+    refine = dict(RefineDefaults)
+
+    for name, value in spec.get('refine', {}).items():
+
+        if name not in RefineDefaults:
+            raise ValueError('Unknown refine setting in sweep spec: %s' % name)
+
+        refine[name] = value
+
+    for output in refine['outputs']:
+        if output not in MAIN.ScoreCardColumnNames:
+            raise ValueError('Not a scorecard column: %s' % output)
+
+    return refine
+
+
+class AdaptiveSweep(object):
+
+    # Grid points are tuples of integer coordinates, one per varied parameter (in sorted order): for a range, the position on a
+    # lattice with 2^maxDepth steps between coarse grid values; for a value list, the index of the value
+    def __init__(self, spec, UserPath):
+
+        SS.CheckSweepSpec(spec)
+
+        self.spec = spec
+        self.UserPath = UserPath
+        self.refine = RefineSettings(spec)
+        self.varied = spec.get('varied', {})
+        self.names = sorted(self.varied)
+
+        self.steps = []                                                 # Lattice steps across each range (0 for value lists and single values)
+        self.sizes = []                                                 # Number of coarse grid values of each varied parameter
+
+        for name in self.names:
+
+            varied = self.varied[name]
+
+            if 'values' in varied:
+                self.steps.append(0)
+                self.sizes.append(len(varied['values']))
+            else:
+                levels = int(varied.get('levels', self.refine['levels']))
+                self.steps.append((levels - 1) * 2**int(self.refine['maxDepth']))
+                self.sizes.append(levels)
+
+        self.points = []                                                # Grid points of the runs (in run order)
+        self.jobs = []                                                  # Input parameter dictionaries of the runs
+        self._runIndex = {}                                             # Run index of each grid point
+        self.edges = []                                                 # Pairs of neighbouring grid points (run indices) not yet split
+        self.results = []                                               # JobResults of the runs done so far
+
+    # Values of the varied parameters at a grid point
+    def PointValues(self, point):
+
+        values = {}
+
+        for name, step, coordinate in zip(self.names, self.steps, point):
+
+            varied = self.varied[name]
+
+            if 'values' in varied:
+                values[name] = varied['values'][coordinate]
+            elif step == 0:
+                values[name] = SS.ValueAt(varied, 0.5)
+            else:
+                values[name] = SS.ValueAt(varied, coordinate / step)
+
+        return values
+
+    # Add a run at a grid point (if there is not one already) and return its index
+    def AddPoint(self, point):
+
+        if point in self._runIndex:
+            return self._runIndex[point]
+
+        runNumber = int(self.spec.get('runNumberStart', 1)) + len(self.points)
+
+        self._runIndex[point] = len(self.points)
+        self.points.append(point)
+        self.jobs.extend(SS.JobsFromPoints(self.spec, [self.PointValues(point)], self.UserPath, runNumber))
+
+        return self._runIndex[point]
+
+    # Runs of the coarse grid and the pairs of neighbouring coarse grid runs along every range
+    def CoarseGrid(self):
+
+        spacing = [step // (size - 1) if step > 0 else 1 for step, size in zip(self.steps, self.sizes)]
+
+        for index in itertools.product(*[range(size) for size in self.sizes]):
+            self.AddPoint(tuple(i * d for i, d in zip(index, spacing)))
+
+        for point in list(self.points):
+            for axis, step in enumerate(self.steps):
+
+                if step > 0 and point[axis] + spacing[axis] <= step:
+
+                    neighbour = list(point)
+                    neighbour[axis] += spacing[axis]
+
+                    self.edges.append((self._runIndex[point], self._runIndex[tuple(neighbour)]))
+
+    # Output values of a run (None for a failed run or one with non-finite outputs)
+    def Outputs(self, idx):
+
+        result = self.results[idx]
+
+        if result is None or result.scoreCard is None:
+            return None
+
+        outputs = np.array([result.scoreCard[MAIN.ScoreCardColumnNames.index(name)] for name in self.refine['outputs']])
+
+        return outputs if np.all(np.isfinite(outputs)) else None
+
+    # Largest relative difference of the outputs of the two runs of a pair (1 if only one of them finished, 0 if neither did)
+    def EdgeScore(self, edge):
+
+        a, b = self.Outputs(edge[0]), self.Outputs(edge[1])
+
+        if a is None or b is None:
+            return 0. if a is None and b is None else 1.
+
+        scale = np.maximum(np.abs(a), np.abs(b))
+        scale[scale == 0] = 1.
+
+        return float(np.max(np.abs(a - b) / scale))
+
+    # Axis and lattice length of a pair of neighbouring runs
+    def _EdgeAxis(self, edge):
+
+        a, b = self.points[edge[0]], self.points[edge[1]]
+        axis = [i for i in range(len(a)) if a[i] != b[i]][0]
+
+        return axis, abs(b[axis] - a[axis])
+
+    # Split the pairs above the tolerance with the largest differences (at most count of them) and return the number of new runs
+    def Refine(self, count):
+
+        scored = []
+
+        for edge in self.edges:
+
+            axis, length = self._EdgeAxis(edge)
+            score = self.EdgeScore(edge)
+
+            if length >= 2 and score > self.refine['tolerance']:
+                scored.append((score, edge))
+
+        scored.sort(key=lambda item: -item[0])
+        split = [edge for score, edge in scored[:count]]
+
+        numPoints = len(self.points)
+
+        for edge in split:
+
+            axis, length = self._EdgeAxis(edge)
+
+            midpoint = list(self.points[edge[0]])
+            midpoint[axis] = (self.points[edge[0]][axis] + self.points[edge[1]][axis]) // 2
+
+            idx = self.AddPoint(tuple(midpoint))
+
+            self.edges.remove(edge)
+            self.edges.extend([(edge[0], idx), (idx, edge[1])])
+
+        return len(self.points) - numPoints
+
+    # Run the coarse grid, then refine until no pair of neighbouring runs is above the tolerance or the budget is used
+    # Returns the JobResults of every run (in run order)
+    def Run(self, executor=None):
+
+        executor = executor if executor is not None else SE.SweepExecutor()
+        budget = int(self.refine['budget'])
+
+        self.CoarseGrid()
+
+        if len(self.points) > budget:
+            raise ValueError('Coarse grid of the adaptive sweep has %d runs, more than the budget of %d' % (len(self.points), budget))
+
+        while True:
+
+            # Runs of earlier rounds are taken from the manifest, so each round only runs the new runs
+            self.results = executor.Run(self.jobs, self.UserPath)
+
+            # One new run per worker in each round (the largest differences first)
+            count = min(executor.maxWorkers, budget - len(self.points))
+
+            if count <= 0 or self.Refine(count) == 0:
+                break
+
+        return self.results
+
+
+if __name__ == '__main__':
+
+    UserPath = os.getcwd() + '/'
+
+    sweep = AdaptiveSweep(SS.LoadSweepSpec(sys.argv[1]), UserPath)
+
+    sweep.Run(SE.SweepExecutor(int(sys.argv[2]) if len(sys.argv) > 2 else None))
@@ -0,0 +1,95 @@
+"""
+
+Checkpoints of the cooling loop of MAIN.run_simulation
+
+Long runs (many volume increments, impacts) can save the state of the loop at the end of an increment every so many
+increments or every so many seconds of wall time. If the run is killed it can be started again with the same input
+parameters and RestartFromCheckpoint set True, and it carries on from the last checkpoint instead of from the beginning
+(without RestartFromCheckpoint a checkpoint left in UserPath is ignored and overwritten). Everything the loop carries from
+one increment to the next (magma ocean and crust state, holes, recorded time series, solver and stepper state) is
+saved exactly (pickled), so a resumed run gives bit for bit the same results as a run that was never stopped.
+
+A checkpoint is only used for the input parameters and iMagma version it was saved with (settings of the checkpoints
+themselves are allowed to change), and it is removed once the run is over.
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import os
+import time
+import pickle
+
+CheckpointFormatVersion = 2
+
+# Run settings that can differ between a checkpoint and the run resuming from it
+CheckpointSettingNames = ('CheckpointInterval', 'CheckpointWallTime', 'CheckpointFile', 'RestartFromCheckpoint')
+
+
+# Decides when to save a checkpoint (every interval increments and/or every wallTime seconds; 0 turns either off)
+class CheckpointTimer(object):
+
+    def __init__(self, interval, wallTime):
+
+        self.interval = int(interval)
+        self.wallTime = wallTime
+        self.lastSaveTime = time.time()
+
+    # Whether a checkpoint should be saved at the end of increment number increment (counted from 0)
+    def Due(self, increment):
+
+        if self.interval > 0 and (increment + 1) % self.interval == 0:
+            return True
+
+        return self.wallTime > 0 and time.time() - self.lastSaveTime >= self.wallTime
+
+    def Saved(self):
+        self.lastSaveTime = time.time()
+
+
+# Input parameters that have to match for a checkpoint to be used
+def _RunParameters(params):
+    return dict((name, value) for name, value in params.items() if name not in CheckpointSettingNames)
+
+
+# Save the state of the loop after increment number increment (written to a temporary file and renamed, so a checkpoint is never left half written)
+# version is the iMagma version of the run; spoolSizes are the sizes of the spool files of a run with streamed output (see OutputWriter.py)
+def SaveCheckpoint(fileName, params, version, increment, state, runSeconds, spoolSizes=None):
+
+    checkpoint = {'formatVersion': CheckpointFormatVersion, 'version': version, 'params': _RunParameters(params), 'increment': increment, \
+                  'state': state, 'runSeconds': runSeconds, 'spoolSizes': spoolSizes}
+
+    tempName = '%s.%d.tmp' % (fileName, os.getpid())
+
+    try:
+        with open(tempName, 'wb') as f:
+            pickle.dump(checkpoint, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tempName, fileName)
+    except BaseException:
+        if os.path.exists(tempName):
+            os.remove(tempName)
+        raise
+
+
+# Checkpoint saved for the same input parameters by the same iMagma version (dictionary with increment, state, runSeconds and spoolSizes)
+# or None if there is none
+def LoadCheckpoint(fileName, params, version):
+
+    if not os.path.isfile(fileName):
+        return None
+
+    with open(fileName, 'rb') as f:
+        checkpoint = pickle.load(f)
+
+    if checkpoint.get('formatVersion') != CheckpointFormatVersion or checkpoint['version'] != version or \
+       checkpoint['params'] != _RunParameters(params):
+        return None
+
+    return checkpoint
+
+
+def RemoveCheckpoint(fileName):
+
+    if os.path.isfile(fileName):
+        os.remove(fileName)
@@ -2,6 +2,25 @@
 
 Script that combines the output files generated by ParameterSearchHEAD.py
 
+Collects the scoreCard.csv of every run directory (directories named by the run number) of a sweep into one
+GrandScoreCard.csv (one row per finished run, in the order of the run numbers). Run directories are listed with one
+os.scandir of the sweep directory (missing run numbers and directories that are not run numbers are skipped), the small
+scoreCard.csv files are read by a pool of threads, and GrandScoreCard.csv is written in one go. With BinaryGrandScoreCard
+the rows are also saved as GrandScoreCard.npz (scorecard array and column names, read back with LoadGrandScoreCard),
+which loads much faster than the CSV for large sweeps.
+
+To follow a sweep that is still running, the incremental mode (CombineIncremental) keeps the mtime and size of the
+scoreCard.csv of every run it has taken in a state file (CombinatorState.json) and only reads the runs that are new or
+changed since the last pass: new runs are appended to GrandScoreCard.csv, and the file is only rewritten (from itself,
+not from the run directories) when a run it holds changed or was removed. SweepExecutor.py only writes GrandScoreCard.csv
+when its sweep ends, so passes during the sweep only read the new runs. Watch does an incremental pass every interval
+seconds until it is stopped (Ctrl-C), e.g.
+
+    python Combinator.py --watch 60
+
+With --index the runs read are also added to the SQLite results index (see ResultsIndex.py), with their input parameters
+from the manifest of the sweep or the inputFile.csv of the run when there is one.
+
 By: Viranga Perera & Alan P. Jackson
 Modified: September 19, 2017
 
@@ -12,46 +31,351 @@ import numpy as np
 import os
 import os.path
 import csv
+import json
+import time
+import argparse
+import concurrent.futures
+
+import MAIN
+import SweepManifest as SM
+import ResultsIndex as RI
+
+BinaryGrandScoreCard = False          # Set True to also write GrandScoreCard.npz
+Incremental = False                   # Set True to only read the runs that are new or changed since the last pass
+WatchInterval = 0                     # Seconds between incremental passes (0 for one pass)
+ResultsIndexFile = None               # SQLite results index to add the runs to (e.g. RI.DefaultIndexFile, see ResultsIndex.py) or None
+
+GrandScoreCardName = 'GrandScoreCard.csv'
+BinaryGrandScoreCardName = 'GrandScoreCard.npz'
+StateFileName = 'CombinatorState.json'
+StateFormatVersion = 1
+
+columnNames = MAIN.ScoreCardColumnNames
+
+
+# Run directories of a sweep directory as (run number, path ending in /) in order of run number
+def RunDirectories(UserPath):
+
+    runDirectories = []
+
+    for entry in os.scandir(UserPath):
+        if entry.name.isdigit() and entry.is_dir():
+            runDirectories.append((int(entry.name), entry.path + '/'))
+
+    runDirectories.sort()
+
+    return runDirectories
+
+
+# Last line of the scoreCard.csv of a run directory (None if the run has no scoreCard.csv or its last line does not have a
+# value for every column) and whether the run left an errorFile.csv
+def ReadScoreCard(workingPath):
+
+    line = None
+
+    try:
+        with open(workingPath + 'scoreCard.csv', 'r') as f:
+            lines = [line for line in f.read().splitlines() if line.strip() != '']
+
+        # scoreCard.csv is appended to, so a run done again in the same directory has its last scorecard at the end
+        if lines and lines[-1].count(',') == len(columnNames) - 1:
+            line = lines[-1]
+
+    except (IOError, OSError):
+        pass
+
+    return line, os.path.isfile(workingPath + 'errorFile.csv')
+
+
+# Read the scorecards of run directories with a pool of threads, in the order of the directories
+def ReadScoreCards(runDirectories, maxThreads=None):
+
+    maxThreads = maxThreads or min(32, 4 * (os.cpu_count() or 1))
+    workingPaths = [workingPath for runNumber, workingPath in runDirectories]
+
+    # Each thread reads a chunk of directories (one task per directory costs more than reading a scorecard)
+    chunks = [workingPaths[start:start + 256] for start in range(0, len(workingPaths), 256)]
+
+    with concurrent.futures.ThreadPoolExecutor(maxThreads) as pool:
+        return [result for chunk in pool.map(lambda chunk: [ReadScoreCard(workingPath) for workingPath in chunk], chunks) for result in chunk]
+
+
+# Whether a scorecard line is all numbers
+def _IsNumbers(line):
+
+    try:
+        np.array(line.split(','), dtype=float)
+        return True
+    except ValueError:
+        return False
+
+
+# Scorecard rows (one row per line) of scorecard lines, parsed in one go, and the lines used (lines that are not numbers are left out)
+def ParseScoreCards(lines):
+
+    try:
+        return np.array(','.join(lines).split(','), dtype=float).reshape(len(lines), len(columnNames)), list(lines)
+    except ValueError:
+        lines = [line for line in lines if _IsNumbers(line)]
+
+    return np.array(','.join(lines).split(','), dtype=float).reshape(len(lines), len(columnNames)) if lines else np.empty((0, len(columnNames))), lines
+
+
+# Write the scorecard lines (as written by MAIN.WriteScoreCard) to GrandScoreCard.csv in UserPath, and their rows to
+# GrandScoreCard.npz if binary
+def WriteGrandScoreCard(UserPath, lines, rows, binary=False):
+
+    with open(UserPath + GrandScoreCardName, 'w', buffering=1 << 20) as f:
+        csv.writer(f, delimiter=',').writerow(columnNames)
+        f.writelines(line + '\n' for line in lines)
+
+    if binary:
+        with open(UserPath + BinaryGrandScoreCardName, 'wb') as f:
+            np.savez(f, scoreCard=rows, columns=np.array(columnNames))
+
+
+# Combine the scorecards of every run directory in UserPath into GrandScoreCard.csv (and .npz if binary), and add the runs to index
+# (ResultsIndex.ResultsIndex) if one is given
+# Returns the scorecard rows; runs that left an errorFile.csv are printed
+def Combine(UserPath, binary=False, maxThreads=None, index=None):
+
+    runDirectories = RunDirectories(UserPath)
+    results = ReadScoreCards(runDirectories, maxThreads)
+
+    if index is not None:
+        _IndexRuns(index, UserPath, runDirectories, results)
+
+    rows, lines = ParseScoreCards([line for line, hasError in results if line is not None])
+
+    WriteGrandScoreCard(UserPath, lines, rows, binary)
+
+    for (runNumber, workingPath), (line, hasError) in zip(runDirectories, results):
+        if hasError:
+            print('Error in Directory: ', runNumber)
+
+    return rows
+
+
+# Scorecard rows and column names of a sweep, from GrandScoreCard.npz if it is there and not older than GrandScoreCard.csv, otherwise from the CSV
+def LoadGrandScoreCard(UserPath):
+
+    binaryName, csvName = UserPath + BinaryGrandScoreCardName, UserPath + GrandScoreCardName
+
+    if os.path.isfile(binaryName) and (not os.path.isfile(csvName) or os.path.getmtime(binaryName) >= os.path.getmtime(csvName)):
+        with np.load(binaryName) as data:
+            return data['scoreCard'], [str(name) for name in data['columns']]
+
+    with open(csvName, 'r') as f:
+        names = next(csv.reader(f))
+
+    return np.genfromtxt(csvName, delimiter=',', skip_header=1, ndmin=2), names
+
+
+# Input parameters of the runs of a sweep from its manifest (see SweepManifest.py), keyed by run number
+def _ManifestParameters(UserPath):
+
+    if not os.path.isfile(UserPath + SM.ManifestName):
+        return {}
+
+    manifest = SM.SweepManifest(UserPath + SM.ManifestName)
+
+    return dict((int(runId), entry['params']) for runId, entry in manifest.runs.items() if runId.isdigit() and entry.get('params') is not None)
+
+
+# Run numbers of the runs of a sweep that were given the results of an equivalent run, and the run number of that run
+# (Same As Run of SweepLog.csv, see SweepExecutor.py)
+def _SameAsRuns(UserPath):
+
+    if not os.path.isfile(UserPath + 'SweepLog.csv'):
+        return {}
+
+    with open(UserPath + 'SweepLog.csv', 'r') as f:
+        return dict((row['Run Name'], row['Same As Run']) for row in csv.DictReader(f) if row.get('Same As Run'))
+
+
+# Add the runs with a scorecard to a results index (input parameters from the manifest of the sweep or the inputFile.csv of the run,
+# output files in the directory of the equivalent run for runs given its results)
+def _IndexRuns(index, UserPath, runDirectories, results):
+
+    manifestParameters = _ManifestParameters(UserPath)
+    sameAs = _SameAsRuns(UserPath)
+    runs = []
+
+    for (runNumber, workingPath), (line, hasError) in zip(runDirectories, results):
+
+        if line is None or not _IsNumbers(line):
+            continue
+
+        params = manifestParameters.get(runNumber)
+
+        if params is None and os.path.isfile(workingPath + 'inputFile.csv'):
+            try:
+                params = MAIN.ReadInputFile(workingPath + 'inputFile.csv')
+            except (ValueError, SyntaxError, StopIteration):
+                params = None
+
+        outputPath = UserPath + sameAs[str(runNumber)] + '/' if str(runNumber) in sameAs else None
+
+        runs.append((np.array(line.split(','), dtype=float), workingPath, params, outputPath))
+
+    index.AddMany(runs)
+
+
+####### INCREMENTAL MODE ############################################################################################################################
+
+# Stamp (mtime in ns, size) of a file, or None if it does not exist
+def _Stamp(fileName):
+
+    try:
+        stat = os.stat(fileName)
+    except (IOError, OSError):
+        return None
+
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+# State of the last incremental pass in UserPath (None if there is none or it cannot be read)
+def _LoadState(UserPath):
+
+    try:
+        with open(UserPath + StateFileName, 'r') as f:
+            state = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+
+    return state if state.get('formatVersion') == StateFormatVersion else None
+
+
+# Save the state (written to a temporary file and renamed, so an interrupted pass leaves the last complete state)
+def _SaveState(UserPath, state):
+
+    tempName = UserPath + StateFileName + '.tmp'
+
+    with open(tempName, 'w') as f:
+        json.dump(state, f)
+
+    os.replace(tempName, UserPath + StateFileName)
+
+
+# Run number of a scorecard line
+def _RunNumber(line):
+    return int(float(line.split(',', 1)[0]))
+
+
+# Add the runs that are new or changed since the last pass to GrandScoreCard.csv (and .npz if binary)
+# The first pass (or a pass after GrandScoreCard.csv was changed by something else) reads every run
+# Returns the number of runs read; runs that left an errorFile.csv are printed the first time they are seen
+# The runs read are added to index (ResultsIndex.ResultsIndex) if one is given
+def CombineIncremental(UserPath, binary=False, maxThreads=None, index=None):
+
+    state = _LoadState(UserPath)
+    grandName = UserPath + GrandScoreCardName
+
+    if state is None or state['grandScoreCard'] != _Stamp(grandName) or (binary and not os.path.isfile(UserPath + BinaryGrandScoreCardName)):
+        state = {'formatVersion': StateFormatVersion, 'runs': {}, 'errors': [], 'grandScoreCard': None}
+        rewrite = True
+    else:
+        rewrite = False
+
+    runDirectories = RunDirectories(UserPath)
+
+    stamps = [_Stamp(workingPath + 'scoreCard.csv') for runNumber, workingPath in runDirectories]
+
+    present = set(str(runNumber) for runNumber, workingPath in runDirectories)
+    removed = [name for name in state['runs'] if name not in present]
+
+    # Runs whose scoreCard.csv is new or changed (and runs without one, which may have failed)
+    toRead = [(runDirectory, stamp) for runDirectory, stamp in zip(runDirectories, stamps) if stamp is None or state['runs'].get(str(runDirectory[0])) != stamp]
+    changed = [str(runNumber) for (runNumber, workingPath), stamp in toRead if str(runNumber) in state['runs']]
+
+    results = ReadScoreCards([runDirectory for runDirectory, stamp in toRead], maxThreads)
+    rows, lines = ParseScoreCards([line for line, hasError in results if line is not None])
+    newErrors = False
+
+    if index is not None:
+        _IndexRuns(index, UserPath, [runDirectory for runDirectory, stamp in toRead], results)
+
+    for ((runNumber, workingPath), stamp), (line, hasError) in zip(toRead, results):
+
+        state['runs'].pop(str(runNumber), None)
+
+        if line is not None and stamp is not None:
+            state['runs'][str(runNumber)] = stamp
+
+        if hasError and runNumber not in state['errors']:
+            print('Error in Directory: ', runNumber)
+            state['errors'].append(runNumber)
+            newErrors = True
+
+    for name in removed:
+        state['runs'].pop(name)
+
+    # Rows of runs that changed or were removed are taken out of GrandScoreCard.csv, which is then written again in run number order
+    if rewrite or changed or removed:
+
+        dropped = set(int(name) for name in changed + removed)
+        kept = []
+
+        if not rewrite:
+            with open(grandName, 'r') as f:
+                kept = [line for line in f.read().splitlines()[1:] if line.strip() != '' and _RunNumber(line) not in dropped]
+
+        lines = sorted(kept + lines, key=_RunNumber)
+        rows = ParseScoreCards(lines)[0]
+
+        WriteGrandScoreCard(UserPath, lines, rows, binary)
+
+    elif lines:
+
+        with open(grandName, 'a', buffering=1 << 20) as f:
+            f.writelines(line + '\n' for line in lines)
+
+        if binary:
+            with np.load(UserPath + BinaryGrandScoreCardName) as data:
+                rows = np.vstack([data['scoreCard'], rows])
+            with open(UserPath + BinaryGrandScoreCardName, 'wb') as f:
+                np.savez(f, scoreCard=rows, columns=np.array(columnNames))
+
+    # Nothing to save when no run was added, changed, removed or failed
+    if rewrite or changed or removed or lines or newErrors:
+        state['grandScoreCard'] = _Stamp(grandName)
+        _SaveState(UserPath, state)
+
+    return len(toRead)
+
+
+# Do an incremental pass every interval seconds until stopped (Ctrl-C)
+def Watch(UserPath, interval, binary=False, maxThreads=None, index=None):
+
+    try:
+        while True:
+            startTime = time.time()
+            numRead = CombineIncremental(UserPath, binary, maxThreads, index)
+            print('%s: read %d runs in %.2f sec' % (time.strftime('%H:%M:%S'), numRead, time.time() - startTime))
+            time.sleep(interval)
+    except KeyboardInterrupt:
+        pass
+
+#####################################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    parser = argparse.ArgumentParser(description='Combine the scorecards of the run directories of a sweep into GrandScoreCard.csv')
+    parser.add_argument('--binary', action='store_true', default=BinaryGrandScoreCard, help='also write GrandScoreCard.npz')
+    parser.add_argument('--incremental', action='store_true', default=Incremental, help='only read runs that are new or changed since the last pass')
+    parser.add_argument('--watch', type=float, default=WatchInterval, metavar='SECONDS', help='do an incremental pass every SECONDS until stopped')
+    parser.add_argument('--index', nargs='?', const=RI.DefaultIndexFile, default=ResultsIndexFile, metavar='FILE', \
+                        help='also add the runs to the SQLite results index FILE (default %s)' % RI.DefaultIndexFile)
+    args = parser.parse_args()
+
+    UserPath = os.getcwd() + '/'          # Define path
+
+    index = RI.ResultsIndex(args.index) if args.index is not None else None
 
-UserPath = os.getcwd() + '/'          # Define path
-
-# Create output file for combined results
-
-columnNames = ['Run Name', 'iMagma Version', 'Run Duration (sec)', 'Volume Increments', 'Timestep Tolerance (%)', 'Impacts', \
-                'Quench', 'Additional Heating', 'Largest Impactor (km)', 'Location of Moon (Re)', 'Impact Mass Conversion Factor', \
-                'Magma Ocean Depth (m)', 'Plag Building Depth (m)', 'Fraction Solids to Plag', 'Percentage of Magma to Remain', \
-                'Max Quench Thickness (m)', 'Density Magma Ocean (kg/m3)', 'Density Crust (kg/m3)', 'Density Quench (kg/m3)', \
-                'Heat of Fusion Magma Ocean (J/kg)', 'Heat Capacity Magma Ocean (J/kg*K)', 'Heat Capacity Crust (J/kg*K)', \
-                'Heat Capacity Quench (J/kg*K)', 'Thermal Expansion Coeff Magma Ocean (1/K)', 'Diffusivity Magma Ocean (m2/s)', \
-                'Diffusivity Crust (m2/s)', 'Diffusivity Quench (m2/s)', 'Dynamic Viscosity Magma Ocean (Pa*s)', 'Adiabat Slope (K/m)', \
-                'Temperature Quench Melt (K)', 'Temperature Surface Equl (K)', 'Emissivity', 'Initial Magma Ocean Mass (kg)', \
-                'Solidified Magma Ocean Mass (kg)', 'Total Mass Added By Re-impacts (kg)', 'Total Energy Added By Re-impacts (J)', \
-                'Heating Rate (W)', 'Total Additional Heat Added (J)', 'Remaining Liquid (%)', 'Plag Building Start Time (yrs)', \
-                'Percentage of Surface w/ Holes', 'Total Cooling Time (yrs)', 'Final Crustal Thickness (m)']
-                
-# Write input file for MAIN.py as a CSV file                                                                    
-with open(UserPath + 'GrandScoreCard.csv', 'w') as f:
-    inputCSV = csv.writer(f, delimiter=',')
-    inputCSV.writerow(columnNames)                
-
-
-startDirectoryNumber = 1
-
-# Find out how many subdirectories are there
-numDirectories = len(os.walk(UserPath).next()[1])
-
-for dirCount in range(startDirectoryNumber, numDirectories+1):
-    
-    workingPath = UserPath + str(dirCount) + '/'
-    
-    if os.path.isfile(workingPath + 'scoreCard.csv'):
-    
-        tempOutputData = np.genfromtxt(workingPath + 'scoreCard.csv', skip_header=0, delimiter=',')
-        
-        # Append output to the CSV file                                                                    
-        with open(UserPath + 'GrandScoreCard.csv', 'a') as f:
-            np.savetxt(f, tempOutputData.reshape(1, tempOutputData.shape[0]), delimiter=',', fmt='%.7e')
-    
-    if os.path.isfile(workingPath + 'errorFile.csv'):
-        
-        print('Error in Directory: ', dirCount)
+    if args.watch > 0:
+        Watch(UserPath, args.watch, args.binary, index=index)
+    elif args.incremental:
+        CombineIncremental(UserPath, args.binary, index=index)
+    else:
+        Combine(UserPath, args.binary, index=index)
@@ -0,0 +1,275 @@
+"""
+
+Emulator of iMagma runs: a Gaussian process fitted to the scorecards of finished runs (GrandScoreCard.csv files) that
+predicts the key outputs of a new parameter set, with an uncertainty, without running the cooling loop
+
+The inputs of the emulator are the scorecard columns set by the input parameters (EmulatorInputColumns, e.g. Emissivity
+and Heating Rate (W)); columns with the same value in every training run are left out of the fit, and a query must have
+that same value. Inputs whose training values are positive and span more than two decades are fitted in log10 (e.g.
+viscosity, heating rate), outputs that are always positive (e.g. Total Cooling Time (yrs)) too. The Gaussian process has
+a squared exponential kernel on the inputs scaled to [0, 1], with the length scale and noise picked by the marginal
+likelihood of the training runs. A query gives the mean and standard deviation of each output, and is flagged as outside
+the training runs when it is outside the range of the training runs in any input or its standard deviation is more than
+maxStd (of the spread of the training outputs), i.e. when it is too far from every training run to trust. Only those
+queries need a real run (see PredictOrRun), e.g.
+
+    import Emulator as EM
+    emulator = EM.Emulator.Train(['ParaSearch/GrandScoreCard.csv', 'wHeating/GrandScoreCard.csv'])
+    prediction = emulator.Predict({'Emissivity': 0.8, 'Heating Rate (W)': 1e11, ...})
+    prediction.mean['Total Cooling Time (yrs)'], prediction.std['Total Cooling Time (yrs)'], prediction.outside
+
+Predicting a batch of queries at once (PredictArray) takes microseconds per query with a few hundred training runs (the
+time grows with the square of the number of training runs, see maxRuns of Train).
+Input parameters that are not in the scorecard (e.g. acc_grav, KEefficiency, ImpactsFile) are not seen by the emulator,
+so the training runs should share them. An emulator is saved to and loaded from one .npz file (Save, Load).
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import json
+
+import MAIN
+
+# Scorecard columns used as inputs
+EmulatorInputColumns = MAIN.ScoreCardInputColumns
+
+# Outputs predicted by default
+EmulatorOutputColumns = ['Total Cooling Time (yrs)', 'Final Crustal Thickness (m)', 'Plag Building Start Time (yrs)', 'Remaining Liquid (%)']
+
+# Length scales (of the inputs scaled to [0, 1]) and noise variances (of the standardised outputs) tried when fitting
+LengthScales = [0.05, 0.1, 0.2, 0.35, 0.5, 0.75, 1.0, 1.5, 2.5]
+NoiseVariances = [1e-8, 1e-6, 1e-4, 1e-2]
+
+
+# Scorecard input columns of a dictionary of input parameters (see MAIN.InputParameters)
+def ScoreCardInputs(params):
+
+    inputs = {}
+
+    for column, name in EmulatorInputColumns:
+
+        if name == 'TimestepTolerance':
+            inputs[column] = params.get(name, MAIN.OptionalParameterDefaults[name]) * 100
+        else:
+            inputs[column] = float(params[name])
+
+    return inputs
+
+
+# Rows of one or more GrandScoreCard.csv files (one row per finished run, columns of MAIN.ScoreCardColumnNames)
+def LoadScoreCards(fileNames):
+
+    if isinstance(fileNames, str):
+        fileNames = [fileNames]
+
+    rows = [np.genfromtxt(fileName, skip_header=1, delimiter=',', ndmin=2) for fileName in fileNames]
+    rows = [block for block in rows if block.size > 0]
+
+    if len(rows) == 0:
+        return np.empty((0, len(MAIN.ScoreCardColumnNames)))
+
+    return np.vstack(rows)
+
+
+# Squared exponential kernel between the rows of a and b (inputs already divided by the length scale)
+def _Kernel(a, b):
+
+    distance = (a * a).sum(axis=1)[:,None] + (b * b).sum(axis=1)[None,:] - 2 * a.dot(b.T)
+
+    return np.exp(-0.5 * np.maximum(distance, 0))
+
+
+# Prediction of the emulator for one query
+class Prediction(object):
+
+    def __init__(self, mean, std, outside):
+
+        self.mean = mean                    # Predicted value of each output (keyed by the scorecard column)
+        self.std = std                      # Standard deviation of each prediction (same units as the output)
+        self.outside = outside              # True if the query is outside the training runs (the prediction should not be trusted)
+
+
+class Emulator(object):
+
+    def __init__(self, state):
+
+        self.inputs = list(state['inputs'])                             # Scorecard columns fitted as inputs (not constant in the training runs)
+        self.constants = dict(state['constants'])                       # Value of the scorecard input columns that are constant in the training runs
+        self.outputs = list(state['outputs'])                           # Scorecard columns predicted
+        self.logInputs = np.asarray(state['logInputs'], dtype=bool)     # Inputs fitted in log10
+        self.logOutputs = np.asarray(state['logOutputs'], dtype=bool)   # Outputs fitted in log10
+        self.low = np.asarray(state['low'], dtype=float)                # Smallest (transformed) training value of each input
+        self.high = np.asarray(state['high'], dtype=float)              # Largest (transformed) training value of each input
+        self.offset = np.asarray(state['offset'], dtype=float)          # Mean of each (transformed) training output
+        self.scale = np.asarray(state['scale'], dtype=float)            # Standard deviation of each (transformed) training output
+        self.lengthScale = float(state['lengthScale'])                  # Kernel length scale (of the inputs scaled to [0, 1])
+        self.noise = float(state['noise'])                              # Noise variance (of the standardised outputs)
+        self.maxStd = float(state['maxStd'])                            # Largest standard deviation (of the standardised outputs) of a query inside the training runs
+        self.X = np.asarray(state['X'], dtype=float)                    # Training inputs (scaled to [0, 1] and divided by the length scale)
+        self.alpha = np.asarray(state['alpha'], dtype=float)            # Weights of the training runs in the mean of each output
+        self.Kinv = np.asarray(state['Kinv'], dtype=float)              # Inverse of the covariance of the training runs
+
+    # Fit an emulator to the finished runs of GrandScoreCard.csv files (or an array of scorecard rows)
+    # maxRuns limits the number of training runs (a random subset of that size is used when there are more)
+    @classmethod
+    def Train(cls, scoreCards, outputs=None, maxStd=0.5, maxRuns=4000, seed=0):
+
+        rows = scoreCards if isinstance(scoreCards, np.ndarray) else LoadScoreCards(scoreCards)
+        outputs = list(outputs) if outputs is not None else list(EmulatorOutputColumns)
+
+        columns = [MAIN.ScoreCardColumnNames.index(column) for column, name in EmulatorInputColumns]
+        X = rows[:,columns]
+        Y = rows[:,[MAIN.ScoreCardColumnNames.index(output) for output in outputs]]
+
+        # Runs with outputs that could not be read
+        keep = np.all(np.isfinite(Y), axis=1) & np.all(np.isfinite(X), axis=1)
+        X, Y = X[keep], Y[keep]
+
+        if X.shape[0] < 2:
+            raise ValueError('Emulator needs at least 2 finished runs to train on (found %d)' % X.shape[0])
+
+        if X.shape[0] > maxRuns:
+            subset = np.sort(np.random.default_rng(seed).choice(X.shape[0], maxRuns, replace=False))
+            X, Y = X[subset], Y[subset]
+
+        varies = np.ptp(X, axis=0) > 0
+        names = [column for column, name in EmulatorInputColumns]
+        constants = dict((names[i], float(X[0,i])) for i in range(len(names)) if not varies[i])
+
+        X = X[:,varies]
+        logInputs = np.all(X > 0, axis=0) & (X.max(axis=0) > 100 * X.min(axis=0))
+        X = np.where(logInputs, np.log10(np.where(logInputs, X, 1)), X)
+
+        logOutputs = np.all(Y > 0, axis=0)
+        Y = np.where(logOutputs, np.log10(np.where(logOutputs, Y, 1)), Y)
+
+        low, high = X.min(axis=0), X.max(axis=0)
+        offset, scale = Y.mean(axis=0), Y.std(axis=0)
+        scale[scale == 0] = 1.
+
+        unit = (X - low) / (high - low)
+        Z = (Y - offset) / scale
+
+        # Length scale and noise with the largest log marginal likelihood (summed over the outputs)
+        best = None
+
+        for lengthScale in LengthScales:
+            for noise in NoiseVariances:
+
+                K = _Kernel(unit / lengthScale, unit / lengthScale) + noise * np.eye(unit.shape[0])
+
+                try:
+                    L = np.linalg.cholesky(K)
+                except np.linalg.LinAlgError:
+                    continue
+
+                weights = np.linalg.solve(L.T, np.linalg.solve(L, Z))
+                likelihood = -0.5 * (Z * weights).sum() - Z.shape[1] * np.log(np.diag(L)).sum()
+
+                if best is None or likelihood > best[0]:
+                    best = (likelihood, lengthScale, noise, L, weights)
+
+        likelihood, lengthScale, noise, L, weights = best
+        Linv = np.linalg.solve(L, np.eye(L.shape[0]))
+
+        state = {'inputs': [name for name, v in zip(names, varies) if v], 'constants': constants, 'outputs': outputs, 'logInputs': logInputs, \
+                 'logOutputs': logOutputs, 'low': low, 'high': high, 'offset': offset, 'scale': scale, 'lengthScale': lengthScale, \
+                 'noise': noise, 'maxStd': maxStd, 'X': unit / lengthScale, 'alpha': weights, 'Kinv': Linv.T.dot(Linv)}
+
+        return cls(state)
+
+    # Scaled inputs of queries (array with one row per query, columns in the order of self.inputs) and whether each is outside the training range
+    def _Scaled(self, queries):
+
+        X = np.array(queries, dtype=float, ndmin=2)
+        X = np.where(self.logInputs, np.log10(np.where(self.logInputs & (X > 0), X, 1)), X)
+
+        outside = np.any(X < self.low - 1e-9 * np.abs(self.low), axis=1) | np.any(X > self.high + 1e-9 * np.abs(self.high), axis=1)
+        outside |= np.any(self.logInputs & (np.array(queries, dtype=float, ndmin=2) <= 0), axis=1)
+
+        return (X - self.low) / (self.high - self.low) / self.lengthScale, outside
+
+    # Predict a batch of queries (array with one row per query, columns in the order of self.inputs)
+    # Returns the mean and standard deviation (queries x outputs, in the units of the outputs) and whether each query is outside the training runs
+    def PredictArray(self, queries):
+
+        X, outside = self._Scaled(queries)
+
+        k = _Kernel(X, self.X)
+        mean = k.dot(self.alpha)
+        variance = np.maximum(1 - (k.dot(self.Kinv) * k).sum(axis=1), 0) + self.noise
+        std = np.sqrt(variance)
+
+        outside |= std > self.maxStd
+
+        # Back to the units of the outputs (standard deviation of a log10 output to first order)
+        mean = self.offset + mean * self.scale
+        std = std[:,None] * self.scale
+
+        mean = np.where(self.logOutputs, 10**mean, mean)
+        std = np.where(self.logOutputs, mean * np.log(10) * std, std)
+
+        return mean, std, outside
+
+    # Input row of one query given as a dictionary of scorecard input columns (inputs constant in the training runs may be left out)
+    # A query whose value of a constant input is not the training value is outside the training runs
+    def QueryRow(self, query):
+
+        for column, value in self.constants.items():
+            if column in query and abs(float(query[column]) - value) > 1e-9 * abs(value):
+                return None
+
+        missing = [column for column in self.inputs if column not in query]
+
+        if missing:
+            raise ValueError('Emulator query is missing inputs: %s' % ', '.join(missing))
+
+        return [float(query[column]) for column in self.inputs]
+
+    # Predict one query given as a dictionary of scorecard input columns (see ScoreCardInputs for a dictionary of input parameters)
+    def Predict(self, query):
+
+        row = self.QueryRow(query)
+
+        if row is None:
+            nan = dict((output, np.nan) for output in self.outputs)
+            return Prediction(nan, dict(nan), True)
+
+        mean, std, outside = self.PredictArray([row])
+
+        return Prediction(dict(zip(self.outputs, mean[0])), dict(zip(self.outputs, std[0])), bool(outside[0]))
+
+    def Save(self, fileName):
+
+        arrays = dict((name, getattr(self, name)) for name in ('logInputs', 'logOutputs', 'low', 'high', 'offset', 'scale', 'X', 'alpha', 'Kinv'))
+        header = {'inputs': self.inputs, 'constants': self.constants, 'outputs': self.outputs, 'lengthScale': self.lengthScale, \
+                  'noise': self.noise, 'maxStd': self.maxStd}
+
+        with open(fileName, 'wb') as f:
+            np.savez(f, _header=np.array(json.dumps(header)), **arrays)
+
+    @classmethod
+    def Load(cls, fileName):
+
+        with np.load(fileName) as data:
+            state = json.loads(str(data['_header']))
+            state.update((name, data[name]) for name in data.files if name != '_header')
+
+        return cls(state)
+
+
+# Outputs of a run from the emulator, or from a real run (MAIN.run_simulation) when the parameters are outside the training runs
+# Returns the Prediction (standard deviation 0 for a real run)
+def PredictOrRun(emulator, params):
+
+    prediction = emulator.Predict(ScoreCardInputs(params))
+
+    if not prediction.outside:
+        return prediction
+
+    scoreCard = MAIN.run_simulation(params).ScoreCardDict()
+
+    return Prediction(dict((output, scoreCard[output]) for output in emulator.outputs), dict((output, 0.) for output in emulator.outputs), False)
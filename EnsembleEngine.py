@@ -0,0 +1,347 @@
+"""
+
+Ensemble engine: runs many no-impacts parameter sets through the cooling loop of MAIN.run_simulation in lockstep
+
+Without impacts every run goes through the same regimes (radiation from the bare magma ocean, then conduction through
+quench crust, then through plag crust) and the timestep of each increment is found directly (no retries), so only the
+numbers differ from one run to the next. RunEnsemble keeps the state of N runs as NumPy vectors (one element per run)
+and advances all of them through each volume increment with a handful of array operations, so one process evaluates
+hundreds of parameter sets at about the cost of a few. Regime switches (start of plag crust building, quench crust
+forming) are per-run masks, and runs that reach the end of the magma ocean, their number of increments or an error
+simply drop out of the active mask while the others carry on.
+
+Every run of an ensemble gives the same time series and scorecard as run_simulation with the same parameters (to
+rounding, since NumPy's vector powers can differ from Python's in the last bit), except for the run duration, which is
+the wall time of the ensemble shared equally between its runs. Runs
+that the ensemble cannot advance (impacts, adaptive increments, Newton surface temperatures, the 'fixedpoint' timestep
+solver, decimated recording, streamed output or checkpoints) are run one by one with run_simulation, so any list of
+parameter sets can be given, e.g.
+
+    import EnsembleEngine as EE
+    results = EE.RunEnsemble([MAIN.ReadInputFile(fileName) for fileName in inputFiles])
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import datetime
+
+import MAIN
+import HoleTracker as HT
+import SeriesRecorder as SR
+import TimestepSolver as TS
+import FastEngine as FE
+
+# Number of increments recorded for all runs before they are handed to the recorders of the runs
+RecordChunkSize = 1024
+
+
+# Value of an optional run setting
+def _Setting(params, name):
+    return params.get(name, MAIN.OptionalParameterDefaults[name])
+
+
+# Whether a run can be advanced by the ensemble (otherwise RunEnsemble runs it with run_simulation)
+def SupportsEnsemble(params):
+
+    return params['ImpactsSwitch'] == False and _Setting(params, 'TimestepSolver') == 'secant' and _Setting(params, 'AdaptiveVolume') != True and \
+           _Setting(params, 'SurfaceTemperatureTolerance') is None and _Setting(params, 'RecordPolicy') == 'all' and \
+           _Setting(params, 'StreamOutput') != True and _Setting(params, 'CheckpointInterval') <= 0 and _Setting(params, 'CheckpointWallTime') <= 0
+
+
+# Same as SurfaceTemperature.SurfaceTemperature for vectors of lids (original single update from the guess)
+def _SurfaceTemperature(Temperature_top_MO, Temperature_top_lid_guess, LidThickness, Diffusivity_lid, density_lid, Heat_capacity_lid, Emissivity, Temperature_equl):
+
+    CondFlux = Diffusivity_lid * density_lid * Heat_capacity_lid * (Temperature_top_MO - Temperature_top_lid_guess) / LidThickness
+
+    return np.where(LidThickness == 0, Temperature_top_MO, pow((CondFlux / (MAIN.SB * Emissivity) + pow(Temperature_equl, 4.0)), 0.25))
+
+
+# Run a list of parameter sets (dictionaries as for MAIN.run_simulation)
+# Returns a list in the same order with the MAIN.SimulationResult of each run, or the exception it stopped with
+# (MAIN.SimulationError, TimestepSolver.TimestepError or FloatingPointError)
+def RunEnsemble(paramsList, AlanData=None):
+
+    results = [None] * len(paramsList)
+    ensemble = [idx for idx, params in enumerate(paramsList) if SupportsEnsemble(params)]
+
+    for idx, params in enumerate(paramsList):
+
+        if idx in ensemble:
+            continue
+
+        try:
+            results[idx] = MAIN.run_simulation(params, AlanData)
+        except (MAIN.SimulationError, ArithmeticError) as error:
+            results[idx] = error
+
+    if len(ensemble) != 0:
+        for idx, result in zip(ensemble, _RunLockstep([paramsList[idx] for idx in ensemble])):
+            results[idx] = result
+
+    return results
+
+
+# Advance runs that all satisfy SupportsEnsemble together (see run_simulation in MAIN.py for comments on the physics)
+def _RunLockstep(paramsList):
+
+    TimeStamp_start = datetime.datetime.now()
+
+    Radius_moon = MAIN.Radius_moon
+    surfArea_Moon = MAIN.surfArea_Moon
+    numRuns = len(paramsList)
+
+    # One element per run for every input parameter
+    def Vector(name, convert=float):
+        return np.array([convert(params[name]) for params in paramsList])
+
+    QuenchSwitch = Vector('QuenchSwitch', lambda value: value == True)
+    GeneralHeatingSwitch = Vector('GeneralHeatingSwitch', lambda value: value == True)
+    adiabslope = Vector('adiabslope')
+    MO_depth_initial = Vector('MO_depth_initial')
+    MO_depth_plagBuild = Vector('MO_depth_plagBuild')
+    density_MO = Vector('density_MO')
+    Heat_fusion_MO = Vector('Heat_fusion_MO')
+    Heat_capacity_MO = Vector('Heat_capacity_MO')
+    therm_exp_coeff_MO = Vector('therm_exp_coeff_MO')
+    Diffusivity_MO = Vector('Diffusivity_MO')
+    dy_viscosity_MO = Vector('dy_viscosity_MO')
+    Temperature_equl = Vector('Temperature_equl')
+    Diffusivity_crust = Vector('Diffusivity_crust')
+    density_crust = Vector('density_crust')
+    Heat_capacity_crust = Vector('Heat_capacity_crust')
+    Emissivity = Vector('Emissivity')
+    acc_grav = Vector('acc_grav')
+    Temperature_melt = Vector('Temperature_melt')
+    Diffusivity_quench = Vector('Diffusivity_quench')
+    density_quench = Vector('density_quench')
+    Heat_capacity_quench = Vector('Heat_capacity_quench')
+    Max_Quench_Thickness = Vector('Max_Quench_Thickness')
+    vol_increments = Vector('vol_increments', int)
+    percMO_remain_end = Vector('percMO_remain_end')
+    HeatingRate = Vector('HeatingRate')
+    plag_fraction = Vector('plag_fraction')
+
+    MO_volume_initial = (4/3) * np.pi * (pow(Radius_moon, 3) - pow(Radius_moon - MO_depth_initial, 3))
+    MO_volume_end = (percMO_remain_end/100) * MO_volume_initial
+    volSize = MO_volume_initial / vol_increments
+    plagBuildRadius = Radius_moon - MO_depth_plagBuild
+
+    ####### INITIALIZATIONS (one element per run) ###################################################################################################
+
+    MO_volume_current = MO_volume_initial.copy()
+    CrustalThickness = np.zeros(numRuns)
+    CrustalThickness_global = np.zeros(numRuns)
+    fractionLiquid = np.ones(numRuns)
+    CMB = Radius_moon - MO_depth_initial
+    ellapsedTime = np.zeros(numRuns)
+    timeStep = np.full(numRuns, 3.154e7)
+    quenchThickness = np.zeros(numRuns)
+    PresentQuenchThickness = np.zeros(numRuns)
+    PresentTemperature_top_quench = np.zeros(numRuns)
+    crustBuildingStartTime_yrs = np.full(numRuns, np.nan)
+    CumGenHeatAdded = np.zeros(numRuns)
+    CrustBuildOn = np.zeros(numRuns, dtype=bool)
+
+    active = np.ones(numRuns, dtype=bool)          # Runs still in the loop
+    numRecorded = np.zeros(numRuns, dtype=int)     # Number of increments recorded for each run
+    failures = [None] * numRuns                    # Exception each run stopped with (None if it finished)
+
+    recorders = [SR.SeriesRecorder(FE.SeriesNames, capacity) for capacity in vol_increments]
+
+    # Recorded values of the latest increments of all runs (series x runs x increments), handed to the recorders when full
+    recordChunk = np.empty((len(recorders[0].names), numRuns, RecordChunkSize))
+    chunkStart = 0
+
+    def FlushChunk(chunkEnd):
+        for run in range(numRuns):
+            count = min(numRecorded[run], chunkEnd) - chunkStart
+            if count > 0:
+                recorders[run].Extend(recordChunk[:, run, :count])
+
+    CMB_Temperature = MAIN.ST.SolidusTemperature(CMB, fractionLiquid)
+
+    ####### MAIN LOOP ###############################################################################################################################
+
+    with np.errstate(all='ignore'):
+
+        for interations in range(int(np.max(vol_increments))):
+
+            active &= interations < vol_increments
+
+            if not active.any():
+                break
+
+            solidifMass = volSize * density_MO
+            solidifEnergy = solidifMass * Heat_fusion_MO
+
+            Core_volume = (4/3) * np.pi * pow(CMB, 3)
+
+            # Runs where plag crust starts to build in this increment
+            plagBuilding = CMB >= plagBuildRadius
+            crustStart = active & plagBuilding & ~CrustBuildOn
+
+            crustBuildingStartTime_yrs = np.where(crustStart, ellapsedTime / 3.154e7, crustBuildingStartTime_yrs)
+            CrustalThickness = np.where(crustStart, quenchThickness, CrustalThickness)
+            CrustBuildOn = CrustBuildOn | crustStart
+
+            crystCore2Crust = np.where(CMB < plagBuildRadius, 1, np.where(plagBuilding, 1 - plag_fraction, np.nan))
+            crystGlobCrust = 1 - crystCore2Crust
+
+            CrustalThickness = np.where(active & plagBuilding, CrustalThickness + (crystGlobCrust * (density_MO / density_crust) * volSize) / \
+                                        (4 * np.pi * pow(Radius_moon, 2)), CrustalThickness)
+
+            CMB = np.where(active, pow(((3 * (Core_volume + crystCore2Crust * volSize)) / (4 * np.pi)), (1/3)), CMB)
+
+            MO_volume_current = np.where(active, MO_volume_current - volSize, MO_volume_current)
+
+            # Runs that reached the end of the magma ocean stop here
+            active &= ~(MO_volume_current < MO_volume_end)
+
+            fractionLiquid = np.where(active, MO_volume_current / MO_volume_initial, fractionLiquid)
+
+            Solidus_temperature = MAIN.ST.SolidusTemperature(CMB, fractionLiquid)
+            Temperature_change = CMB_Temperature - Solidus_temperature
+            CMB_Temperature = np.where(active, Solidus_temperature, CMB_Temperature)
+
+            Temperature_top_MO = CMB_Temperature - adiabslope * (Radius_moon - CMB)
+
+            coolingEnergy = density_MO * (MO_volume_current + volSize) * Heat_capacity_MO * Temperature_change
+
+            current_MO_depth = Radius_moon - CMB - CrustalThickness_global
+
+            Ra_number = MAIN.Ra.RayleighNumber(acc_grav, density_MO, therm_exp_coeff_MO, (CMB_Temperature - Temperature_top_MO), current_MO_depth, \
+                                               dy_viscosity_MO, Diffusivity_MO)
+
+            Rad_Flux = Emissivity * MAIN.SB * (pow(Temperature_top_MO, 4) - pow(Temperature_equl, 4))
+
+            # Equilibrium quench crust (same as QuenchCrust.QuenchCrustEquilibrium)
+            cond_flux_MO = Diffusivity_MO * density_MO * Heat_capacity_MO * (CMB_Temperature - Temperature_melt) / current_MO_depth
+            convec_flux_MO = (0.124 * pow(Ra_number, 0.309)) * cond_flux_MO
+            EqulTemperature_top_quench = pow((convec_flux_MO/(Emissivity * MAIN.SB)) + pow(Temperature_equl, 4), (1/4))
+            EqulQuenchThickness = Diffusivity_quench * density_quench * Heat_capacity_quench * (Temperature_melt - EqulTemperature_top_quench) / convec_flux_MO
+            EqulQuenchThickness = np.where(EqulQuenchThickness > Max_Quench_Thickness, Max_Quench_Thickness, EqulQuenchThickness)
+
+            # Global quench crust (only before plag crust starts to build)
+            quenchForming = active & QuenchSwitch & ~CrustBuildOn
+
+            PresentQuenchThickness = np.where(quenchForming, EqulQuenchThickness, PresentQuenchThickness)
+            PresentTemperature_top_quench = np.where(quenchForming, _SurfaceTemperature(Temperature_top_MO, Temperature_top_MO, quenchThickness, \
+                                                     Diffusivity_quench, density_quench, Heat_capacity_quench, Emissivity, Temperature_equl), \
+                                                     PresentTemperature_top_quench)
+
+            MassQuenchAdded = np.where(quenchForming & (quenchThickness < Max_Quench_Thickness), \
+                                       (PresentQuenchThickness - quenchThickness) * surfArea_Moon * density_quench, 0)
+
+            quenchFormEnergy = MassQuenchAdded * Heat_fusion_MO
+
+            AdditionalHeating = np.where(GeneralHeatingSwitch, HeatingRate * timeStep, 0.0)
+
+            Energy2Dump = solidifEnergy + coolingEnergy - quenchFormEnergy + AdditionalHeating
+
+            # Radiation from the bare magma ocean, conduction through quench crust or conduction through plag crust
+            Temperature_top_crust = _SurfaceTemperature(Temperature_top_MO, Temperature_top_MO, CrustalThickness, Diffusivity_crust, density_crust, \
+                                                        Heat_capacity_crust, Emissivity, Temperature_equl)
+
+            Lum_dump = np.where(CrustBuildOn, surfArea_Moon * Diffusivity_crust * density_crust * Heat_capacity_crust * \
+                                              (Temperature_top_MO - Temperature_top_crust) / CrustalThickness, \
+                       np.where(quenchThickness == 0, surfArea_Moon * Rad_Flux, \
+                                surfArea_Moon * Diffusivity_quench * density_quench * Heat_capacity_quench * \
+                                (Temperature_melt - PresentTemperature_top_quench) / quenchThickness))
+
+            # Timestep found directly (same as TimestepSolver.LinearTimestep)
+            Energy2Dump_fixed = Energy2Dump - AdditionalHeating
+
+            netLuminosity = Lum_dump - np.where(GeneralHeatingSwitch, HeatingRate, 0)
+
+            newTimeStep = Energy2Dump_fixed / netLuminosity
+
+            for run in np.flatnonzero(active & (netLuminosity <= 0)):
+                failures[run] = TS.TimestepError('Additional heating (%g W) is greater than the heat lost by the Moon (%g W)' % \
+                                                 (HeatingRate[run], Lum_dump[run]))
+                active[run] = False
+
+            for run in np.flatnonzero(active & np.isinf(newTimeStep)):
+                failures[run] = FloatingPointError('Infinite timestep passed to GeneralHeating')
+                active[run] = False
+
+            timeStep = np.where(active, newTimeStep, timeStep)
+
+            AdditionalHeating = np.where(GeneralHeatingSwitch, HeatingRate * timeStep, 0.0)
+
+            Energy2Dump = Energy2Dump_fixed + AdditionalHeating
+
+            time2Dump = Energy2Dump / Lum_dump
+
+            # Update global quench crust thickness (also carries on after plag crust starts, as in run_simulation)
+            quenchThickness = np.where(active & QuenchSwitch & (quenchThickness < Max_Quench_Thickness), \
+                                       quenchThickness + (PresentQuenchThickness - quenchThickness), quenchThickness)
+
+            MO_volume_current = np.where(active & QuenchSwitch, MO_volume_current - MassQuenchAdded / density_MO, MO_volume_current)
+
+            active &= ~(QuenchSwitch & (MO_volume_current < MO_volume_end))
+
+            fractionLiquid = np.where(active & QuenchSwitch, MO_volume_current / MO_volume_initial, fractionLiquid)
+
+            # No holes, so the global crust is the crust of the non-impacted Moon
+            CrustalThickness_global = np.where(active, CrustalThickness, CrustalThickness_global)
+
+            CumGenHeatAdded = np.where(active, CumGenHeatAdded + AdditionalHeating, CumGenHeatAdded)
+
+            ellapsedTime = np.where(active, ellapsedTime + time2Dump, ellapsedTime)
+
+            # Record the increment for the runs still active
+            column = interations - chunkStart
+
+            if column == RecordChunkSize:
+                FlushChunk(interations)
+                chunkStart = interations
+                column = 0
+
+            for row, values in enumerate((ellapsedTime, fractionLiquid, CMB, CMB_Temperature, CrustalThickness, CrustalThickness_global, 1, volSize)):
+                recordChunk[row, :, column] = values
+            numRecorded[active] += 1
+
+    FlushChunk(chunkStart + RecordChunkSize)
+
+    ####### POST-PROCESSING #########################################################################################################################
+
+    Mass_solid_interior_added = density_MO * (4/3) * np.pi * (pow(CMB, 3) - pow(Radius_moon - MO_depth_initial, 3))
+    Mass_crust_nonImpacted = CrustalThickness * surfArea_Moon * density_crust
+    Mass_remaining_liquid = fractionLiquid * MO_volume_initial * density_MO
+    Mass_final_MO_crystallized = Mass_solid_interior_added + 0.0 + Mass_crust_nonImpacted + Mass_remaining_liquid
+
+    runSeconds = (datetime.datetime.now() - TimeStamp_start).total_seconds() / numRuns
+
+    results = []
+
+    for run, params in enumerate(paramsList):
+
+        if failures[run] is not None:
+            results.append(failures[run])
+            continue
+
+        scoreCard = np.array([params.get('RunNumber', 0), MAIN.iMagma_version, runSeconds, vol_increments[run], \
+                              float(_Setting(params, 'TimestepTolerance'))*100, params['ImpactsSwitch'], params['QuenchSwitch'], \
+                              params['GeneralHeatingSwitch'], float(params['LargestImpactorSize']), float(params['MoonLocationDebrisCalc']), \
+                              float(params['mass2area']), MO_depth_initial[run], MO_depth_plagBuild[run], plag_fraction[run], percMO_remain_end[run], \
+                              Max_Quench_Thickness[run], density_MO[run], density_crust[run], density_quench[run], Heat_fusion_MO[run], \
+                              Heat_capacity_MO[run], Heat_capacity_crust[run], Heat_capacity_quench[run], therm_exp_coeff_MO[run], \
+                              Diffusivity_MO[run], Diffusivity_crust[run], Diffusivity_quench[run], dy_viscosity_MO[run], adiabslope[run], \
+                              Temperature_melt[run], Temperature_equl[run], Emissivity[run], MO_volume_initial[run] * density_MO[run], \
+                              Mass_final_MO_crystallized[run], 0, 0, HeatingRate[run], CumGenHeatAdded[run], fractionLiquid[run]*100, \
+                              crustBuildingStartTime_yrs[run], 0.0, ellapsedTime[run]/3.154e7, CrustalThickness_global[run]], dtype=float)
+
+        series = recorders[run].AsDict()
+
+        # Runs without impacts have empty hole series (same as run_simulation)
+        for name in FE.HoleSeriesNames + FE.ImpactedCrustSeriesNames:
+            series[name] = np.empty(0)
+
+        stats = {'SurfaceTemperatureIterations': 0, 'TimestepEvaluations': int(numRecorded[run]), 'VolumeIncrements': int(numRecorded[run])}
+
+        results.append(MAIN.SimulationResult(params, series, scoreCard, HT.HoleTracker(), stats))
+
+    return results
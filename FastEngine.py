@@ -0,0 +1,692 @@
+"""
+
+Compiled engine for the cooling loop of MAIN.run_simulation (Engine option 'jit')
+
+The loop in MAIN.py calls dozens of small Python functions (solidus temperature, Rayleigh number, quench crust, lid
+surface temperatures, general heating, impacts) and objects (HoleTracker, timestep solver, recorders) in every
+increment, so it is bound by the interpreter. CoolingLoop below is the same loop (with and without impacts) written
+as one function on plain floats and NumPy arrays, which Numba compiles to machine code when it is installed. The
+compiled code is cached on disk (in __pycache__), so only the first run on a machine pays for the compilation and
+sweep workers load it from the cache.
+
+The kernel covers the default run settings: fixed volume increments, the original single update for lid surface
+temperatures, the 'secant' or 'fixedpoint' timestep solver, 'exact' or 'midpoint' impacts, every increment recorded
+and no streamed output or checkpoints. SupportsRun tells whether a run can use it; other runs (and all runs when Numba
+is not installed) use the reference loop in MAIN.py. Numba compiles the kernel at its first call; if it cannot
+(e.g. a Numba version that does not type part of it), RunCoolingLoop warns, turns the engine off for the process and
+the run uses the reference loop. Without Numba the functions here are plain Python, which gives the same results as
+the compiled kernel (only slower); test_FastEngine.py checks the kernel against the reference loop.
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import warnings
+
+try:
+    import numba
+    Available = True                  # Whether the kernel is compiled (otherwise the engine option falls back to the reference loop)
+    CompileErrors = (numba.core.errors.NumbaError,)
+except ImportError:
+    numba = None
+    Available = False
+    CompileErrors = ()
+
+
+# Compile a function with Numba (machine code cached on disk, NumPy rules for division by zero) or leave it as Python
+def _Jit(function):
+
+    if numba is None:
+        return function
+
+    return numba.njit(cache=True, error_model='numpy')(function)
+
+
+# Errors found by the kernel (MAIN.py raises the same exceptions as the reference loop for them)
+ErrorNone = 0
+ErrorHoleAreaQuench = 1               # Total hole area exceeds the surface area of the Moon (quench phase)
+ErrorHoleAreaPlag = 2                 # Total hole area exceeds the surface area of the Moon (plag phase)
+ErrorTimestepNotConverged = 3         # Timestep solver used all its tries
+ErrorHeatingExceedsLoss = 4           # Additional heating is greater than the heat lost by the Moon
+ErrorInfiniteTimestep = 5             # Infinite timestep passed to general heating
+
+# Rows of the series arrays returned by CoolingLoop (same names as the series of MAIN.run_simulation)
+SeriesNames = ['Time', 'LiqFrac', 'CMB', 'CMB_Temperature', 'CrustalThickness', 'CrustalThickness_global', 'timestepEvaluations', 'volSize']
+HoleSeriesNames = ['Time_holes', 'holeArea', 'holeThickness', 'holeTemperature', 'holeAreaCreated', 'totalHoleAreaCum', 'holeTrackerElements']
+ImpactedCrustSeriesNames = ['Time_impactedCrust', 'CrustalThickness_impacted']
+
+
+# Whether the kernel does the same thing as the reference loop for these run settings
+def SupportsRun(AdaptiveVolume, SurfaceTemperatureTolerance, TimestepSolver, ImpactIntegration, RecordPolicy, StreamOutput, Checkpoints):
+
+    return AdaptiveVolume != True and SurfaceTemperatureTolerance is None and TimestepSolver in ('secant', 'fixedpoint') and \
+           ImpactIntegration in ('exact', 'midpoint') and RecordPolicy == 'all' and StreamOutput != True and not Checkpoints
+
+
+# Same as SolidusTemperature.SolidusTemperature
+@_Jit
+def _SolidusTemperature(radius, fractionLiquid):
+
+    radius_km = radius / 1000
+
+    return -1.3714e-4 * radius_km**2 - 0.1724 * radius_km + 1861 - (4.4 / (0.2 * fractionLiquid + 0.01)) + 273.15
+
+
+# Same as SurfaceTemperature.SurfaceTemperature (the original iteration stops after a single update from the guess)
+@_Jit
+def _SurfaceTemperature(Temperature_top_MO, Temperature_top_lid_guess, LidThickness, Diffusivity_lid, density_lid, Heat_capacity_lid, SB, Emissivity, \
+                        Temperature_equl):
+
+    if LidThickness == 0:
+        return Temperature_top_MO
+
+    CondFlux = Diffusivity_lid * density_lid * Heat_capacity_lid * (Temperature_top_MO - Temperature_top_lid_guess) / LidThickness
+
+    return (CondFlux / (SB * Emissivity) + Temperature_equl**4.0)**0.25
+
+
+# Same as QuenchCrust.QuenchCrustEquilibrium (only the quench crust thickness is needed)
+@_Jit
+def _EqulQuenchThickness(CMB_Temperature, current_MO_depth, Heat_capacity_MO, density_MO, Diffusivity_MO, Ra_number, Emissivity, SB, Temperature_equl, \
+                         Diffusivity_quench, density_quench, Heat_capacity_quench, Temperature_melt, Max_Quench_Thickness):
+
+    cond_flux_MO = Diffusivity_MO * density_MO * Heat_capacity_MO * (CMB_Temperature - Temperature_melt) / current_MO_depth
+    Nu = 0.124 * Ra_number**0.309
+    convec_flux_MO = Nu * cond_flux_MO
+    EqulTemperature_top_quench = ((convec_flux_MO/(Emissivity * SB)) + Temperature_equl**4)**(1/4)
+    EqulQuenchThickness = Diffusivity_quench * density_quench * Heat_capacity_quench * (Temperature_melt - EqulTemperature_top_quench) / convec_flux_MO
+
+    if EqulQuenchThickness > Max_Quench_Thickness:
+        EqulQuenchThickness = Max_Quench_Thickness
+
+    return EqulQuenchThickness
+
+
+# Same as Impacts.ImpactFlux._Cumulative for one time
+@_Jit
+def _Cumulative(t, times, rates, cumulative):
+
+    lastTime = times[times.shape[0] - 1]
+    row = np.searchsorted(times, t, side='right') - 1
+
+    if row < 0:
+        return 0.0
+
+    inTable = cumulative[row] + rates[row] * (min(t, lastTime) - times[row])
+    tail = rates[rates.shape[0] - 1] * lastTime * np.log(max(t, lastTime) / lastTime)
+
+    return inTable + tail
+
+
+# Same as Impacts.ImpactFlux.PuncturingImpacts (exact) or MidpointImpacts for one timestep; returns area of holes, mass and energy
+@_Jit
+def _Impacts(ellapsedTime, timestep, mass2area, exactImpacts, times, massRates, energyRates, cumMass, cumEnergy):
+
+    if exactImpacts:
+
+        MassImpacts = _Cumulative(ellapsedTime + timestep, times, massRates, cumMass) - _Cumulative(ellapsedTime, times, massRates, cumMass)
+        EnergyImpacts = _Cumulative(ellapsedTime + timestep, times, energyRates, cumEnergy) - _Cumulative(ellapsedTime, times, energyRates, cumEnergy)
+
+    else:
+
+        lastRow = times.shape[0] - 1
+        lastTime = times[lastRow]
+
+        if ellapsedTime <= lastTime:
+            row = np.searchsorted(times, ellapsedTime + (timestep/2), side='right') - 1
+            if row < 0:
+                massRate = 0.0
+                energyRate = 0.0
+            else:
+                row = min(row, lastRow)
+                massRate = massRates[row]
+                energyRate = energyRates[row]
+        else:
+            massRate = massRates[lastRow] * lastTime / ellapsedTime
+            energyRate = energyRates[lastRow] * lastTime / ellapsedTime
+
+        MassImpacts = massRate * timestep
+        EnergyImpacts = energyRate * timestep
+
+    return MassImpacts / mass2area, MassImpacts, EnergyImpacts
+
+
+# Add a hole to the hole arrays (doubled when full); returns the arrays and the new number of holes
+@_Jit
+def _AppendHole(area, thickness, temperature, n, newArea, newThickness, newTemperature):
+
+    if n == area.shape[0]:
+
+        capacity = max(2 * area.shape[0], 16)
+
+        newAreas = np.empty(capacity)
+        newThicknesses = np.empty(capacity)
+        newTemperatures = np.empty(capacity)
+
+        newAreas[:n] = area[:n]
+        newThicknesses[:n] = thickness[:n]
+        newTemperatures[:n] = temperature[:n]
+
+        area, thickness, temperature = newAreas, newThicknesses, newTemperatures
+
+    area[n] = newArea
+    thickness[n] = newThickness
+    temperature[n] = newTemperature
+
+    return area, thickness, temperature, n + 1
+
+
+# Keep only the holes where mask is True (in place, order preserved); returns the new number of holes
+@_Jit
+def _KeepHoles(area, thickness, temperature, n, mask):
+
+    kept = 0
+
+    for i in range(n):
+        if mask[i]:
+            area[kept] = area[i]
+            thickness[kept] = thickness[i]
+            temperature[kept] = temperature[i]
+            kept += 1
+
+    return kept
+
+
+# Same loop as run_simulation in MAIN.py for the settings listed in SupportsRun (see MAIN.py for comments on the physics)
+# Returns the recorded series (one row per name in SeriesNames, HoleSeriesNames and ImpactedCrustSeriesNames) and their lengths,
+# the holes left at the end, the final state needed for the scorecard, the total number of timestep tries, the number of increments, an error code
+# and the heat lost by the Moon for ErrorHeatingExceedsLoss
+@_Jit
+def CoolingLoop(ImpactsSwitch, QuenchSwitch, GeneralHeatingSwitch, KineticEnergySwitch, adiabslope, MO_depth_initial, MO_depth_plagBuild, density_MO, \
+                Heat_fusion_MO, Heat_capacity_MO, therm_exp_coeff_MO, Diffusivity_MO, dy_viscosity_MO, Temperature_equl, Diffusivity_crust, density_crust, \
+                Heat_capacity_crust, Emissivity, mass2area, acc_grav, Temperature_melt, Diffusivity_quench, density_quench, Heat_capacity_quench, \
+                Max_Quench_Thickness, vol_increments, percMO_remain_end, plag_holeFill_vs_gblCrust, HeatingRate, KEefficiency, plag_fraction, \
+                Radius_moon, SB, secantSolver, timeStep_tol, timeStep_maxIter, exactImpacts, times, massRates, energyRates, cumMass, cumEnergy):
+
+    surfArea_Moon = 4 * np.pi * Radius_moon**2
+    MO_volume_initial = (4/3) * np.pi * (Radius_moon**3 - (Radius_moon - MO_depth_initial)**3)
+
+    MO_volume_current = MO_volume_initial
+    CrustalThickness = 0.0
+    CrustThicknessImpMoon = 0.0
+    CrustalThickness_global = 0.0
+    fractionLiquid = 1.0
+    CMB = Radius_moon - MO_depth_initial
+    ellapsedTime = 0.0
+    timeStep = 3.154e7
+    volSize = MO_volume_initial / vol_increments
+
+    quenchThickness = 0.0
+    PresentQuenchThickness = 0.0
+    PresentTemperature_top_quench = 0.0
+    vol_Quench_excavated = 0.0
+    Extra_Crust_Due_Impacts = 0.0
+    TotalHoleArea = 0.0
+    HoleThickness_times_HoleArea_Sum = 0.0
+    crustBuildingStartTime_yrs = np.nan
+    CumMassAddedImpacts = 0.0
+    CumEnergyAddedImpacts = 0.0
+    CumGenHeatAdded = 0.0
+    CrustBuildOn = 0
+    crystHoleCrust = 0.0
+    crystGlobCrust = 0.0
+    totalHoleAreaCum = 0.0
+    totalEvaluations = 0
+    numIncrements = 0
+    error = ErrorNone
+    errorLuminosity = 0.0
+
+    seriesCapacity = max(vol_increments, 1)
+    holeSeriesCapacity = seriesCapacity if ImpactsSwitch else 1
+
+    series = np.empty((8, seriesCapacity))
+    holeSeries = np.empty((7, holeSeriesCapacity))
+    impactedCrustSeries = np.empty((2, holeSeriesCapacity))
+    numSeries = 0
+    numHoleSeries = 0
+    numImpactedCrustSeries = 0
+
+    holeArea = np.empty(0)
+    holeThickness = np.empty(0)
+    holeTemperature = np.empty(0)
+    numHoles = 0
+
+    CMB_Temperature = _SolidusTemperature(CMB, fractionLiquid)
+
+    for interations in range(vol_increments):
+
+        timestepAcceptable = False
+
+        solidifMass = volSize * density_MO
+        solidifEnergy = solidifMass * Heat_fusion_MO
+
+        Core_volume = (4/3) * np.pi * CMB**3
+
+        if (CMB < (Radius_moon - MO_depth_plagBuild)):
+            crystCore2Crust = 1.0
+
+        elif (CMB >= (Radius_moon - MO_depth_plagBuild)):
+
+            if CrustBuildOn == 0:
+                crustBuildingStartTime_yrs = ellapsedTime / 3.154e7
+                CrustBuildOn = 1
+                CrustalThickness = quenchThickness
+
+            crystCore2Crust = 1 - plag_fraction
+
+            if numHoles == 0:
+                crystGlobCrust = 1 - crystCore2Crust
+
+            else:
+
+                distriFactor = plag_holeFill_vs_gblCrust * TotalHoleArea/surfArea_Moon
+
+                if distriFactor > 1:
+                    distriFactor = 1.0
+
+                crystHoleCrust = (1 - crystCore2Crust) * distriFactor
+
+                if (surfArea_Moon - TotalHoleArea) / surfArea_Moon <= 1e-6:
+                    crystGlobCrust = 0.0
+                else:
+                    crystGlobCrust = 1 - crystCore2Crust - crystHoleCrust
+
+            CrustalThickness += (crystGlobCrust * (density_MO / density_crust) * volSize) / (4 * np.pi * Radius_moon**2 - TotalHoleArea)
+
+        else:
+            crystCore2Crust = np.nan
+
+        CMB = ((3 * (Core_volume + crystCore2Crust * volSize)) / (4 * np.pi))**(1/3)
+
+        MO_volume_current -= volSize
+
+        if MO_volume_current < (percMO_remain_end/100) * MO_volume_initial:
+            break
+
+        fractionLiquid = MO_volume_current / MO_volume_initial
+
+        Solidus_temperature = _SolidusTemperature(CMB, fractionLiquid)
+        Temperature_change = CMB_Temperature - Solidus_temperature
+        CMB_Temperature = Solidus_temperature
+
+        Temperature_top_MO = CMB_Temperature - adiabslope * (Radius_moon - CMB)
+
+        coolingEnergy = density_MO * (MO_volume_current + volSize) * Heat_capacity_MO * Temperature_change
+
+        current_MO_depth = Radius_moon - CMB - CrustalThickness_global
+
+        Ra_number = (acc_grav * density_MO * therm_exp_coeff_MO * (CMB_Temperature - Temperature_top_MO) * current_MO_depth**3) / (dy_viscosity_MO * Diffusivity_MO)
+
+        Rad_Flux = Emissivity * SB * (Temperature_top_MO**4 - Temperature_equl**4)
+
+        # Equilibrium quench crust thickness of this increment (computed the first time it is needed)
+        EqulQuenchThickness = 0.0
+        haveEqulQuench = False
+
+        linearBudget = secantSolver and (not ImpactsSwitch or (CrustBuildOn == 0 and quenchThickness == 0 and numHoles == 0))
+
+        TotalHoleArea_start = TotalHoleArea
+        Extra_Crust_Due_Impacts_start = Extra_Crust_Due_Impacts
+        vol_Quench_excavated_start = vol_Quench_excavated
+
+        # Timestep solver state (see TimestepSolver.py)
+        evaluations = 0
+        lastTimeStep = 0.0
+        lastResidual = 0.0
+        haveLast = False
+        lo = 0.0
+        hi = np.inf
+        nextTimeStep = timeStep
+
+        while (timestepAcceptable == False):
+
+            area = holeArea[:numHoles].copy()
+            thickness = holeThickness[:numHoles].copy()
+            temperature = holeTemperature[:numHoles].copy()
+            numHoles_copy = numHoles
+
+            TotalHoleArea = TotalHoleArea_start
+            Extra_Crust_Due_Impacts = Extra_Crust_Due_Impacts_start
+            vol_Quench_excavated = vol_Quench_excavated_start
+            HoleThickness_times_HoleArea_try = 0.0
+            MassQuenchAdded = 0.0
+            MassImpactors_thisTimestep = 0.0
+            EnergyImpactors_thisTimestep = 0.0
+            AreaHolesAdded_thisTimestep = 0.0
+
+            if numHoles_copy != 0:
+
+                if CrustBuildOn == 0:
+
+                    if not haveEqulQuench:
+                        EqulQuenchThickness = _EqulQuenchThickness(CMB_Temperature, current_MO_depth, Heat_capacity_MO, density_MO, Diffusivity_MO, Ra_number, \
+                                                                   Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, Heat_capacity_quench, \
+                                                                   Temperature_melt, Max_Quench_Thickness)
+                        haveEqulQuench = True
+
+                    for i in range(numHoles_copy):
+                        if thickness[i] < Max_Quench_Thickness:
+                            MassQuenchAdded += (EqulQuenchThickness - thickness[i]) * area[i] * density_quench
+                            temperature[i] = _SurfaceTemperature(Temperature_top_MO, temperature[i], EqulQuenchThickness, Diffusivity_quench, density_quench, \
+                                                                 Heat_capacity_quench, SB, Emissivity, Temperature_equl)
+                            thickness[i] = EqulQuenchThickness
+
+                    for i in range(numHoles_copy):
+                        if thickness[i] >= Max_Quench_Thickness:
+                            thickness[i] = Max_Quench_Thickness
+
+                elif CrustBuildOn == 1:
+
+                    for i in range(numHoles_copy):
+                        thickness[i] += (crystHoleCrust * (density_MO / density_crust) * volSize) / TotalHoleArea
+
+                    HoleThickness_times_HoleArea_try = np.sum(thickness * area)
+
+                    for i in range(numHoles_copy):
+                        temperature[i] = _SurfaceTemperature(Temperature_top_MO, temperature[i], thickness[i], Diffusivity_crust, density_crust, \
+                                                             Heat_capacity_crust, SB, Emissivity, Temperature_equl)
+
+            if CrustBuildOn == 0 and QuenchSwitch:
+
+                if not haveEqulQuench:
+                    EqulQuenchThickness = _EqulQuenchThickness(CMB_Temperature, current_MO_depth, Heat_capacity_MO, density_MO, Diffusivity_MO, Ra_number, \
+                                                               Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, Heat_capacity_quench, \
+                                                               Temperature_melt, Max_Quench_Thickness)
+                    haveEqulQuench = True
+
+                PresentQuenchThickness = EqulQuenchThickness
+
+                PresentTemperature_top_quench = _SurfaceTemperature(Temperature_top_MO, Temperature_top_MO, quenchThickness, Diffusivity_quench, density_quench, \
+                                                                    Heat_capacity_quench, SB, Emissivity, Temperature_equl)
+
+                if (quenchThickness < Max_Quench_Thickness):
+                    MassQuenchAdded += (PresentQuenchThickness - quenchThickness) * (surfArea_Moon - TotalHoleArea) * density_quench
+
+            if ImpactsSwitch and (CrustBuildOn == 1 or quenchThickness != 0):
+
+                areaHoles, MassImpactors_thisTimestep, EnergyImpactors_thisTimestep = _Impacts(ellapsedTime/3.154e7, timeStep/3.154e7, mass2area, exactImpacts, \
+                                                                                               times, massRates, energyRates, cumMass, cumEnergy)
+
+                AreaHolesAdded_thisTimestep += areaHoles
+
+                if areaHoles != 0:
+
+                    if CrustBuildOn == 1:
+
+                        vol_Crust_excavated_inHoleAreas = (TotalHoleArea / surfArea_Moon) * areaHoles * (HoleThickness_times_HoleArea_Sum / TotalHoleArea)
+                        vol_Crust_excavated_nonImpactedAreas = ((surfArea_Moon - TotalHoleArea) / surfArea_Moon) * areaHoles * CrustalThickness
+                        vol_Crust_excavated = vol_Crust_excavated_inHoleAreas + vol_Crust_excavated_nonImpactedAreas
+
+                        Extra_Crust_Due_Impacts = vol_Crust_excavated / surfArea_Moon
+
+                        for i in range(numHoles_copy):
+                            thickness[i] += Extra_Crust_Due_Impacts
+                            area[i] *= (1 - (areaHoles / surfArea_Moon))
+
+                    elif TotalHoleArea != 0:
+
+                        vol_Quench_excavated_inHoleAreas = (TotalHoleArea / surfArea_Moon) * areaHoles * (HoleThickness_times_HoleArea_Sum / TotalHoleArea)
+                        vol_Quench_excavated_nonImpactedAreas = ((surfArea_Moon - TotalHoleArea) / surfArea_Moon) * areaHoles * quenchThickness
+                        vol_Quench_excavated = vol_Quench_excavated_inHoleAreas + vol_Quench_excavated_nonImpactedAreas
+
+                        for i in range(numHoles_copy):
+                            area[i] *= (1 - (areaHoles / surfArea_Moon))
+
+                    if not haveEqulQuench:
+                        EqulQuenchThickness = _EqulQuenchThickness(CMB_Temperature, current_MO_depth, Heat_capacity_MO, density_MO, Diffusivity_MO, Ra_number, \
+                                                                   Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, Heat_capacity_quench, \
+                                                                   Temperature_melt, Max_Quench_Thickness)
+                        haveEqulQuench = True
+
+                    PresentTemperature_top_quench_inHole = _SurfaceTemperature(Temperature_top_MO, Temperature_top_MO, EqulQuenchThickness, Diffusivity_quench, \
+                                                                               density_quench, Heat_capacity_quench, SB, Emissivity, Temperature_equl)
+
+                    area, thickness, temperature, numHoles_copy = _AppendHole(area, thickness, temperature, numHoles_copy, areaHoles, EqulQuenchThickness, \
+                                                                              PresentTemperature_top_quench_inHole)
+
+                    if CrustBuildOn == 1:
+                        MassQuenchAdded += EqulQuenchThickness * areaHoles * density_quench
+                    else:
+                        MassQuenchAdded += EqulQuenchThickness * areaHoles * density_quench - density_quench * vol_Quench_excavated
+
+            quenchFormEnergy = MassQuenchAdded * Heat_fusion_MO
+
+            if np.isinf(timeStep):
+                error = ErrorInfiniteTimestep
+                break
+
+            AdditionalHeating = HeatingRate * timeStep if GeneralHeatingSwitch else 0.0
+
+            Energy2Dump = solidifEnergy + coolingEnergy - quenchFormEnergy + AdditionalHeating
+
+            if KineticEnergySwitch:
+                Energy2Dump += KEefficiency * EnergyImpactors_thisTimestep
+
+            if quenchThickness == 0 and CrustBuildOn == 0:
+
+                Lum_dump = surfArea_Moon * Rad_Flux
+
+            elif QuenchSwitch and CrustBuildOn == 0:
+
+                if ImpactsSwitch:
+
+                    Temperature_top_quench = _SurfaceTemperature(Temperature_melt, Temperature_melt, quenchThickness, Diffusivity_quench, density_quench, \
+                                                                 Heat_capacity_quench, SB, Emissivity, Temperature_equl)
+
+                    TotalHoleArea = np.sum(area[:numHoles_copy])
+
+                    Lum_holes = 0.0
+                    for i in range(numHoles_copy):
+                        if thickness[i] != 0:
+                            Lum_holes += area[i] * Diffusivity_quench * density_quench * Heat_capacity_quench * (Temperature_melt - temperature[i]) / thickness[i]
+                        else:
+                            Lum_holes += area[i] * Rad_Flux
+
+                    Lum_cond_restMoon = (surfArea_Moon - TotalHoleArea) * Diffusivity_quench * density_quench * Heat_capacity_quench * \
+                                        (Temperature_melt - Temperature_top_quench) / quenchThickness
+
+                    Lum_dump = Lum_holes + Lum_cond_restMoon
+
+                    if surfArea_Moon < TotalHoleArea:
+                        error = ErrorHoleAreaQuench
+                        break
+
+                else:
+
+                    Lum_dump = surfArea_Moon * Diffusivity_quench * density_quench * Heat_capacity_quench * (Temperature_melt - PresentTemperature_top_quench) / quenchThickness
+
+            else:
+
+                Temperature_top_crust = _SurfaceTemperature(Temperature_top_MO, Temperature_top_MO, CrustalThickness, Diffusivity_crust, density_crust, \
+                                                            Heat_capacity_crust, SB, Emissivity, Temperature_equl)
+
+                if ImpactsSwitch:
+
+                    TotalHoleArea = np.sum(area[:numHoles_copy])
+
+                    Lum_holes = 0.0
+                    for i in range(numHoles_copy):
+                        if thickness[i] != 0:
+                            Lum_holes += area[i] * Diffusivity_crust * density_crust * Heat_capacity_crust * (Temperature_melt - temperature[i]) / thickness[i]
+                        else:
+                            Lum_holes += area[i] * Rad_Flux
+
+                    Lum_cond_restMoon = (surfArea_Moon - TotalHoleArea) * Diffusivity_crust * density_crust * Heat_capacity_crust * \
+                                        (Temperature_top_MO - Temperature_top_crust) / CrustalThickness
+
+                    Lum_dump = Lum_holes + Lum_cond_restMoon
+
+                    if surfArea_Moon < TotalHoleArea:
+                        error = ErrorHoleAreaPlag
+                        break
+
+                else:
+
+                    Lum_dump = surfArea_Moon * Diffusivity_crust * density_crust * Heat_capacity_crust * (Temperature_top_MO - Temperature_top_crust) / CrustalThickness
+
+            if linearBudget:
+
+                Energy2Dump_fixed = Energy2Dump - AdditionalHeating
+
+                netLuminosity = Lum_dump - (HeatingRate if GeneralHeatingSwitch else 0.0)
+
+                if netLuminosity <= 0:
+                    error = ErrorHeatingExceedsLoss
+                    errorLuminosity = Lum_dump
+                    break
+
+                timeStep = Energy2Dump_fixed / netLuminosity
+
+                if np.isinf(timeStep):
+                    error = ErrorInfiniteTimestep
+                    break
+
+                AdditionalHeating = HeatingRate * timeStep if GeneralHeatingSwitch else 0.0
+
+                Energy2Dump = Energy2Dump_fixed + AdditionalHeating
+
+            time2Dump = Energy2Dump / Lum_dump
+
+            if linearBudget:
+
+                timestepAcceptable = True
+                evaluations = 1
+
+            else:
+
+                evaluations += 1
+
+                if abs(timeStep - time2Dump) <= timeStep_tol * abs(time2Dump):
+                    timestepAcceptable = True
+
+                elif evaluations >= timeStep_maxIter:
+                    error = ErrorTimestepNotConverged
+                    break
+
+                elif not secantSolver:
+                    nextTimeStep = time2Dump
+
+                else:
+
+                    residual = time2Dump - timeStep
+
+                    if residual > 0:
+                        lo = max(lo, timeStep)
+                    else:
+                        hi = min(hi, timeStep)
+
+                    if not haveLast or residual == lastResidual:
+                        nextTimeStep = time2Dump
+                    else:
+                        nextTimeStep = timeStep - residual * (timeStep - lastTimeStep) / (residual - lastResidual)
+
+                    if not (lo < nextTimeStep < hi):
+                        if np.isinf(hi):
+                            nextTimeStep = max(time2Dump, 2 * lo)
+                        else:
+                            nextTimeStep = 0.5 * (lo + hi)
+
+                    lastTimeStep = timeStep
+                    lastResidual = residual
+                    haveLast = True
+
+                    if hi - lo <= timeStep_tol * timeStep:
+                        timestepAcceptable = True
+
+            if timestepAcceptable:
+
+                holeArea, holeThickness, holeTemperature, numHoles = area, thickness, temperature, numHoles_copy
+
+                if CrustBuildOn == 1 and ImpactsSwitch:
+                    HoleThickness_times_HoleArea_Sum = HoleThickness_times_HoleArea_try
+
+            else:
+                timeStep = nextTimeStep
+
+        if error != ErrorNone:
+            break
+
+        if QuenchSwitch and (quenchThickness < Max_Quench_Thickness):
+            quenchThickness += (PresentQuenchThickness - quenchThickness)
+
+        if QuenchSwitch:
+
+            MO_volume_current -= MassQuenchAdded / density_MO
+
+            if MO_volume_current < (percMO_remain_end/100) * MO_volume_initial:
+                break
+
+            fractionLiquid = MO_volume_current / MO_volume_initial
+
+        if CrustBuildOn == 1 and numHoles != 0:
+
+            CrustalThickness = CrustalThickness + Extra_Crust_Due_Impacts
+            CrustThicknessImpMoon = HoleThickness_times_HoleArea_Sum / TotalHoleArea
+
+            impactedCrustSeries[0, numImpactedCrustSeries] = ellapsedTime
+            impactedCrustSeries[1, numImpactedCrustSeries] = CrustThicknessImpMoon
+            numImpactedCrustSeries += 1
+
+            CrustalThickness_global = (CrustalThickness * (surfArea_Moon - TotalHoleArea) / surfArea_Moon) + (CrustThicknessImpMoon * TotalHoleArea / surfArea_Moon)
+
+        else:
+            CrustalThickness_global = CrustalThickness
+
+        if CrustBuildOn == 0:
+            numHoles = _KeepHoles(holeArea, holeThickness, holeTemperature, numHoles, holeThickness[:numHoles] < quenchThickness)
+        else:
+            numHoles = _KeepHoles(holeArea, holeThickness, holeTemperature, numHoles, holeThickness[:numHoles] < CrustalThickness)
+
+        if numHoles != 0:
+
+            totalHoleAreaCum += AreaHolesAdded_thisTimestep
+
+            holeSeries[0, numHoleSeries] = ellapsedTime
+            holeSeries[1, numHoleSeries] = (np.sum(holeArea[:numHoles]) / surfArea_Moon) * 100
+            holeSeries[2, numHoleSeries] = np.sum(holeThickness[:numHoles]) / numHoles
+            holeSeries[3, numHoleSeries] = np.sum(holeTemperature[:numHoles]) / numHoles
+            holeSeries[4, numHoleSeries] = AreaHolesAdded_thisTimestep/(timeStep/3.154e7)
+            holeSeries[5, numHoleSeries] = (totalHoleAreaCum/surfArea_Moon)*100
+            holeSeries[6, numHoleSeries] = numHoles
+            numHoleSeries += 1
+
+        CumMassAddedImpacts += MassImpactors_thisTimestep
+        CumEnergyAddedImpacts += KEefficiency * EnergyImpactors_thisTimestep
+        CumGenHeatAdded += AdditionalHeating
+
+        ellapsedTime += time2Dump
+
+        series[0, numSeries] = ellapsedTime
+        series[1, numSeries] = fractionLiquid
+        series[2, numSeries] = CMB
+        series[3, numSeries] = CMB_Temperature
+        series[4, numSeries] = CrustalThickness
+        series[5, numSeries] = CrustalThickness_global
+        series[6, numSeries] = evaluations
+        series[7, numSeries] = volSize
+        numSeries += 1
+
+        totalEvaluations += evaluations
+        numIncrements += 1
+
+    finalState = np.array([CMB, CrustalThickness, CrustalThickness_global, fractionLiquid, ellapsedTime, CumMassAddedImpacts, CumEnergyAddedImpacts, \
+                           CumGenHeatAdded, crustBuildingStartTime_yrs])
+
+    return series[:, :numSeries], holeSeries[:, :numHoleSeries], impactedCrustSeries[:, :numImpactedCrustSeries], holeArea[:numHoles].copy(), \
+           holeThickness[:numHoles].copy(), holeTemperature[:numHoles].copy(), finalState, totalEvaluations, numIncrements, error, errorLuminosity
+
+
+# Run CoolingLoop (same arguments), or return None if Numba cannot compile it for them; the engine is then turned off for
+# the rest of the process, so runs use the reference loop in MAIN.py
+def RunCoolingLoop(*args):
+
+    global Available
+
+    try:
+        return CoolingLoop(*args)
+    except CompileErrors as e:
+        Available = False
+        warnings.warn('Compiled cooling loop not used, running the reference loop (%s: %s)' % (type(e).__name__, str(e).splitlines()[0] if str(e) else ''))
+        return None
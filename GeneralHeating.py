@@ -10,12 +10,12 @@ By: Viranga Perera & Alan P. Jackson
 
 from __future__ import division
 import numpy as np
-import sys
 
 def GeneralHeating(GeneralHeatingSwitch, HeatingRate, timeStep):
 
+    # An infinite timestep means the magma ocean can no longer lose its energy, so the run cannot continue
     if np.isinf(timeStep):
-        sys.exit()
+        raise FloatingPointError('Infinite timestep passed to GeneralHeating')
 
     if GeneralHeatingSwitch == False:    
                 
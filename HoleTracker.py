@@ -0,0 +1,96 @@
+"""
+
+Store for the holes punctured into the quench/plag crust by impacts
+
+Each hole has an area, a crust thickness and a temperature at the top of its crust. These are kept as three
+parallel NumPy arrays (instead of a list of [area, thickness, temperature] lists) so that the per-hole updates
+in MAIN.py can be done with one vectorized expression for all holes at once.
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+
+class HoleTracker(object):
+
+    def __init__(self, capacity=256):
+
+        self._area = np.empty(capacity)              # Area of each hole (m^2)
+        self._thickness = np.empty(capacity)         # Thickness of crust on top of each hole (m)
+        self._temperature = np.empty(capacity)       # Temperature at the top of the crust of each hole (K)
+        self.n = 0                                   # Number of holes currently tracked
+
+    def __len__(self):
+        return self.n
+
+    # Views of the holes currently tracked (changing these changes the tracker)
+    @property
+    def area(self):
+        return self._area[:self.n]
+
+    @area.setter
+    def area(self, value):
+        self._area[:self.n] = value
+
+    @property
+    def thickness(self):
+        return self._thickness[:self.n]
+
+    @thickness.setter
+    def thickness(self, value):
+        self._thickness[:self.n] = value
+
+    @property
+    def temperature(self):
+        return self._temperature[:self.n]
+
+    @temperature.setter
+    def temperature(self, value):
+        self._temperature[:self.n] = value
+
+    # Add a new hole (storage is doubled when full so that appending is cheap on average)
+    def Append(self, area, thickness, temperature):
+
+        if self.n == self._area.shape[0]:
+
+            newCapacity = max(2 * self._area.shape[0], 1)
+
+            for name in ('_area', '_thickness', '_temperature'):
+                newArray = np.empty(newCapacity)
+                newArray[:self.n] = getattr(self, name)[:self.n]
+                setattr(self, name, newArray)
+
+        self._area[self.n] = area
+        self._thickness[self.n] = thickness
+        self._temperature[self.n] = temperature
+        self.n += 1
+
+    # Keep only the holes where mask is True (order of the remaining holes is preserved)
+    def Keep(self, mask):
+
+        numKept = np.count_nonzero(mask)
+
+        if numKept == self.n:
+            return
+
+        self._area[:numKept] = self.area[mask]
+        self._thickness[:numKept] = self.thickness[mask]
+        self._temperature[:numKept] = self.temperature[mask]
+        self.n = numKept
+
+    # Independent copy of the tracker (used so that every try of a timestep starts from the same holes)
+    def Copy(self):
+
+        newTracker = HoleTracker(max(self._area.shape[0], 1))
+        newTracker._area[:self.n] = self.area
+        newTracker._thickness[:self.n] = self.thickness
+        newTracker._temperature[:self.n] = self.temperature
+        newTracker.n = self.n
+
+        return newTracker
+
+    # Holes as an (n x 3) array of [area, thickness, temperature]
+    def AsArray(self):
+        return np.column_stack((self.area, self.thickness, self.temperature))
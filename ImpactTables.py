@@ -0,0 +1,122 @@
+"""
+
+Loader for the re-impacting debris tables (AlanData_*.csv, EarthData_*.csv)
+
+The first time a table is loaded its CSV is parsed and saved as a binary .npy file in a cache directory next to it
+(.iMagmaCache/), named by the SHA-1 hash of the CSV contents. Later loads (from any run or sweep worker) memory-map that
+.npy file read-only, so the CSV is parsed once per table rather than once per run, and all processes on a node share the
+same pages of the table. The hash of each CSV is kept with its mtime and size in a small JSON index, so the CSV is only
+hashed again when it changes.
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import os
+import json
+import hashlib
+import tempfile
+
+CacheDirectoryName = '.iMagmaCache'
+
+# Tables already mapped by this process (keyed by absolute path, mtime and size of the CSV)
+_loadedTables = {}
+
+
+# SHA-1 hash of the contents of a file
+def FileHash(fileName):
+
+    sha = hashlib.sha1()
+
+    with open(fileName, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            sha.update(block)
+
+    return sha.hexdigest()
+
+
+# Write a file in one step (write to a temporary file and rename) so other workers never see a partial file
+def _AtomicSave(fileName, writer):
+
+    directory = os.path.dirname(fileName)
+    handle, tempName = tempfile.mkstemp(dir=directory, suffix='.tmp')
+
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            writer(f)
+        os.replace(tempName, fileName)
+    except BaseException:
+        if os.path.exists(tempName):
+            os.remove(tempName)
+        raise
+
+
+# Cache directory for a CSV (made if it does not exist yet)
+def _CacheDirectory(csvPath, cacheDir):
+
+    if cacheDir is None:
+        cacheDir = os.path.join(os.path.dirname(csvPath), CacheDirectoryName)
+
+    if not os.path.isdir(cacheDir):
+        os.makedirs(cacheDir, exist_ok=True)
+
+    return cacheDir
+
+
+# Hash of a CSV, using the JSON index when its mtime and size have not changed
+def _TableHash(csvPath, cacheDir):
+
+    stat = os.stat(csvPath)
+    indexPath = os.path.join(cacheDir, os.path.basename(csvPath) + '.json')
+
+    try:
+        with open(indexPath, 'r') as f:
+            index = json.load(f)
+        if index['mtime'] == stat.st_mtime and index['size'] == stat.st_size:
+            return index['sha1']
+    except (IOError, OSError, ValueError, KeyError):
+        pass
+
+    sha1 = FileHash(csvPath)
+    index = {'mtime': stat.st_mtime, 'size': stat.st_size, 'sha1': sha1}
+
+    _AtomicSave(indexPath, lambda f: f.write(json.dumps(index).encode('utf-8')))
+
+    return sha1
+
+
+# Load an impacts table as a read-only array (same values as np.genfromtxt(fileName, skip_header=1, delimiter=','))
+# cacheDir defaults to .iMagmaCache/ in the directory of the CSV
+def LoadImpactTable(fileName, cacheDir=None, skip_header=1):
+
+    csvPath = os.path.abspath(fileName)
+    stat = os.stat(csvPath)
+    key = (csvPath, stat.st_mtime, stat.st_size)
+
+    if key in _loadedTables:
+        return _loadedTables[key]
+
+    cacheDir = _CacheDirectory(csvPath, cacheDir)
+
+    sha1 = _TableHash(csvPath, cacheDir)
+    npyPath = os.path.join(cacheDir, os.path.basename(csvPath) + '.' + sha1 + '.npy')
+
+    if not os.path.isfile(npyPath):
+        table = np.genfromtxt(csvPath, skip_header=skip_header, delimiter=',')
+        _AtomicSave(npyPath, lambda f: np.save(f, np.ascontiguousarray(table, dtype=float)))
+
+    table = np.load(npyPath, mmap_mode='r')
+
+    _loadedTables[key] = table
+
+    return table
+
+
+# Hash of the contents of an impacts table (used to identify the table a run used)
+def ImpactTableHash(fileName, cacheDir=None):
+
+    csvPath = os.path.abspath(fileName)
+
+    return _TableHash(csvPath, _CacheDirectory(csvPath, cacheDir))
@@ -55,3 +55,96 @@ def PuncturingImpacts(ellapsedTime, timestep, mass2area, AlanData):
     
 
     return areaHoles, MassImpacts, EnergyImpacts
+
+
+# Impact flux built once from Alan's impacts table (columns: time in yrs, mass per yr, energy per yr)
+#
+# The rates in the table are taken to hold from their time until the next time in the table, and beyond the last time in the
+# table they decay as 1/t (same as PuncturingImpacts). The cumulative mass and energy at every time in the table are computed
+# once, so the mass and energy delivered over any interval are found exactly with np.searchsorted instead of scanning the table.
+# All methods take scalars or arrays of times.
+class ImpactFlux(object):
+
+    def __init__(self, AlanData):
+
+        AlanData = np.asarray(AlanData, dtype=float)
+
+        # Tables are normally already sorted in time, in which case the columns are views (no copy of a memory-mapped table)
+        if not np.all(np.diff(AlanData[:,0]) >= 0):
+            AlanData = AlanData[np.argsort(AlanData[:,0], kind='mergesort')]
+
+        self.times = AlanData[:,0]                     # Times in table (yrs)
+        self.massRates = AlanData[:,1]                 # Mass per time (kg/yr)
+        self.energyRates = AlanData[:,2]               # Energy per time (J/yr)
+
+        # Cumulative mass and energy delivered from the first time in the table up to each time in the table
+        self.cumMass = np.concatenate(([0.0], np.cumsum(self.massRates[:-1] * np.diff(self.times))))
+        self.cumEnergy = np.concatenate(([0.0], np.cumsum(self.energyRates[:-1] * np.diff(self.times))))
+
+        self.lastTime = self.times[-1]
+
+    # Row of the table that applies at each time (-1 before the first time in the table)
+    def _Row(self, t):
+        return np.searchsorted(self.times, t, side='right') - 1
+
+    def _Cumulative(self, t, rates, cumulative):
+
+        t = np.asarray(t, dtype=float)
+        row = self._Row(t)
+        rowClipped = np.clip(row, 0, self.times.shape[0] - 1)
+
+        inTable = cumulative[rowClipped] + rates[rowClipped] * (np.minimum(t, self.lastTime) - self.times[rowClipped])
+
+        # Beyond the table the rate is rates[-1] * lastTime / t, which integrates to a logarithm
+        tail = rates[-1] * self.lastTime * np.log(np.maximum(t, self.lastTime) / self.lastTime)
+
+        return np.where(row < 0, 0.0, inTable + tail)
+
+    # Total mass (kg) delivered up to time t (yrs)
+    def CumulativeMass(self, t):
+        return self._Cumulative(t, self.massRates, self.cumMass)
+
+    # Total energy (J) delivered up to time t (yrs)
+    def CumulativeEnergy(self, t):
+        return self._Cumulative(t, self.energyRates, self.cumEnergy)
+
+    # Mass (kg) and energy (J) delivered between t and t + dt (yrs)
+    def Integrate(self, t, dt):
+
+        t = np.asarray(t, dtype=float)
+        tEnd = t + dt
+
+        return self.CumulativeMass(tEnd) - self.CumulativeMass(t), self.CumulativeEnergy(tEnd) - self.CumulativeEnergy(t)
+
+    # Same as PuncturingImpacts but with the mass and energy integrated exactly over the timestep
+    def PuncturingImpacts(self, ellapsedTime, timestep, mass2area):
+
+        MassImpacts, EnergyImpacts = self.Integrate(ellapsedTime, timestep)
+
+        areaHoles = MassImpacts / mass2area
+
+        if np.ndim(areaHoles) == 0:
+            return float(areaHoles), float(MassImpacts), float(EnergyImpacts)
+
+        return areaHoles, MassImpacts, EnergyImpacts
+
+    # Same values as PuncturingImpacts (rate at the middle of the timestep multiplied by the timestep) using the indexed table
+    def MidpointImpacts(self, ellapsedTime, timestep, mass2area):
+
+        ellapsedTime = np.asarray(ellapsedTime, dtype=float)
+        row = self._Row(ellapsedTime + (timestep/2))
+        rowClipped = np.clip(row, 0, self.times.shape[0] - 1)
+
+        massRate = np.where(ellapsedTime <= self.lastTime, np.where(row < 0, 0.0, self.massRates[rowClipped]), \
+                            self.massRates[-1] * self.lastTime / np.maximum(ellapsedTime, self.lastTime))
+        energyRate = np.where(ellapsedTime <= self.lastTime, np.where(row < 0, 0.0, self.energyRates[rowClipped]), \
+                              self.energyRates[-1] * self.lastTime / np.maximum(ellapsedTime, self.lastTime))
+
+        MassImpacts = massRate * timestep
+        EnergyImpacts = energyRate * timestep
+        areaHoles = MassImpacts / mass2area
+
+        if np.ndim(areaHoles) == 0:
+            return float(areaHoles), float(MassImpacts), float(EnergyImpacts)
+
+        return areaHoles, MassImpacts, EnergyImpacts
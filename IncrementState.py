@@ -0,0 +1,72 @@
+"""
+
+Quantities that stay the same for the whole of one volume increment of the magma ocean cooling
+
+Within an increment MAIN.py may redo the timestep several times (until the timestep matches the time needed to
+dump the energy), but the magma ocean state (CMB temperature, temperature at the top of the magma ocean, depth,
+Rayleigh number) does not change between those tries. The equilibrium quench crust, the radiative flux and the
+surface temperatures of the global lids are therefore computed once per increment here and reused by every hole,
+the global quench and every retry.
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+
+import QuenchCrust as QC
+
+class IncrementState(object):
+
+    def __init__(self, CMB_Temperature, Temperature_top_MO, current_MO_depth, Ra_number, Heat_capacity_MO, density_MO, Diffusivity_MO, \
+                 Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, Heat_capacity_quench, Temperature_melt, Max_Quench_Thickness):
+
+        self.CMB_Temperature = CMB_Temperature
+        self.Temperature_top_MO = Temperature_top_MO
+        self.current_MO_depth = current_MO_depth
+        self.Ra_number = Ra_number
+
+        self._quenchInputs = (Heat_capacity_MO, density_MO, Diffusivity_MO, Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, \
+                              Heat_capacity_quench, Temperature_melt, Max_Quench_Thickness)
+        self._quench = None
+
+        # Fourth power of the temperature at the top of the magma ocean and radiative flux from an uncovered magma ocean
+        self.Temperature_top_MO4 = pow(Temperature_top_MO, 4)
+        self.Rad_Flux = Emissivity * SB * (self.Temperature_top_MO4 - pow(Temperature_equl, 4))
+
+        # Surface temperatures of global lids already solved during this increment (keyed by lid name)
+        self.lidTemperatures = {}
+
+    # Equilibrium quench crust is only computed the first time it is needed in the increment
+    def _Quench(self):
+
+        if self._quench is None:
+
+            (Heat_capacity_MO, density_MO, Diffusivity_MO, Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, \
+             Heat_capacity_quench, Temperature_melt, Max_Quench_Thickness) = self._quenchInputs
+
+            self._quench = QC.QuenchCrustEquilibrium(self.CMB_Temperature, self.current_MO_depth, Heat_capacity_MO, density_MO, Diffusivity_MO, \
+                                                     self.Ra_number, Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, \
+                                                     Heat_capacity_quench, Temperature_melt, Max_Quench_Thickness)
+
+        return self._quench
+
+    @property
+    def cond_flux_MO(self):
+        return self._Quench()[0]
+
+    @property
+    def Nu(self):
+        return self._Quench()[1]
+
+    @property
+    def convec_flux_MO(self):
+        return self._Quench()[2]
+
+    @property
+    def EqulTemperature_top_quench(self):
+        return self._Quench()[3]
+
+    @property
+    def EqulQuenchThickness(self):
+        return self._Quench()[4]
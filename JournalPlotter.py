@@ -12,6 +12,9 @@ matplotlib.use('Agg')   # Used for .eps files
 import matplotlib.pyplot as plt
 from matplotlib import gridspec
 
+import ImpactTables as IT     # Cached (memory-mapped) loader for the impacts tables
+import ResultBundle as RB     # Reads the output of a run from its result bundle (or its CSV files for older runs)
+
 # Define path
 UserPath = '/home/viranga/'
 
@@ -49,10 +52,10 @@ if (whichPlotsToMake == 1) or (whichPlotsToMake == 0):
     plt.figure(11)
 
     # Get data
-    Moon_100km_10Re = np.genfromtxt(UserPath + 'iMagma4/AlanData_100km_10Re.csv', delimiter=',', skip_header=1)
-    Moon_500km_10Re = np.genfromtxt(UserPath + 'iMagma4/AlanData_500km_10Re.csv', delimiter=',', skip_header=1)
-    Earth_100km_10Re = np.genfromtxt(UserPath + 'iMagma4/EarthData_100km_10Re.csv', delimiter=',', skip_header=1)
-    Earth_500km_10Re = np.genfromtxt(UserPath + 'iMagma4/EarthData_500km_10Re.csv', delimiter=',', skip_header=1)
+    Moon_100km_10Re = IT.LoadImpactTable(UserPath + 'iMagma4/AlanData_100km_10Re.csv')
+    Moon_500km_10Re = IT.LoadImpactTable(UserPath + 'iMagma4/AlanData_500km_10Re.csv')
+    Earth_100km_10Re = IT.LoadImpactTable(UserPath + 'iMagma4/EarthData_100km_10Re.csv')
+    Earth_500km_10Re = IT.LoadImpactTable(UserPath + 'iMagma4/EarthData_500km_10Re.csv')
 
     # Line Plots
     plt.loglog(Moon_100km_10Re[:,0], Moon_100km_10Re[:,1], color='#db6d00', linewidth=2, label='Moon (LD = 100 km)')
@@ -95,10 +98,10 @@ if (whichPlotsToMake == 1) or (whichPlotsToMake == 0):
     plt.figure(12)
 
     # Get data
-    Moon_100km_60Re = np.genfromtxt(UserPath + 'iMagma4/AlanData_100km_60Re.csv', delimiter=',', skip_header=1)
-    Moon_500km_60Re = np.genfromtxt(UserPath + 'iMagma4/AlanData_500km_60Re.csv', delimiter=',', skip_header=1)
-    Earth_100km_60Re = np.genfromtxt(UserPath + 'iMagma4/EarthData_100km_60Re.csv', delimiter=',', skip_header=1)
-    Earth_500km_60Re = np.genfromtxt(UserPath + 'iMagma4/EarthData_500km_60Re.csv', delimiter=',', skip_header=1)
+    Moon_100km_60Re = IT.LoadImpactTable(UserPath + 'iMagma4/AlanData_100km_60Re.csv')
+    Moon_500km_60Re = IT.LoadImpactTable(UserPath + 'iMagma4/AlanData_500km_60Re.csv')
+    Earth_100km_60Re = IT.LoadImpactTable(UserPath + 'iMagma4/EarthData_100km_60Re.csv')
+    Earth_500km_60Re = IT.LoadImpactTable(UserPath + 'iMagma4/EarthData_500km_60Re.csv')
 
     # Line Plots
     plt.loglog(Moon_100km_60Re[:,0], Moon_100km_60Re[:,1], color='#db6d00', linewidth=2, label='Moon (LD = 100 km)')
@@ -341,10 +344,10 @@ if (whichPlotsToMake == 4) or (whichPlotsToMake == 0):
     plt.figure(4)
     
     # Get data
-    Lindy = np.genfromtxt(UserPath + 'ParaSearch/NoImpacts/iMagma4_M/1/noImpacts_noQuench.csv', delimiter=',')
-    Lindy_wQuench = np.genfromtxt(UserPath + 'ParaSearch/NoImpacts/iMagma4_B/1/noImpacts_wQuench.csv', delimiter=',')
-    #Lindy_w250surfTemp = np.genfromtxt(UserPath + 'ParaSearch/NoImpacts/iMagma4_M/5/noImpacts_noQuench.csv', delimiter=',')
-    #Lindy_w250surfTemp_wQuench = np.genfromtxt(UserPath + 'ParaSearch/NoImpacts/iMagma4_B/5/noImpacts_wQuench.csv', delimiter=',')
+    Lindy = RB.LoadOutputFile(UserPath + 'ParaSearch/NoImpacts/iMagma4_M/1/noImpacts_noQuench.csv')
+    Lindy_wQuench = RB.LoadOutputFile(UserPath + 'ParaSearch/NoImpacts/iMagma4_B/1/noImpacts_wQuench.csv')
+    #Lindy_w250surfTemp = RB.LoadOutputFile(UserPath + 'ParaSearch/NoImpacts/iMagma4_M/5/noImpacts_noQuench.csv')
+    #Lindy_w250surfTemp_wQuench = RB.LoadOutputFile(UserPath + 'ParaSearch/NoImpacts/iMagma4_B/5/noImpacts_wQuench.csv')
     
     # Plot
     plt.semilogx(Lindy[0,:]/3.154e7, Lindy[1,:]*100, '#006ddb', linewidth = 5, label='EBY11')
@@ -384,11 +387,11 @@ if (whichPlotsToMake == 5) or (whichPlotsToMake == 0):
     fig, ax = plt.subplots()
     
     # Get data
-    crust_noImpacts = np.genfromtxt(UserPath + 'Converge/iMagma4_n/3/noImpacts_wQuench_CrustalThickness.csv', delimiter=',')
-    crust_k_1e9 = np.genfromtxt(UserPath + 'Converge/iMagma4_iA/3/wImpacts_wQuench_CrustalThickness.csv', delimiter=',')
-    crust_k_1e7 = np.genfromtxt(UserPath + 'Converge/iMagma4_iB/3/wImpacts_wQuench_CrustalThickness.csv', delimiter=',')
-    crust_k_1e6 = np.genfromtxt(UserPath + 'Converge/iMagma4_iC/12/wImpacts_wQuench_CrustalThickness.csv', delimiter=',')
-    crust_k_1e5 = np.genfromtxt(UserPath + 'Converge/iMagma4_iD/9/wImpacts_wQuench_CrustalThickness.csv', delimiter=',')
+    crust_noImpacts = RB.LoadOutputFile(UserPath + 'Converge/iMagma4_n/3/noImpacts_wQuench_CrustalThickness.csv')
+    crust_k_1e9 = RB.LoadOutputFile(UserPath + 'Converge/iMagma4_iA/3/wImpacts_wQuench_CrustalThickness.csv')
+    crust_k_1e7 = RB.LoadOutputFile(UserPath + 'Converge/iMagma4_iB/3/wImpacts_wQuench_CrustalThickness.csv')
+    crust_k_1e6 = RB.LoadOutputFile(UserPath + 'Converge/iMagma4_iC/12/wImpacts_wQuench_CrustalThickness.csv')
+    crust_k_1e5 = RB.LoadOutputFile(UserPath + 'Converge/iMagma4_iD/9/wImpacts_wQuench_CrustalThickness.csv')
     
     # Plot    
     ax.semilogx(crust_noImpacts[0,:]/3.154e7, crust_noImpacts[2,:]/1e3, 'k', linewidth = 4, label='$No\/Impacts$')
@@ -438,15 +441,15 @@ if (whichPlotsToMake == 6) or (whichPlotsToMake == 0):
     holeTracker_k3e8 = np.genfromtxt(UserPath + 'histogramRuns/hist_1/4/wImpacts_wQuench_FinalHoleTrackerArray.csv', delimiter=',', skip_header=0)
     holeTracker_k1e9 = np.genfromtxt(UserPath + 'histogramRuns/hist_1/5/wImpacts_wQuench_FinalHoleTrackerArray.csv', delimiter=',', skip_header=0)
     
-    crustalThickness_k1e5 = np.genfromtxt(UserPath + 'histogramRuns/hist_3/1/wImpacts_wQuench_CrustalThickness.csv', delimiter=',', skip_header=0)
-    crustalThickness_k3e5 = np.genfromtxt(UserPath + 'histogramRuns/hist_3/2/wImpacts_wQuench_CrustalThickness.csv', delimiter=',', skip_header=0)
-    crustalThickness_k1e6 = np.genfromtxt(UserPath + 'histogramRuns/hist_2/1/wImpacts_wQuench_CrustalThickness.csv', delimiter=',', skip_header=0)
-    crustalThickness_k3e6 = np.genfromtxt(UserPath + 'histogramRuns/hist_2/2/wImpacts_wQuench_CrustalThickness.csv', delimiter=',', skip_header=0)
-    crustalThickness_k1e7 = np.genfromtxt(UserPath + 'histogramRuns/hist_1/1/wImpacts_wQuench_CrustalThickness.csv', delimiter=',', skip_header=0)
-    crustalThickness_k3e7 = np.genfromtxt(UserPath + 'histogramRuns/hist_1/2/wImpacts_wQuench_CrustalThickness.csv', delimiter=',', skip_header=0)
-    crustalThickness_k1e8 = np.genfromtxt(UserPath + 'histogramRuns/hist_1/3/wImpacts_wQuench_CrustalThickness.csv', delimiter=',', skip_header=0)
-    crustalThickness_k3e8 = np.genfromtxt(UserPath + 'histogramRuns/hist_1/4/wImpacts_wQuench_CrustalThickness.csv', delimiter=',', skip_header=0)
-    crustalThickness_k1e9 = np.genfromtxt(UserPath + 'histogramRuns/hist_1/5/wImpacts_wQuench_CrustalThickness.csv', delimiter=',', skip_header=0)
+    crustalThickness_k1e5 = RB.LoadOutputFile(UserPath + 'histogramRuns/hist_3/1/wImpacts_wQuench_CrustalThickness.csv')
+    crustalThickness_k3e5 = RB.LoadOutputFile(UserPath + 'histogramRuns/hist_3/2/wImpacts_wQuench_CrustalThickness.csv')
+    crustalThickness_k1e6 = RB.LoadOutputFile(UserPath + 'histogramRuns/hist_2/1/wImpacts_wQuench_CrustalThickness.csv')
+    crustalThickness_k3e6 = RB.LoadOutputFile(UserPath + 'histogramRuns/hist_2/2/wImpacts_wQuench_CrustalThickness.csv')
+    crustalThickness_k1e7 = RB.LoadOutputFile(UserPath + 'histogramRuns/hist_1/1/wImpacts_wQuench_CrustalThickness.csv')
+    crustalThickness_k3e7 = RB.LoadOutputFile(UserPath + 'histogramRuns/hist_1/2/wImpacts_wQuench_CrustalThickness.csv')
+    crustalThickness_k1e8 = RB.LoadOutputFile(UserPath + 'histogramRuns/hist_1/3/wImpacts_wQuench_CrustalThickness.csv')
+    crustalThickness_k3e8 = RB.LoadOutputFile(UserPath + 'histogramRuns/hist_1/4/wImpacts_wQuench_CrustalThickness.csv')
+    crustalThickness_k1e9 = RB.LoadOutputFile(UserPath + 'histogramRuns/hist_1/5/wImpacts_wQuench_CrustalThickness.csv')
 
     # Get final non-impacted crustal thickness
     final_nonImp_crustalThickness_k1e5 = crustalThickness_k1e5[1,-1]
@@ -918,10 +921,10 @@ if (whichPlotsToMake == 8) or (whichPlotsToMake == 0):
     plt.figure(81)
 
     # Get data
-    Moon_100km_10Re = np.genfromtxt(UserPath + 'iMagma4/AlanData_100km_10Re.csv', delimiter=',', skip_header=1)
-    Moon_500km_10Re = np.genfromtxt(UserPath + 'iMagma4/AlanData_500km_10Re.csv', delimiter=',', skip_header=1)
-    Earth_100km_10Re = np.genfromtxt(UserPath + 'iMagma4/EarthData_100km_10Re.csv', delimiter=',', skip_header=1)
-    Earth_500km_10Re = np.genfromtxt(UserPath + 'iMagma4/EarthData_500km_10Re.csv', delimiter=',', skip_header=1)
+    Moon_100km_10Re = IT.LoadImpactTable(UserPath + 'iMagma4/AlanData_100km_10Re.csv')
+    Moon_500km_10Re = IT.LoadImpactTable(UserPath + 'iMagma4/AlanData_500km_10Re.csv')
+    Earth_100km_10Re = IT.LoadImpactTable(UserPath + 'iMagma4/EarthData_100km_10Re.csv')
+    Earth_500km_10Re = IT.LoadImpactTable(UserPath + 'iMagma4/EarthData_500km_10Re.csv')
 
     # Line Plots
     plt.loglog(Moon_100km_10Re[:,0], Moon_100km_10Re[:,2], color='#db6d00', linewidth=2, label='Moon (LD = 100 km)')
@@ -961,10 +964,10 @@ if (whichPlotsToMake == 8) or (whichPlotsToMake == 0):
     plt.figure(82)
 
     # Get data
-    Moon_100km_60Re = np.genfromtxt(UserPath + 'iMagma4/AlanData_100km_60Re.csv', delimiter=',', skip_header=1)
-    Moon_500km_60Re = np.genfromtxt(UserPath + 'iMagma4/AlanData_500km_60Re.csv', delimiter=',', skip_header=1)
-    Earth_100km_60Re = np.genfromtxt(UserPath + 'iMagma4/EarthData_100km_60Re.csv', delimiter=',', skip_header=1)
-    Earth_500km_60Re = np.genfromtxt(UserPath + 'iMagma4/EarthData_500km_60Re.csv', delimiter=',', skip_header=1)
+    Moon_100km_60Re = IT.LoadImpactTable(UserPath + 'iMagma4/AlanData_100km_60Re.csv')
+    Moon_500km_60Re = IT.LoadImpactTable(UserPath + 'iMagma4/AlanData_500km_60Re.csv')
+    Earth_100km_60Re = IT.LoadImpactTable(UserPath + 'iMagma4/EarthData_100km_60Re.csv')
+    Earth_500km_60Re = IT.LoadImpactTable(UserPath + 'iMagma4/EarthData_500km_60Re.csv')
 
     # Line Plots
     plt.loglog(Moon_100km_60Re[:,0], Moon_100km_60Re[:,2], color='#db6d00', linewidth=2, label='Moon (LD = 100 km)')
@@ -9,6 +9,13 @@ Modified: September 19, 2017
 The MAIN script needs to be called with certain input parameters (see below) 
 MAIN usually called using ParameterSearchHEAD.py
 
+The cooling loop can also be run in-process (without inputFile.csv or any output files) by importing this module
+and calling run_simulation with a dictionary of the input parameters, e.g.
+
+    import MAIN
+    params = MAIN.ReadInputFile('inputFile.csv')
+    result = MAIN.run_simulation(params)
+
 """
 ####### PYTHON IMPORTS ##############################################################################################################################
 
@@ -34,57 +41,85 @@ iMagma_version = 4.95
 import SolidusTemperature as ST                         # Calculates solidus temperature as a function of radius and the remaining liquid fraction
 import SurfaceTemperature as SurfTemperature            # Calculated the surface temperature that matches the equilibrium radiation of the Moon
 import Impacts as I                                     # Functions to determine energy added by impacts and number of hole puncturing impacts
-import QuenchCrust as QC                                # Functions to determine quench crust conditions
 import RayleighNumber as Ra                             # Function to calculate Rayleigh number
 import GeneralHeating as GH                             # Function to calculate additional heating of the magma ocean
+import HoleTracker as HT                                # Array based store of the holes punctured by impacts
+import IncrementState as IS                             # Quantities that stay the same within a volume increment (e.g. equilibrium quench crust)
+import TimestepSolver as TS                             # Solvers that find the timestep of each volume increment
+import VolumeStepper as VS                              # Size of the magma ocean volume that solidifies in each increment
+import ImpactTables as IT                               # Cached (memory-mapped) loader for the impacts tables
+import SeriesRecorder as SR                             # Preallocated storage for the time series
+import OutputWriter as OW                               # Writes the output files from a background thread while the loop runs
+import RecordingPolicy as RP                            # Which increments are recorded in the time series
+import ResultBundle as RB                               # Compressed binary result file of a run (.npz)
+import Checkpoint as CP                                 # Saves the state of the loop so that a killed run can carry on where it was
+import FastEngine as FE                                 # Compiled (Numba) version of the cooling loop
     
 #####################################################################################################################################################
     
 
 ####### INPUT PARAMETERS ############################################################################################################################    
-            
-with open('inputFile.csv', 'r') as f:
-    reader = csv.reader(f)
-    InputParameters = next(reader)
-
-homePath = str(InputParameters[0])
-UserPath = str(InputParameters[1])
-ImpactsSwitch = ast.literal_eval(InputParameters[2])
-QuenchSwitch = ast.literal_eval(InputParameters[3])
-GeneralHeatingSwitch = ast.literal_eval(InputParameters[4])
-adiabslope = float(InputParameters[5])
-MO_depth_initial = float(InputParameters[6])
-MO_depth_plagBuild = float(InputParameters[7])
-density_MO = float(InputParameters[8])
-Heat_fusion_MO = float(InputParameters[9])
-Heat_capacity_MO = float(InputParameters[10])
-therm_exp_coeff_MO = float(InputParameters[11])
-Diffusivity_MO = float(InputParameters[12])
-dy_viscosity_MO = float(InputParameters[13])
-Temperature_equl = float(InputParameters[14])
-Diffusivity_crust = float(InputParameters[15])
-density_crust = float(InputParameters[16])
-Heat_capacity_crust = float(InputParameters[17])
-Emissivity = float(InputParameters[18])
-mass2area = float(InputParameters[19])
-acc_grav = float(InputParameters[20])
-Temperature_melt = float(InputParameters[21])
-Diffusivity_quench = float(InputParameters[22])
-density_quench = float(InputParameters[23])
-Heat_capacity_quench = float(InputParameters[24])
-Max_Quench_Thickness = float(InputParameters[25])
-vol_increments = int(InputParameters[26])
-percMO_remain_end = float(InputParameters[27])
-plag_holeFill_vs_gblCrust = float(InputParameters[28])
-ImpactsFile = str(InputParameters[29])
-RunNumber = int(InputParameters[30])
-LargestImpactorSize = float(InputParameters[31])
-MoonLocationDebrisCalc = float(InputParameters[32])
-HeatingRate = float(InputParameters[33])
-KineticEnergySwitch = ast.literal_eval(InputParameters[34])
-KEefficiency = float(InputParameters[35])
-plag_fraction = float(InputParameters[36])
-                        
+
+# Names of the input parameters (in the order they are written to inputFile.csv by ParameterSearchHEAD.py) and how to convert them from text
+InputParameterNames = [('homePath', str), ('UserPath', str), ('ImpactsSwitch', ast.literal_eval), ('QuenchSwitch', ast.literal_eval), \
+                        ('GeneralHeatingSwitch', ast.literal_eval), ('adiabslope', float), ('MO_depth_initial', float), ('MO_depth_plagBuild', float), \
+                        ('density_MO', float), ('Heat_fusion_MO', float), ('Heat_capacity_MO', float), ('therm_exp_coeff_MO', float), \
+                        ('Diffusivity_MO', float), ('dy_viscosity_MO', float), ('Temperature_equl', float), ('Diffusivity_crust', float), \
+                        ('density_crust', float), ('Heat_capacity_crust', float), ('Emissivity', float), ('mass2area', float), ('acc_grav', float), \
+                        ('Temperature_melt', float), ('Diffusivity_quench', float), ('density_quench', float), ('Heat_capacity_quench', float), \
+                        ('Max_Quench_Thickness', float), ('vol_increments', int), ('percMO_remain_end', float), ('plag_holeFill_vs_gblCrust', float), \
+                        ('ImpactsFile', str), ('RunNumber', int), ('LargestImpactorSize', float), ('MoonLocationDebrisCalc', float), \
+                        ('HeatingRate', float), ('KineticEnergySwitch', ast.literal_eval), ('KEefficiency', float), ('plag_fraction', float)]
+
+# Optional run settings that are not part of inputFile.csv (run_simulation uses these defaults unless they are given in params)
+OptionalParameterDefaults = {'SurfaceTemperatureTolerance': None,       # Relative tolerance for solving lid surface temperatures with Newton iterations (None uses the original single update)
+                             'SurfaceTemperatureMaxIter': 50,           # Maximum number of Newton iterations for lid surface temperatures
+                             'TimestepSolver': 'secant',                # Timestep solver (see TimestepSolver.TimestepSolvers, 'fixedpoint' is the original iteration)
+                             'TimestepTolerance': 0.02,                 # Relative tolerance between timestep and time needed to dump the energy
+                             'TimestepMaxIter': 100,                    # Maximum number of tries to find the timestep of one increment
+                             'AdaptiveVolume': False,                   # Set True to adapt the volume of each increment to the local error (see VolumeStepper.py)
+                             'AdaptiveTolerance': 1e-3,                 # Largest relative change of CMB temperature, crust thickness, hole area or time per increment
+                             'AdaptiveStepMin': 0.1,                    # Smallest adaptive increment (as a multiple of the initial volume / vol_increments)
+                             'AdaptiveStepMax': 100.0,                  # Largest adaptive increment (as a multiple of the initial volume / vol_increments)
+                             'ImpactIntegration': 'exact',              # 'exact' integrates the impacts table over each timestep, 'midpoint' uses the rate at the middle (original)
+                             'StreamOutput': False,                     # Set True to write the output files to UserPath while the loop runs (see OutputWriter.py)
+                             'StreamChunkSize': 4096,                   # Number of increments of the time series in each chunk written while the loop runs
+                             'RecordPolicy': 'all',                     # Increments recorded in the time series: 'all', 'stride', 'logtime' or 'change' (see RecordingPolicy.py)
+                             'RecordStride': 10,                        # 'stride' records every RecordStride-th increment
+                             'RecordPointsPerDecade': 50,               # 'logtime' records about this many increments per decade of ellapsed time
+                             'RecordChangeThreshold': 0.01,             # 'change' records an increment when a recorded quantity changed by more than this (relative)
+                             'OutputFormat': 'npz',                     # Output files of the time series: 'npz' (one result bundle, see ResultBundle.py), 'csv' or 'both'
+                             'CheckpointInterval': 0,                   # Save a checkpoint every CheckpointInterval increments (0 for never, see Checkpoint.py)
+                             'CheckpointWallTime': 0,                   # Save a checkpoint every CheckpointWallTime seconds of wall time (0 for never)
+                             'CheckpointFile': 'iMagmaCheckpoint.pkl',  # File in UserPath the checkpoint is saved to
+                             'RestartFromCheckpoint': False,            # Set True to carry on from the checkpoint in CheckpointFile (same input parameters and version) if there is one
+                             'Engine': 'reference'}                     # 'jit' runs the cooling loop compiled with Numba when it can (see FastEngine.py), 'reference' the loop below
+
+# Read the input parameters written by ParameterSearchHEAD.py into a dictionary (used by run_simulation)
+def ReadInputFile(fileName):
+
+    with open(fileName, 'r') as f:
+        reader = csv.reader(f)
+        values = next(reader)
+
+    return InputParameters(values)
+
+
+# Dictionary of input parameters from their values in the order of InputParameterNames (text as in inputFile.csv, or values built
+# in memory by ParameterSearchHEAD.py, where numbers and switches are kept as they are)
+def InputParameters(values):
+
+    params = {}
+
+    for (name, convert), value in zip(InputParameterNames, values):
+
+        if isinstance(value, str) or convert in (float, int, str):
+            params[name] = convert(value)
+        else:
+            params[name] = value
+
+    return params
+
 #####################################################################################################################################################            
 
                         
@@ -98,609 +133,987 @@ SB = 5.670367e-8                      # Stefan-Boltzmann constant (W/m^2*K^4)
         
 surfArea_Moon = 4 * np.pi * pow(Radius_moon, 2)                                                       # Surface area of the Moon (m^2)
 
-MO_volume_initial = (4/3) * np.pi * (pow(Radius_moon, 3) - pow(Radius_moon - MO_depth_initial, 3))   # Initial volume of magma ocean
-    
-MO_mass_initial = MO_volume_initial *  density_MO
-    
+# Names of the scorecard columns (same order as scoreCard.csv and GrandScoreCard.csv)
+ScoreCardColumnNames = ['Run Name', 'iMagma Version', 'Run Duration (sec)', 'Volume Increments', 'Timestep Tolerance (%)', 'Impacts', \
+                        'Quench', 'Additional Heating', 'Largest Impactor (km)', 'Location of Moon (Re)', 'Impact Mass Conversion Factor', \
+                        'Magma Ocean Depth (m)', 'Plag Building Depth (m)', 'Fraction Solids to Plag', 'Percentage of Magma to Remain', \
+                        'Max Quench Thickness (m)', 'Density Magma Ocean (kg/m3)', 'Density Crust (kg/m3)', 'Density Quench (kg/m3)', \
+                        'Heat of Fusion Magma Ocean (J/kg)', 'Heat Capacity Magma Ocean (J/kg*K)', 'Heat Capacity Crust (J/kg*K)', \
+                        'Heat Capacity Quench (J/kg*K)', 'Thermal Expansion Coeff Magma Ocean (1/K)', 'Diffusivity Magma Ocean (m2/s)', \
+                        'Diffusivity Crust (m2/s)', 'Diffusivity Quench (m2/s)', 'Dynamic Viscosity Magma Ocean (Pa*s)', 'Adiabat Slope (K/m)', \
+                        'Temperature Quench Melt (K)', 'Temperature Surface Equl (K)', 'Emissivity', 'Initial Magma Ocean Mass (kg)', \
+                        'Solidified Magma Ocean Mass (kg)', 'Total Mass Added By Re-impacts (kg)', 'Total Energy Added By Re-impacts (J)', \
+                        'Heating Rate (W)', 'Total Additional Heat Added (J)', 'Remaining Liquid (%)', 'Plag Building Start Time (yrs)', \
+                        'Percentage of Surface w/ Holes', 'Total Cooling Time (yrs)', 'Final Crustal Thickness (m)']
+
+# Scorecard columns set by the input parameters, and the input parameter (or optional setting) each comes from
+ScoreCardInputColumns = [('Volume Increments', 'vol_increments'), ('Timestep Tolerance (%)', 'TimestepTolerance'), ('Impacts', 'ImpactsSwitch'), \
+                         ('Quench', 'QuenchSwitch'), ('Additional Heating', 'GeneralHeatingSwitch'), ('Largest Impactor (km)', 'LargestImpactorSize'), \
+                         ('Location of Moon (Re)', 'MoonLocationDebrisCalc'), ('Impact Mass Conversion Factor', 'mass2area'), \
+                         ('Magma Ocean Depth (m)', 'MO_depth_initial'), ('Plag Building Depth (m)', 'MO_depth_plagBuild'), \
+                         ('Fraction Solids to Plag', 'plag_fraction'), ('Percentage of Magma to Remain', 'percMO_remain_end'), \
+                         ('Max Quench Thickness (m)', 'Max_Quench_Thickness'), ('Density Magma Ocean (kg/m3)', 'density_MO'), \
+                         ('Density Crust (kg/m3)', 'density_crust'), ('Density Quench (kg/m3)', 'density_quench'), \
+                         ('Heat of Fusion Magma Ocean (J/kg)', 'Heat_fusion_MO'), ('Heat Capacity Magma Ocean (J/kg*K)', 'Heat_capacity_MO'), \
+                         ('Heat Capacity Crust (J/kg*K)', 'Heat_capacity_crust'), ('Heat Capacity Quench (J/kg*K)', 'Heat_capacity_quench'), \
+                         ('Thermal Expansion Coeff Magma Ocean (1/K)', 'therm_exp_coeff_MO'), ('Diffusivity Magma Ocean (m2/s)', 'Diffusivity_MO'), \
+                         ('Diffusivity Crust (m2/s)', 'Diffusivity_crust'), ('Diffusivity Quench (m2/s)', 'Diffusivity_quench'), \
+                         ('Dynamic Viscosity Magma Ocean (Pa*s)', 'dy_viscosity_MO'), ('Adiabat Slope (K/m)', 'adiabslope'), \
+                         ('Temperature Quench Melt (K)', 'Temperature_melt'), ('Temperature Surface Equl (K)', 'Temperature_equl'), \
+                         ('Emissivity', 'Emissivity'), ('Heating Rate (W)', 'HeatingRate')]
+
+# Time series in the rows of each output file (keyed by the file name without the prefix)
+OutputFileSeries = [('.csv', ['Time', 'LiqFrac']), \
+                    ('_TemperatureCMB.csv', ['Time', 'CMB_Temperature']), \
+                    ('_CrustalThickness.csv', ['Time', 'CrustalThickness', 'CrustalThickness_global']), \
+                    ('_HoleTracker.csv', ['Time_holes', 'holeArea', 'holeThickness', 'holeTemperature', 'holeAreaCreated', 'totalHoleAreaCum', \
+                                          'holeTrackerElements']), \
+                    ('_impactedCrust.csv', ['Time_impactedCrust', 'CrustalThickness_impacted'])]
+
+# Prefix of the output files (e.g. wImpacts_wQuench) or None if this switch combination has no output files
+def OutputPrefix(params):
+
+    if params['ImpactsSwitch'] == True and params['QuenchSwitch'] == True:
+        return 'wImpacts_wQuench'
+
+    elif params['ImpactsSwitch'] == False and params['QuenchSwitch'] == True:
+        return 'noImpacts_wQuench'
+
+    elif params['ImpactsSwitch'] == False and params['QuenchSwitch'] == False:
+        return 'noImpacts_noQuench'
+
+    return None
+
+# Output files written for a run (the hole files are only written when there are impacts)
+def OutputFiles(params):
+
+    if params['ImpactsSwitch'] == True:
+        return OutputFileSeries
+
+    return OutputFileSeries[:3]
+
+# Variables that the loop of run_simulation carries from one increment to the next (saved in checkpoints)
+LoopStateNames = ['MO_volume_current', 'CrustalThickness', 'CrustThicknessImpMoon', 'CrustalThickness_global', 'fractionLiquid', 'CMB', \
+                  'CMB_Temperature', 'ellapsedTime', 'timeStep', 'Ra_number', 'quenchThickness', 'PresentQuenchThickness', \
+                  'Reduce_Global_Quench_Due_Impacts', 'vol_Quench_excavated', 'Extra_Crust_Due_Impacts', 'TotalHoleArea', \
+                  'HoleThickness_times_HoleArea_Sum', 'crustBuildingStartTime_yrs', 'CumMassAddedImpacts', 'CumEnergyAddedImpacts', \
+                  'CumEnergyDumped', 'CumGenHeatAdded', 'CrustBuildOn', 'crystHoleCrust', 'holeTrackerRest', 'totalHoleAreaCum', 'holeTracker', \
+                  'timestepSolver', 'volumeStepper', 'seriesRecorder', 'holeRecorder', 'impactedCrustRecorder', 'solverStats', 'lastLidTemperature']
+
+#####################################################################################################################################################
+
+
+####### SIMULATION RESULTS ##########################################################################################################################
+
+# Raised when a run cannot continue (instead of quitting the whole python process)
+class SimulationError(Exception):
+    pass
+
+
+# Time series and scorecard of a single run (kept in memory so that many runs can be done in one process)
+class SimulationResult(object):
+
+    def __init__(self, params, series, scoreCard, holeTracker, stats=None, streamed=False):
+
+        self.params = params                # Input parameters used for the run
+        self.series = series                # Dictionary of time series arrays (see run_simulation for the names)
+        self.scoreCard = scoreCard          # Scorecard values (same order as ScoreCardColumnNames)
+        self.holeTracker = holeTracker      # Holes remaining at the end of the run (HoleTracker.HoleTracker)
+        self.stats = stats or {}            # Solver statistics of the run (e.g. number of surface temperature iterations)
+        self.streamed = streamed            # True if the CSV output files were written while the loop ran (then series is None unless a bundle is written)
+
+    # Scorecard as a dictionary keyed by the column names
+    def ScoreCardDict(self):
+        return dict(zip(ScoreCardColumnNames, self.scoreCard))
+
+    # Prefix of the output files (e.g. wImpacts_wQuench) or None if this switch combination has no output files
+    def OutputPrefix(self):
+        return OutputPrefix(self.params)
+
+    # Arrays written to the output files (keyed by the file name without the prefix)
+    def OutputArrays(self):
+        return [(suffix, np.vstack([self.series[name] for name in names])) for suffix, names in OutputFiles(self.params)]
+
 #####################################################################################################################################################
     
     
-####### INITIALIZATIONS #############################################################################################################################
-    
-TimeStamp_start = datetime.datetime.now()
-    
-MO_volume_current = MO_volume_initial                                # Current volume of magma ocean
-CrustalThickness = 0                                                 # Initial crustal thickness
-CrustThicknessImpMoon = 0                                            # Initial impacted Moon crustal thickness
-CrustalThickness_global = 0                                          # Initial global crustal thickness
-fractionLiquid = 1                                                   # Initiallized remaining magma ocean liquid fraction
-CMB = Radius_moon - MO_depth_initial                                 # Initial solid interior-magma ocean boundary
-ellapsedTime = 0                                                     # Variable to track ellapsed time
-timeStep = 3.154e7                                                   # Timestep (sec)--will be updated in script
-timeStep_tol = 0.02                                                  # Timestep error tolerance (currently set to 2%)
-volSize = MO_volume_initial / vol_increments                         # Size of constant volume increment that will be iterated over
+######################## MAIN ###################### MAIN ######################## MAIN #############################################################
+
+# Run the magma ocean cooling loop for one set of input parameters (dictionary with the names in InputParameterNames)
+# AlanData is the impacts table (array or Impacts.ImpactFlux built from it), which is read from homePath + ImpactsFile if not given
+def run_simulation(params, AlanData=None):
+
+    ImpactsSwitch = params['ImpactsSwitch']
+    QuenchSwitch = params['QuenchSwitch']
+    GeneralHeatingSwitch = params['GeneralHeatingSwitch']
+    adiabslope = float(params['adiabslope'])
+    MO_depth_initial = float(params['MO_depth_initial'])
+    MO_depth_plagBuild = float(params['MO_depth_plagBuild'])
+    density_MO = float(params['density_MO'])
+    Heat_fusion_MO = float(params['Heat_fusion_MO'])
+    Heat_capacity_MO = float(params['Heat_capacity_MO'])
+    therm_exp_coeff_MO = float(params['therm_exp_coeff_MO'])
+    Diffusivity_MO = float(params['Diffusivity_MO'])
+    dy_viscosity_MO = float(params['dy_viscosity_MO'])
+    Temperature_equl = float(params['Temperature_equl'])
+    Diffusivity_crust = float(params['Diffusivity_crust'])
+    density_crust = float(params['density_crust'])
+    Heat_capacity_crust = float(params['Heat_capacity_crust'])
+    Emissivity = float(params['Emissivity'])
+    mass2area = float(params['mass2area'])
+    acc_grav = float(params['acc_grav'])
+    Temperature_melt = float(params['Temperature_melt'])
+    Diffusivity_quench = float(params['Diffusivity_quench'])
+    density_quench = float(params['density_quench'])
+    Heat_capacity_quench = float(params['Heat_capacity_quench'])
+    Max_Quench_Thickness = float(params['Max_Quench_Thickness'])
+    vol_increments = int(params['vol_increments'])
+    percMO_remain_end = float(params['percMO_remain_end'])
+    plag_holeFill_vs_gblCrust = float(params['plag_holeFill_vs_gblCrust'])
+    RunNumber = params.get('RunNumber', 0)
+    LargestImpactorSize = float(params['LargestImpactorSize'])
+    MoonLocationDebrisCalc = float(params['MoonLocationDebrisCalc'])
+    HeatingRate = float(params['HeatingRate'])
+    KineticEnergySwitch = params['KineticEnergySwitch']
+    KEefficiency = float(params['KEefficiency'])
+    plag_fraction = float(params['plag_fraction'])
+
+    SurfTemp_tol = params.get('SurfaceTemperatureTolerance', OptionalParameterDefaults['SurfaceTemperatureTolerance'])
+    SurfTemp_maxIter = int(params.get('SurfaceTemperatureMaxIter', OptionalParameterDefaults['SurfaceTemperatureMaxIter']))
+    timeStep_solverName = params.get('TimestepSolver', OptionalParameterDefaults['TimestepSolver'])
+    timeStep_tol = float(params.get('TimestepTolerance', OptionalParameterDefaults['TimestepTolerance']))
+    timeStep_maxIter = int(params.get('TimestepMaxIter', OptionalParameterDefaults['TimestepMaxIter']))
+    AdaptiveVolume = params.get('AdaptiveVolume', OptionalParameterDefaults['AdaptiveVolume'])
+    AdaptiveTolerance = float(params.get('AdaptiveTolerance', OptionalParameterDefaults['AdaptiveTolerance']))
+    AdaptiveStepMin = float(params.get('AdaptiveStepMin', OptionalParameterDefaults['AdaptiveStepMin']))
+    AdaptiveStepMax = float(params.get('AdaptiveStepMax', OptionalParameterDefaults['AdaptiveStepMax']))
+    ImpactIntegration = params.get('ImpactIntegration', OptionalParameterDefaults['ImpactIntegration'])
+    StreamOutput = params.get('StreamOutput', OptionalParameterDefaults['StreamOutput'])
+    StreamChunkSize = int(params.get('StreamChunkSize', OptionalParameterDefaults['StreamChunkSize']))
+    OutputFormat = params.get('OutputFormat', OptionalParameterDefaults['OutputFormat'])
+    CheckpointInterval = int(params.get('CheckpointInterval', OptionalParameterDefaults['CheckpointInterval']))
+    CheckpointWallTime = float(params.get('CheckpointWallTime', OptionalParameterDefaults['CheckpointWallTime']))
+    CheckpointFile = params.get('CheckpointFile', OptionalParameterDefaults['CheckpointFile'])
+    RestartFromCheckpoint = params.get('RestartFromCheckpoint', OptionalParameterDefaults['RestartFromCheckpoint'])
+    RecordPolicy = params.get('RecordPolicy', OptionalParameterDefaults['RecordPolicy'])
+    RecordStride = int(params.get('RecordStride', OptionalParameterDefaults['RecordStride']))
+    RecordPointsPerDecade = float(params.get('RecordPointsPerDecade', OptionalParameterDefaults['RecordPointsPerDecade']))
+    RecordChangeThreshold = float(params.get('RecordChangeThreshold', OptionalParameterDefaults['RecordChangeThreshold']))
+    Engine = params.get('Engine', OptionalParameterDefaults['Engine'])
+
+    MO_volume_initial = (4/3) * np.pi * (pow(Radius_moon, 3) - pow(Radius_moon - MO_depth_initial, 3))   # Initial volume of magma ocean
     
-Ra_number = 0                                                        # Initiallized Rayleigh number (updated right away)
-quenchThickness = 0                                                  # Initiallized quench crust thickness (updated right away)
-Reduce_Global_Quench_Due_Impacts = 0                                 # Initiallized quench thickness that should be reduced due to impacts
-vol_Quench_excavated = 0                                             # Initiallized volumen of quench excavated by impacts
-TotalHoleArea = 0                                                    # Initiallized total area of impact generated holes
-HoleThickness_times_HoleArea_Sum = 0                                 # Initiallized sum of hole thickness multiplied by hole area
+    MO_mass_initial = MO_volume_initial *  density_MO
     
-CMB_array = []                                                       # Array for CMB location over time
-Time_array = []                                                      # Array for ellapsed time
-Time_array_holes = []                                                # Array for tracking ellapsed time for holes tracker
-Time_array_impactedCrust = []                                        # Array for tracking ellapsed time for holes tracker
-LiqFrac_array = []                                                   # Array for liquid fraction over time
-CrustalThickness_array = []                                          # Array for crustal thickness of non-impacted Moon over time
-CrustalThickness_Impacted_array = []                                 # Array for crustal thickness of impacted Moon over time
-CrustalThickness_Global_array = []                                   # Array for crustal thickness of whole Moon over time
-CMB_Temperature_array = []                                           # Array for temperature at solid interior-magma ocean boundary over time
-holeTracker = []                                                     # Array for holes to be tracked
-holeAreaTracker_array = []                                           # Array for area of holes over time
-holeThicknessTracker_array = []                                      # Array for thickness of holes over time
-holeTemperatureTracker_array = []                                    # Array for temperature of holes over time
-holeAreaCreatedTracker_array = []                                    # Array for area per timestep of holes created at each timestep over time
-holeTrackerElements_array = []                                       # Array for tracking number of holes in holeTracker over time
-
-CumMassAddedImpacts = 0                                              # Initiallized total mass added by impacts    
-CumEnergyAddedImpacts = 0                                            # Initiallized total energy added by impacts    
-CumEnergyDumped = 0                                                  # Initiallized total energy dumped
-CumGenHeatAdded = 0                                                  #
-CrustBuildOn = 0                                                     # Switch to track when crust building turns on
-crystHoleCrust = 0                                                   # Initiallized fraction of plag that should go to holes
-holeTrackerRest = 0                                                  # Variable used to reset the holeTracker once when plag building starts
-totalHoleAreaCum = 0                                                 # Cumulative hole area added to the surface of the Moon
-totalHoleAreaCum_array = []                                          # Array for cumulative hole area added over time
- 
-AlanData = np.genfromtxt(homePath + ImpactsFile, skip_header=1, delimiter=',')       # Import Alan's impacts table (used by Impacts function)
 
-#####################################################################################################################################################
+    ####### INITIALIZATIONS #########################################################################################################################
     
+    TimeStamp_start = datetime.datetime.now()
     
-######################## MAIN ###################### MAIN ######################## MAIN #############################################################
+    MO_volume_current = MO_volume_initial                                # Current volume of magma ocean
+    CrustalThickness = 0                                                 # Initial crustal thickness
+    CrustThicknessImpMoon = 0                                            # Initial impacted Moon crustal thickness
+    CrustalThickness_global = 0                                          # Initial global crustal thickness
+    fractionLiquid = 1                                                   # Initiallized remaining magma ocean liquid fraction
+    CMB = Radius_moon - MO_depth_initial                                 # Initial solid interior-magma ocean boundary
+    ellapsedTime = 0                                                     # Variable to track ellapsed time
+    timeStep = 3.154e7                                                   # Timestep (sec)--will be updated in script
+    timestepSolver = TS.TimestepSolvers[timeStep_solverName](timeStep_tol, timeStep_maxIter)       # Finds the timestep of each increment
+    volSize = MO_volume_initial / vol_increments                         # Size of constant volume increment that will be iterated over
+    MO_volume_end = (percMO_remain_end/100) * MO_volume_initial          # Volume of magma ocean that should remain at the end
+
+    # Volume of each increment is either constant or adapted to the local error (then there can be more or fewer increments than vol_increments)
+    if AdaptiveVolume == True:
+        volumeStepper = VS.AdaptiveVolumeStepper(volSize, AdaptiveStepMin * volSize, AdaptiveStepMax * volSize, AdaptiveTolerance)
+        max_increments = int(np.ceil(vol_increments / AdaptiveStepMin)) + 1
+    else:
+        volumeStepper = VS.FixedVolumeStepper(volSize)
+        max_increments = vol_increments
     
-# Initial temperature at the solid interior-magma ocean boundary
-CMB_Temperature = ST.SolidusTemperature(CMB, fractionLiquid)                                                   
+    Ra_number = 0                                                        # Initiallized Rayleigh number (updated right away)
+    quenchThickness = 0                                                  # Initiallized quench crust thickness (updated right away)
+    PresentQuenchThickness = 0                                           # Initiallized equilibrium quench crust thickness (updated right away)
+    Reduce_Global_Quench_Due_Impacts = 0                                 # Initiallized quench thickness that should be reduced due to impacts
+    vol_Quench_excavated = 0                                             # Initiallized volumen of quench excavated by impacts
+    Extra_Crust_Due_Impacts = 0                                          # Initiallized crust thickness added globally by crust excavated by impacts
+    TotalHoleArea = 0                                                    # Initiallized total area of impact generated holes
+    HoleThickness_times_HoleArea_Sum = 0                                 # Initiallized sum of hole thickness multiplied by hole area
+    crustBuildingStartTime_yrs = np.nan                                  # Time plag crust building starts (stays NaN if it never starts)
+
+    # Checkpoint of an earlier try of this run to carry on from (only looked for when checkpoints are saved and RestartFromCheckpoint is set)
+    if CheckpointInterval > 0 or CheckpointWallTime > 0:
+        checkpointTimer = CP.CheckpointTimer(CheckpointInterval, CheckpointWallTime)
+        checkpointFile = params['UserPath'] + CheckpointFile
+        checkpoint = CP.LoadCheckpoint(checkpointFile, params, iMagma_version) if RestartFromCheckpoint == True else None
+    else:
+        checkpointTimer = None
+        checkpoint = None
     
-# Main Loop (iterate over the number of volume increments defined above)
-for interations in range(0, vol_increments):
-        
-    # Switch to make sure timestep correct before proceeding
-    timestepAcceptable = False
-            
-    solidifMass = volSize * density_MO
-    solidifEnergy = solidifMass * Heat_fusion_MO
-            
-    # Current volumne of solid interior
-    Core_volume = (4/3) * np.pi * pow(CMB, 3)
-            
-    # In the beginning, all solidifying magma falls inward to the solid interior (done until magma ocean depth is equal to MO_depth_plagBuild)
-    if (CMB < (Radius_moon - MO_depth_plagBuild)):
-        crystCore2Crust = 1                                                                                  
-                
-    # When solid interior is large enough & is within depth for plagioclase crystallization, 
-    # then 55% of solidifying magma goes to the solid interior while the rest builds plagioclase crust
-    elif (CMB >= (Radius_moon - MO_depth_plagBuild)):
-            
+    # Output files can be written while the loop runs, in which case the recorders below only keep the values not yet handed to the writer
+    if StreamOutput == True and OutputPrefix(params) is not None:
+        outputWriter = OW.StreamingOutputWriter(params['UserPath'] + OutputPrefix(params), OutputFiles(params), \
+                                                spoolSizes=checkpoint['spoolSizes'] if checkpoint is not None else None)
+        outputSink = outputWriter.Write
+    else:
+        outputWriter = None
+        outputSink = None
+
+    # Policy deciding which increments are recorded (each recorder needs its own since the policies keep track of the last increment recorded)
+    def NewRecordingPolicy():
+        if RecordPolicy == 'all':
+            return None
+        return RP.MakeRecordingPolicy(RecordPolicy, RecordStride, RecordPointsPerDecade, RecordChangeThreshold)
+
+    # Size the recorders for every increment unless only some of them are recorded
+    recordCapacity = vol_increments if RecordPolicy == 'all' else 1024
+
+    # Time series recorded at every increment (ellapsed time, liquid fraction, CMB location and temperature, crustal thickness of the
+    # non-impacted and whole Moon, number of tries for the timestep and volume solidified)
+    seriesRecorder = SR.SeriesRecorder(['Time', 'LiqFrac', 'CMB', 'CMB_Temperature', 'CrustalThickness', 'CrustalThickness_global', \
+                                        'timestepEvaluations', 'volSize'], recordCapacity, outputSink, StreamChunkSize, NewRecordingPolicy(), \
+                                       ['LiqFrac', 'CMB_Temperature', 'CrustalThickness', 'CrustalThickness_global'])
+
+    # Time series recorded while there are holes (area of holes, mean thickness and temperature of holes, area of holes created per year,
+    # cumulative hole area added and number of holes in holeTracker)
+    holeRecorder = SR.SeriesRecorder(['Time_holes', 'holeArea', 'holeThickness', 'holeTemperature', 'holeAreaCreated', 'totalHoleAreaCum', \
+                                      'holeTrackerElements'], recordCapacity if ImpactsSwitch == True else 1, outputSink, StreamChunkSize, \
+                                     NewRecordingPolicy())
+
+    # Time series of the crustal thickness of the impacted Moon
+    impactedCrustRecorder = SR.SeriesRecorder(['Time_impactedCrust', 'CrustalThickness_impacted'], recordCapacity if ImpactsSwitch == True else 1, \
+                                              outputSink, StreamChunkSize, NewRecordingPolicy())
+
+    holeTracker = HT.HoleTracker()                                       # Holes to be tracked (area, thickness and temperature of each hole)
+
+    CumMassAddedImpacts = 0                                              # Initiallized total mass added by impacts    
+    CumEnergyAddedImpacts = 0                                            # Initiallized total energy added by impacts    
+    CumEnergyDumped = 0                                                  # Initiallized total energy dumped
+    CumGenHeatAdded = 0                                                  #
+    CrustBuildOn = 0                                                     # Switch to track when crust building turns on
+    crystHoleCrust = 0                                                   # Initiallized fraction of plag that should go to holes
+    holeTrackerRest = 0                                                  # Variable used to reset the holeTracker once when plag building starts
+    totalHoleAreaCum = 0                                                 # Cumulative hole area added to the surface of the Moon
+
+    solverStats = {'SurfaceTemperatureIterations': 0,                   # Total number of Newton iterations used for lid surface temperatures
+                   'TimestepEvaluations': 0,                            # Total number of tries used to find the timesteps
+                   'VolumeIncrements': 0}                               # Number of volume increments done
+    lastLidTemperature = {}                                              # Last surface temperature of each global lid (warm start for the Newton iterations)
+
+    # Import Alan's impacts table (used by Impacts function)
+    if AlanData is None and ImpactsSwitch == True:
+        AlanData = IT.LoadImpactTable(params['homePath'] + params['ImpactsFile'])
+
+    # Index the impacts table once so that every timestep only needs a binary search of it
+    if AlanData is not None:
+
+        impactFlux = AlanData if isinstance(AlanData, I.ImpactFlux) else I.ImpactFlux(AlanData)
+
+        if ImpactIntegration == 'exact':
+            PuncturingImpacts = impactFlux.PuncturingImpacts
+        else:
+            PuncturingImpacts = impactFlux.MidpointImpacts
+
+    # Surface temperature of a lid (quench or plag crust) or of an array of lids (e.g. holes)
+    # Uses the original single update from the guess unless SurfaceTemperatureTolerance is set, in which case the balance is solved with Newton iterations
+    # lidName names a global lid: it is only solved once per increment and its Newton iterations start from its temperature in the previous increment
+    def LidSurfaceTemperature(Temperature_top, Temperature_guess, LidThickness, Diffusivity_lid, density_lid, Heat_capacity_lid, lidName=None):
+
+        if lidName is not None and lidName in incrementState.lidTemperatures:
+            return incrementState.lidTemperatures[lidName]
+
+        if SurfTemp_tol is None:
+
+            if np.ndim(Temperature_guess) == 0 and np.ndim(LidThickness) == 0:
+                Tsurf = SurfTemperature.SurfaceTemperature(Temperature_top, Temperature_guess, LidThickness, Diffusivity_lid, density_lid, Heat_capacity_lid, \
+                                                            SB, Emissivity, Temperature_equl)
+            else:
+                Tsurf = SurfTemperature.SurfaceTemperatureArray(Temperature_top, Temperature_guess, LidThickness, Diffusivity_lid, density_lid, Heat_capacity_lid, \
+                                                                SB, Emissivity, Temperature_equl)
+
+        else:
+
+            if lidName is not None:
+                Temperature_guess = lastLidTemperature.get(lidName, Temperature_guess)
+
+            Tsurf, iterations = SurfTemperature.SolveSurfaceTemperature(Temperature_top, LidThickness, Diffusivity_lid, density_lid, Heat_capacity_lid, SB, Emissivity, \
+                                                                        Temperature_equl, Temperature_guess, SurfTemp_tol, SurfTemp_maxIter)
+
+            solverStats['SurfaceTemperatureIterations'] += int(np.sum(iterations))
+
+            if lidName is not None:
+                lastLidTemperature[lidName] = Tsurf
+
+        if lidName is not None:
+            incrementState.lidTemperatures[lidName] = Tsurf
+
+        return Tsurf
+
+    #################################################################################################################################################
+
+
+    # Initial temperature at the solid interior-magma ocean boundary
+    CMB_Temperature = ST.SolidusTemperature(CMB, fractionLiquid)
+
+    # Carry on from the end of the increment the checkpoint was saved at
+    if checkpoint is not None:
+
+        (MO_volume_current, CrustalThickness, CrustThicknessImpMoon, CrustalThickness_global, fractionLiquid, CMB, \
+         CMB_Temperature, ellapsedTime, timeStep, Ra_number, quenchThickness, PresentQuenchThickness, \
+         Reduce_Global_Quench_Due_Impacts, vol_Quench_excavated, Extra_Crust_Due_Impacts, TotalHoleArea, \
+         HoleThickness_times_HoleArea_Sum, crustBuildingStartTime_yrs, CumMassAddedImpacts, CumEnergyAddedImpacts, \
+         CumEnergyDumped, CumGenHeatAdded, CrustBuildOn, crystHoleCrust, holeTrackerRest, totalHoleAreaCum, holeTracker, \
+         timestepSolver, volumeStepper, seriesRecorder, holeRecorder, impactedCrustRecorder, solverStats, lastLidTemperature) = \
+            [checkpoint['state'][name] for name in LoopStateNames]
+
+        for recorder in (seriesRecorder, holeRecorder, impactedCrustRecorder):
+            recorder.sink = outputSink
+
+        firstIncrement = checkpoint['increment'] + 1
+        previousRunSeconds = checkpoint['runSeconds']
+
+    else:
+        firstIncrement = 0
+        previousRunSeconds = 0
+
+    engineResult = None
+
+    # Run the whole loop in the compiled engine when Numba is installed and the run settings are supported by it (the loop below is then skipped;
+    # it is also used if Numba cannot compile the engine)
+    if Engine == 'jit' and FE.Available and FE.SupportsRun(AdaptiveVolume, SurfTemp_tol, timeStep_solverName, ImpactIntegration, RecordPolicy, StreamOutput, \
+                                                           checkpointTimer is not None):
+
+        if AlanData is not None:
+            impactTable = [np.array(column, dtype=float) for column in (impactFlux.times, impactFlux.massRates, impactFlux.energyRates, \
+                                                                        impactFlux.cumMass, impactFlux.cumEnergy)]
+        else:
+            impactTable = [np.zeros(1)] * 5
+
+        engineResult = FE.RunCoolingLoop(ImpactsSwitch == True, QuenchSwitch == True, GeneralHeatingSwitch == True, KineticEnergySwitch == True, adiabslope, \
+                                         MO_depth_initial, MO_depth_plagBuild, density_MO, Heat_fusion_MO, Heat_capacity_MO, therm_exp_coeff_MO, Diffusivity_MO, \
+                                         dy_viscosity_MO, Temperature_equl, Diffusivity_crust, density_crust, Heat_capacity_crust, Emissivity, mass2area, \
+                                         acc_grav, Temperature_melt, Diffusivity_quench, density_quench, Heat_capacity_quench, Max_Quench_Thickness, \
+                                         vol_increments, percMO_remain_end, plag_holeFill_vs_gblCrust, HeatingRate, KEefficiency, plag_fraction, Radius_moon, \
+                                         SB, timeStep_solverName == 'secant', timeStep_tol, timeStep_maxIter, ImpactIntegration == 'exact', *impactTable)
+
+    if engineResult is not None:
+
+        (engineSeries, engineHoleSeries, engineImpactedCrustSeries, holeArea, holeThickness, holeTemperature, finalState, evaluations, increments, \
+         engineError, engineErrorLuminosity) = engineResult
+
+        # Same errors as the loop below
+        if engineError == FE.ErrorHoleAreaQuench:
+            raise SimulationError("Total Hole Area Exceeds Total Surface Area of Moon (Quench Phase)")
+        elif engineError == FE.ErrorHoleAreaPlag:
+            raise SimulationError("Total Hole Area Exceeds Total Surface Area of Moon (Plag Phase)")
+        elif engineError == FE.ErrorTimestepNotConverged:
+            raise TS.TimestepError('Timestep did not converge in %d iterations' % timeStep_maxIter)
+        elif engineError == FE.ErrorHeatingExceedsLoss:
+            raise TS.TimestepError('Additional heating (%g W) is greater than the heat lost by the Moon (%g W)' % \
+                                   (HeatingRate if GeneralHeatingSwitch == True else 0, engineErrorLuminosity))
+        elif engineError == FE.ErrorInfiniteTimestep:
+            raise FloatingPointError('Infinite timestep passed to GeneralHeating')
+
+        (CMB, CrustalThickness, CrustalThickness_global, fractionLiquid, ellapsedTime, CumMassAddedImpacts, CumEnergyAddedImpacts, CumGenHeatAdded, \
+         crustBuildingStartTime_yrs) = finalState
+
+        for area, thickness, temperature in zip(holeArea, holeThickness, holeTemperature):
+            holeTracker.Append(area, thickness, temperature)
+
+        seriesRecorder.Extend(engineSeries)
+        holeRecorder.Extend(engineHoleSeries)
+        impactedCrustRecorder.Extend(engineImpactedCrustSeries)
+
+        solverStats['TimestepEvaluations'] += int(evaluations)
+        solverStats['VolumeIncrements'] += int(increments)
+
+        firstIncrement = max_increments
+
+    # Main Loop (iterate over the number of volume increments defined above)
+    for interations in range(firstIncrement, max_increments):
+
+        # Switch to make sure timestep correct before proceeding
+        timestepAcceptable = False
+
+        # Switch to always record increments where the regime changes (start of plag crust building, first impact)
+        regimeTransition = False
+
+        # Values at the start of the increment (used to estimate the error of adaptive increments)
+        CMB_Temperature_start = CMB_Temperature
+        quenchThickness_start = quenchThickness
+        CrustalThickness_global_start = CrustalThickness_global
+        TotalHoleArea_increment_start = TotalHoleArea
+
+        # Volume to solidify in this increment (adaptive increments stop at the depth where plag starts to build and at the end of the run)
         if CrustBuildOn == 0:
-            TimeCrustStart = ellapsedTime
-            crustBuildingStartTime_yrs = TimeCrustStart / 3.154e7
-            CrustBuildOn = 1
-            CrustalThickness = quenchThickness   # Done so that the global quench just before plag crust is preserved
-                        
-        # Set fraction of the solidifying material that goes to the solid interior
-        crystCore2Crust = 1 - plag_fraction
-            
-        # If there are no holes, then all of the solidifying material that isn't going to the solid interior builds plagioclase crust globally
-        if not holeTracker:                                                                
-            crystGlobCrust = 1 - crystCore2Crust
-            
-        # If there are holes, then some of the plagioclase will fill into the holes as well as building more global crust
-        elif holeTracker:
-                
-            distriFactor = plag_holeFill_vs_gblCrust * TotalHoleArea/surfArea_Moon
-                
-            if distriFactor > 1:
-                distriFactor = 1
-                
-            crystHoleCrust = (1 - crystCore2Crust) * distriFactor
-                
-            if (surfArea_Moon - TotalHoleArea) / surfArea_Moon <= 1e-6:
-                crystGlobCrust = 0
-                
+            volume_to_plagBuild = (4/3) * np.pi * (pow(Radius_moon - MO_depth_plagBuild, 3) - pow(CMB, 3))
+        else:
+            volume_to_plagBuild = 0
+
+        volSize = volumeStepper.StepSize(volume_to_plagBuild, MO_volume_current - MO_volume_end)
+
+        solidifMass = volSize * density_MO
+        solidifEnergy = solidifMass * Heat_fusion_MO
+
+        # Current volumne of solid interior
+        Core_volume = (4/3) * np.pi * pow(CMB, 3)
+
+        # In the beginning, all solidifying magma falls inward to the solid interior (done until magma ocean depth is equal to MO_depth_plagBuild)
+        if (CMB < (Radius_moon - MO_depth_plagBuild)):
+            crystCore2Crust = 1
+
+        # When solid interior is large enough & is within depth for plagioclase crystallization,
+        # then 55% of solidifying magma goes to the solid interior while the rest builds plagioclase crust
+        elif (CMB >= (Radius_moon - MO_depth_plagBuild)):
+
+            if CrustBuildOn == 0:
+                TimeCrustStart = ellapsedTime
+                crustBuildingStartTime_yrs = TimeCrustStart / 3.154e7
+                CrustBuildOn = 1
+                CrustalThickness = quenchThickness   # Done so that the global quench just before plag crust is preserved
+                regimeTransition = True
+
+            # Set fraction of the solidifying material that goes to the solid interior
+            crystCore2Crust = 1 - plag_fraction
+
+            # If there are no holes, then all of the solidifying material that isn't going to the solid interior builds plagioclase crust globally
+            if len(holeTracker) == 0:
+                crystGlobCrust = 1 - crystCore2Crust
+
+            # If there are holes, then some of the plagioclase will fill into the holes as well as building more global crust
             else:
-                crystGlobCrust = 1 - crystCore2Crust - crystHoleCrust
-                                        
-        CrustalThickness += (crystGlobCrust * (density_MO / density_crust) * volSize) / (4 * np.pi * pow(Radius_moon, 2) - TotalHoleArea)
-        
-                                                        
-    # Update CMB location by adding new core volume (from solidification)
-    CMB = pow( ( (3 * (Core_volume + crystCore2Crust * volSize)) / (4 * np.pi) ), (1/3) )
-        
-    # Reduce magma ocean volume by the volume of the material that solidified
-    MO_volume_current -= volSize
-        
-    # If volume of the magma ocean is less than 0 then stop the iterations
-    if MO_volume_current < (percMO_remain_end/100) * MO_volume_initial:
-        break    
-                    
-    # Remaining magma ocean liquid fraction
-    fractionLiquid = MO_volume_current / MO_volume_initial
-            
-    # Calculate the current temperature at the CMB
-    Solidus_temperature = ST.SolidusTemperature(CMB, fractionLiquid)                                               
-            
-    # Difference in temperature between the previous CMB location and the new location
-    Temperature_change = CMB_Temperature - Solidus_temperature 
-            
-    # Set new CMB temperature at the current CMB temperature
-    CMB_Temperature = Solidus_temperature
-            
-    # Calculate temperature at the top of magma ocean by following the adiabat up
-    Temperature_top_MO = CMB_Temperature - adiabslope * (Radius_moon - CMB)
-            
-    # Energy released by cooling the magma ocean (note need to add the volume of part that solidified since it has to be cooled too) 
-    coolingEnergy = density_MO * (MO_volume_current + volSize) * Heat_capacity_MO * Temperature_change
-        
-    # Current depth of the magma ocean
-    current_MO_depth = Radius_moon - CMB - CrustalThickness_global
-        
-    # Calculate Rayleigh number
-    Ra_number = Ra.RayleighNumber(acc_grav, density_MO, therm_exp_coeff_MO, (CMB_Temperature - Temperature_top_MO), current_MO_depth, dy_viscosity_MO, Diffusivity_MO)
-        
 
-    # Need a loop to find the correct timestep to use
-    while (timestepAcceptable == False):
-            
-        holeTracker_copy = holeTracker
-        HoleThickness_times_HoleArea_array = []
-        MassQuenchAdded = 0
-        MassImpactors_thisTimestep = 0
-        EnergyImpactors_thisTimestep = 0
-        AreaHolesAdded_thisTimestep = 0
-            
-        # If there are holes, need to make their quench crusts thicker at this timestep when no plag and increase thickness due to plag when that has started
-        # Also, use this opportunity to update the temperatures at the top of each hole
-        if holeTracker_copy:
-                
-            for idxHoles, valHoles in enumerate(holeTracker_copy):
-                
+                distriFactor = plag_holeFill_vs_gblCrust * TotalHoleArea/surfArea_Moon
+
+                if distriFactor > 1:
+                    distriFactor = 1
+
+                crystHoleCrust = (1 - crystCore2Crust) * distriFactor
+
+                if (surfArea_Moon - TotalHoleArea) / surfArea_Moon <= 1e-6:
+                    crystGlobCrust = 0
+
+                else:
+                    crystGlobCrust = 1 - crystCore2Crust - crystHoleCrust
+
+            CrustalThickness += (crystGlobCrust * (density_MO / density_crust) * volSize) / (4 * np.pi * pow(Radius_moon, 2) - TotalHoleArea)
+
+
+        # Update CMB location by adding new core volume (from solidification)
+        CMB = pow( ( (3 * (Core_volume + crystCore2Crust * volSize)) / (4 * np.pi) ), (1/3) )
+
+        # Reduce magma ocean volume by the volume of the material that solidified
+        MO_volume_current -= volSize
+
+        # If volume of the magma ocean is less than 0 then stop the iterations
+        if MO_volume_current < (percMO_remain_end/100) * MO_volume_initial:
+            break
+
+        # Remaining magma ocean liquid fraction
+        fractionLiquid = MO_volume_current / MO_volume_initial
+
+        # Calculate the current temperature at the CMB
+        Solidus_temperature = ST.SolidusTemperature(CMB, fractionLiquid)
+
+        # Difference in temperature between the previous CMB location and the new location
+        Temperature_change = CMB_Temperature - Solidus_temperature
+
+        # Set new CMB temperature at the current CMB temperature
+        CMB_Temperature = Solidus_temperature
+
+        # Calculate temperature at the top of magma ocean by following the adiabat up
+        Temperature_top_MO = CMB_Temperature - adiabslope * (Radius_moon - CMB)
+
+        # Energy released by cooling the magma ocean (note need to add the volume of part that solidified since it has to be cooled too)
+        coolingEnergy = density_MO * (MO_volume_current + volSize) * Heat_capacity_MO * Temperature_change
+
+        # Current depth of the magma ocean
+        current_MO_depth = Radius_moon - CMB - CrustalThickness_global
+
+        # Calculate Rayleigh number
+        Ra_number = Ra.RayleighNumber(acc_grav, density_MO, therm_exp_coeff_MO, (CMB_Temperature - Temperature_top_MO), current_MO_depth, dy_viscosity_MO, Diffusivity_MO)
+
+        # Quantities that don't change while the timestep is being found (computed once and shared by all holes, lids and retries)
+        incrementState = IS.IncrementState(CMB_Temperature, Temperature_top_MO, current_MO_depth, Ra_number, Heat_capacity_MO, density_MO, Diffusivity_MO, \
+                                           Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, Heat_capacity_quench, Temperature_melt, \
+                                           Max_Quench_Thickness)
+
+
+        # Energy to dump is linear in the timestep when there are no impacts, so then the timestep can be found directly
+        linearBudget = timestepSolver.directLinear and (ImpactsSwitch == False or (CrustBuildOn == 0 and quenchThickness == 0 and len(holeTracker) == 0))
+
+        # Every try of the timestep starts from the state at the beginning of the increment
+        TotalHoleArea_start = TotalHoleArea
+        Extra_Crust_Due_Impacts_start = Extra_Crust_Due_Impacts
+        vol_Quench_excavated_start = vol_Quench_excavated
+
+        # Start from the timestep of the previous increment
+        timeStep = timestepSolver.Start(timeStep)
+
+        # Need a loop to find the correct timestep to use
+        while (timestepAcceptable == False):
+
+            holeTracker_copy = holeTracker.Copy()
+            TotalHoleArea = TotalHoleArea_start
+            Extra_Crust_Due_Impacts = Extra_Crust_Due_Impacts_start
+            vol_Quench_excavated = vol_Quench_excavated_start
+            HoleThickness_times_HoleArea_array = np.empty(0)
+            MassQuenchAdded = 0
+            MassImpactors_thisTimestep = 0
+            EnergyImpactors_thisTimestep = 0
+            AreaHolesAdded_thisTimestep = 0
+
+            # If there are holes, need to make their quench crusts thicker at this timestep when no plag and increase thickness due to plag when that has started
+            # Also, use this opportunity to update the temperatures at the top of each hole
+            if len(holeTracker_copy) != 0:
+
                 if CrustBuildOn == 0:
-                        
-                    # If hole quench crust thickness is less than max thickness value
-                    if holeTracker_copy[idxHoles][1] < Max_Quench_Thickness:
-                        
-                        PresentQuenchThickness_inHole = QC.QuenchCrust(CMB_Temperature, Temperature_top_MO, current_MO_depth, Heat_capacity_MO, Heat_fusion_MO, density_MO, \
-                                                                        Diffusivity_MO, Ra_number, Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, \
-                                                                        Heat_capacity_quench, Temperature_melt, Max_Quench_Thickness, timeStep)
-                            
-                        PresentTemperature_top_quench_inHole = SurfTemperature.SurfaceTemperature(Temperature_top_MO, holeTracker_copy[idxHoles][2], PresentQuenchThickness_inHole, \
-                                                                                                    Diffusivity_quench, density_quench, Heat_capacity_quench, SB, Emissivity, \
-                                                                                                    Temperature_equl)    
-                            
-                        LastQuenchThickness_inHole = holeTracker_copy[idxHoles][1]
-                            
+
+                    # Holes with quench crust thickness less than max thickness value
+                    growingHoles = holeTracker_copy.thickness < Max_Quench_Thickness
+
+                    if growingHoles.any():
+
+                        PresentQuenchThickness_inHole = incrementState.EqulQuenchThickness
+
+                        PresentTemperature_top_quench_inHole = LidSurfaceTemperature(Temperature_top_MO, holeTracker_copy.temperature[growingHoles], PresentQuenchThickness_inHole, \
+                                                                                        Diffusivity_quench, density_quench, Heat_capacity_quench)
+
+                        LastQuenchThickness_inHole = holeTracker_copy.thickness[growingHoles]
+
                         # Mass of new quench added is additional thickness added (present thickness minus old thickness) multiplied by area of hole and density of quench
-                        MassQuenchAdded += (PresentQuenchThickness_inHole - LastQuenchThickness_inHole) * holeTracker_copy[idxHoles][0] * density_quench
-                            
-                        holeTracker_copy[idxHoles][1] = PresentQuenchThickness_inHole
-                        holeTracker_copy[idxHoles][2] = PresentTemperature_top_quench_inHole
-                            
-        
-                    # Else if hole quench crust thickness is greater than or equal to max thickness value
-                    elif holeTracker_copy[idxHoles][1] >= Max_Quench_Thickness:
-                        holeTracker_copy[idxHoles][1] = Max_Quench_Thickness
-                        
-                        
+                        MassQuenchAdded += np.sum((PresentQuenchThickness_inHole - LastQuenchThickness_inHole) * holeTracker_copy.area[growingHoles] * density_quench)
+
+                        holeTracker_copy.thickness[growingHoles] = PresentQuenchThickness_inHole
+                        holeTracker_copy.temperature[growingHoles] = PresentTemperature_top_quench_inHole
+
+                    # Holes with quench crust thickness greater than or equal to max thickness value
+                    holeTracker_copy.thickness[holeTracker_copy.thickness >= Max_Quench_Thickness] = Max_Quench_Thickness
+
+
                 elif CrustBuildOn == 1:
-                        
-                    holeTracker_copy[idxHoles][1] += (crystHoleCrust * (density_MO / density_crust) * volSize) / TotalHoleArea
-                        
-                    HoleThickness_times_HoleArea_array.append(holeTracker_copy[idxHoles][1] * holeTracker_copy[idxHoles][0])
-                    
-                    holeTracker_copy[idxHoles][2] = SurfTemperature.SurfaceTemperature(Temperature_top_MO, holeTracker_copy[idxHoles][2], holeTracker_copy[idxHoles][1], \
-                                                                                        Diffusivity_crust, density_crust, Heat_capacity_crust, SB, Emissivity, \
-                                                                                        Temperature_equl)
-            
-        # HOW MUCH GLOBAL QUENCH CRUST IS PRESENT?
-                
-        # Only makes sense to look at quench crust before plagioclase crust begins to form
-        if CrustBuildOn == 0 and QuenchSwitch == True:
-                    
-            # Calculate global quench crust thickness add (or subtracted)
-            PresentQuenchThickness = QC.QuenchCrust(CMB_Temperature, Temperature_top_MO, current_MO_depth, Heat_capacity_MO, Heat_fusion_MO, density_MO, Diffusivity_MO, Ra_number, \
-                                                        Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, Heat_capacity_quench, Temperature_melt, Max_Quench_Thickness, \
-                                                        timeStep)
-                
-            PresentTemperature_top_quench = SurfTemperature.SurfaceTemperature(Temperature_top_MO, Temperature_top_MO, quenchThickness, Diffusivity_quench, density_quench, \
-                                                                                Heat_capacity_quench, SB, Emissivity, Temperature_equl)    
-                
-            # Mass of new quench added 
-            # Equal to thinkness of new quench (present minus old value), multiplied by surface area of Moon minus surface area of holes, multiplied by density of quench
-            if (quenchThickness < Max_Quench_Thickness):
-                MassQuenchAdded += (PresentQuenchThickness - quenchThickness) * (surfArea_Moon - TotalHoleArea) * density_quench
-            
-            
-        # If conduction has started or there is quench crust...
-        if CrustBuildOn == 1 and ImpactsSwitch == True:
-                
-            [areaHoles, MassImpactors_thisTimestep, EnergyImpactors_thisTimestep] = I.PuncturingImpacts(ellapsedTime/3.154e7, timeStep/3.154e7, mass2area, AlanData)
-                
-            AreaHolesAdded_thisTimestep += areaHoles
-                                                                                
-            # If areaHoles is 0 then skip
-            if areaHoles != 0:
-                    
-                # The crust that was present before the impact cannot just disappear, here it will be spreadout over the rest of the Moon
-                    
-                vol_Crust_excavated_inHoleAreas = (TotalHoleArea / surfArea_Moon) * areaHoles * (HoleThickness_times_HoleArea_Sum / TotalHoleArea)
-                    
-                vol_Crust_excavated_nonImpactedAreas = ((surfArea_Moon - TotalHoleArea) / surfArea_Moon) * areaHoles * CrustalThickness
-                    
-                vol_Crust_excavated = vol_Crust_excavated_inHoleAreas + vol_Crust_excavated_nonImpactedAreas
-                                                                                                    
-                Extra_Crust_Due_Impacts = vol_Crust_excavated / surfArea_Moon
-                
-                for valHoles in holeTracker_copy:
-                    valHoles[1] += Extra_Crust_Due_Impacts
-                    valHoles[0] = valHoles[0] * (1 - (areaHoles / surfArea_Moon))
-                    
-                PresentQuenchThickness_inHole = QC.QuenchCrust(CMB_Temperature, Temperature_top_MO, current_MO_depth, Heat_capacity_MO, Heat_fusion_MO, density_MO, Diffusivity_MO, \
-                                                                Ra_number, Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, Heat_capacity_quench, Temperature_melt, \
-                                                                Max_Quench_Thickness, timeStep)
-                            
-                PresentTemperature_top_quench_inHole = SurfTemperature.SurfaceTemperature(Temperature_top_MO, Temperature_top_MO, PresentQuenchThickness_inHole, \
-                                                                                            Diffusivity_quench, density_quench, Heat_capacity_quench, SB, Emissivity, Temperature_equl)    
-                    
-                # Note that area of new hole is going to be reduced by a factor depending on the area that already has holes                                                                
-                holeTracker_copy.append( [areaHoles, PresentQuenchThickness_inHole, PresentTemperature_top_quench_inHole] )
-                    
-                # Mass of new quench added is additional thickness added multiplied by the area of hole, multiplied by density of quench
-                MassQuenchAdded += PresentQuenchThickness_inHole * areaHoles * density_quench
-
-        elif quenchThickness != 0 and ImpactsSwitch == True:
-                
-            [areaHoles, MassImpactors_thisTimestep, EnergyImpactors_thisTimestep] = I.PuncturingImpacts(ellapsedTime/3.154e7, timeStep/3.154e7, mass2area, AlanData)
-                
-            AreaHolesAdded_thisTimestep += areaHoles
-                                                                                                                                                                                            
-            # If areaHoles is 0 then skip
-            if areaHoles != 0:                    
-                    
-                if TotalHoleArea != 0:
-                    # Quench that was present before the impact cannot just disappear
-                        
-                    vol_Quench_excavated_inHoleAreas = (TotalHoleArea / surfArea_Moon) * areaHoles * (HoleThickness_times_HoleArea_Sum / TotalHoleArea)
-                        
-                    vol_Quench_excavated_nonImpactedAreas = ((surfArea_Moon - TotalHoleArea) / surfArea_Moon) * areaHoles * quenchThickness
-                        
-                    vol_Quench_excavated = vol_Quench_excavated_inHoleAreas + vol_Quench_excavated_nonImpactedAreas
-                                                                                                                                                                                                        
-                    for valHoles in holeTracker_copy:
-                        valHoles[0] = valHoles[0] * (1 - (areaHoles / surfArea_Moon))
-                        
-                    
-                PresentQuenchThickness_inHole = QC.QuenchCrust(CMB_Temperature, Temperature_top_MO, current_MO_depth, Heat_capacity_MO, Heat_fusion_MO, density_MO, Diffusivity_MO, \
-                                                                Ra_number, Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, Heat_capacity_quench, Temperature_melt, \
-                                                                Max_Quench_Thickness, timeStep)
-                            
-                PresentTemperature_top_quench_inHole = SurfTemperature.SurfaceTemperature(Temperature_top_MO, Temperature_top_MO, PresentQuenchThickness_inHole, \
-                                                                                            Diffusivity_quench, density_quench, Heat_capacity_quench, SB, Emissivity, Temperature_equl)    
-                                         
-                holeTracker_copy.append( [areaHoles, PresentQuenchThickness_inHole, PresentTemperature_top_quench_inHole] )
-            
-                # Mass of new quench added is additional thickness added multiplied by the area of hole, multiplied by density of quench MINUS
-                # Mass of quench that was present but was melted by impacts
-                MassQuenchAdded += PresentQuenchThickness_inHole * areaHoles * density_quench - density_quench * vol_Quench_excavated
-            
-        # Heat of fusion energy for the additional quench crust that formed in this timestep
-        quenchFormEnergy = MassQuenchAdded * Heat_fusion_MO
-            
-        # General heating
-        AdditionalHeating = GH.GeneralHeating(GeneralHeatingSwitch, HeatingRate, timeStep)
-                                                                                                                                                            
-        # Energy to be released from the top (heat of fusion, secular cooling, heat of fusion of quench, additional heat)    
-        # quenchFormEnergy is negative because Stefan problem already has dumped that much energy
-        Energy2Dump = solidifEnergy + coolingEnergy - quenchFormEnergy + AdditionalHeating
-        
-        # If switch on, also add kinetic energy imparted by impacts
-        if KineticEnergySwitch == True:
-            Energy2Dump += KEefficiency * EnergyImpactors_thisTimestep
 
-                                                                                
-        # RELEASE ENERGY
-                        
-        # Pick energy dumping mechanism (radiation or conduction)
-        if quenchThickness == 0 and CrustBuildOn == 0:
-                    
-            Rad_Flux = Emissivity * SB * (pow(Temperature_top_MO, 4) - pow(Temperature_equl, 4))
-                    
-            Lum_Radiation = surfArea_Moon * Rad_Flux
-                    
-            # Time needed to release energy through radiation
-            time2Dump = Energy2Dump / Lum_Radiation
-                                                
-                                    
-        elif QuenchSwitch == True and CrustBuildOn == 0:
-
-            # If user wants to include impacts    
-            if ImpactsSwitch == True:       
-                     
-                # Find what the surface temperature is...
-                Temperature_top_quench = SurfTemperature.SurfaceTemperature(Temperature_melt, Temperature_melt, quenchThickness, Diffusivity_quench, density_quench, \
-                                                                                Heat_capacity_quench, SB, Emissivity, Temperature_equl)                                
-                                                                                                                  
-                TotalHoleArea = 0
-                Lum_holes = 0
-                        
-                for idx, rowVal in enumerate(holeTracker_copy):
-                        
-                    TotalHoleArea += rowVal[0]
-                        
-                    # if there is quench crust on top of hole...
-                    if rowVal[1] != 0:
-                        Lum_holes += rowVal[0] * Diffusivity_quench * density_quench * Heat_capacity_quench * (Temperature_melt - rowVal[2]) / rowVal[1]
-                        
-                    # if there isn't any quench crust on top of hole...
-                    elif rowVal[1] == 0:
-                        Lum_holes += rowVal[0] * Emissivity * SB * (pow(Temperature_top_MO, 4) - pow(Temperature_equl, 4))
-                            
-                Lum_cond_restMoon = (surfArea_Moon - TotalHoleArea) * Diffusivity_quench * density_quench * Heat_capacity_quench * (Temperature_melt - Temperature_top_quench) / quenchThickness
-                        
-                Lum_tot = Lum_holes + Lum_cond_restMoon
-                    
-                if surfArea_Moon < TotalHoleArea:
-                    print("Warning: Total Hole Area Exceeds Total Surface Area of Moon (Quench Phase)")
-                    quit()                    
-                    
-            # If not including impacts, then they have no effect
-            else:                           
-                                                                               
-                Lum_tot = surfArea_Moon * Diffusivity_quench * density_quench * Heat_capacity_quench * (Temperature_melt - PresentTemperature_top_quench) / quenchThickness
-            
-            # Time needed to release energy through conduction
-            time2Dump = Energy2Dump / Lum_tot
-                
-                                                                   
-        elif CrustBuildOn == 1:             
-                    
-            # If user wants to include impacts
-            if ImpactsSwitch == True:       
-                            
-                # Find what the surface temperature is...
-                Temperature_top_crust = SurfTemperature.SurfaceTemperature(Temperature_top_MO, Temperature_top_MO, CrustalThickness, \
-                                                                                Diffusivity_crust, density_crust, Heat_capacity_crust, SB, Emissivity, Temperature_equl)
-                            
-                TotalHoleArea = 0
-                Lum_holes = 0
-                                                
-                for idx, rowVal in enumerate(holeTracker_copy):
-                        
-                    TotalHoleArea += rowVal[0]
-                        
-                    # if there is crust on top of hole...
-                    if rowVal[1] != 0:                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                              
-                        Lum_holes += rowVal[0] * Diffusivity_crust * density_crust * Heat_capacity_crust * (Temperature_melt - rowVal[2]) / rowVal[1]
-                                        
-                    # if there is no quench crust on top of hole...
-                    elif rowVal[1] == 0:
-                        Lum_holes += rowVal[0] * Emissivity * SB * (pow(Temperature_top_MO, 4) - pow(Temperature_equl, 4))
-                            
-                Lum_cond_restMoon = (surfArea_Moon - TotalHoleArea) * Diffusivity_crust * density_crust * Heat_capacity_crust * (Temperature_top_MO - Temperature_top_crust) / CrustalThickness
-                        
-                Lum_tot = Lum_holes + Lum_cond_restMoon
-                        
-                if surfArea_Moon < TotalHoleArea:
-                    print("Warning: Total Hole Area Exceeds Total Surface Area of Moon (Plag Phase)")
-                    quit()
-                    
-            # If not including impacts, then they have no effect
-            elif ImpactsSwitch == False:
-                            
-                # Find what the surface temperature is...
-                Temperature_top_crust = SurfTemperature.SurfaceTemperature(Temperature_top_MO, Temperature_top_MO, CrustalThickness, Diffusivity_crust, density_crust, \
-                                                                            Heat_capacity_crust, SB, Emissivity, Temperature_equl)                          
-                                                                            
-                Lum_tot = surfArea_Moon * Diffusivity_crust * density_crust * Heat_capacity_crust * (Temperature_top_MO - Temperature_top_crust) / CrustalThickness
-            
-            # Time needed to release energy through conduction
-            time2Dump = Energy2Dump / Lum_tot
+                    holeTracker_copy.thickness += (crystHoleCrust * (density_MO / density_crust) * volSize) / TotalHoleArea
 
-        
-        # Check if timestep is acceptable
-        tolLevel = time2Dump * timeStep_tol
-            
-        if (timeStep <= time2Dump + tolLevel) and (timeStep >= time2Dump - tolLevel):               
-            timestepAcceptable = True
-            holeTracker = holeTracker_copy
-                
+                    HoleThickness_times_HoleArea_array = holeTracker_copy.thickness * holeTracker_copy.area
+
+                    holeTracker_copy.temperature = LidSurfaceTemperature(Temperature_top_MO, holeTracker_copy.temperature, holeTracker_copy.thickness, \
+                                                                        Diffusivity_crust, density_crust, Heat_capacity_crust)
+
+            # HOW MUCH GLOBAL QUENCH CRUST IS PRESENT?
+
+            # Only makes sense to look at quench crust before plagioclase crust begins to form
+            if CrustBuildOn == 0 and QuenchSwitch == True:
+
+                # Calculate global quench crust thickness add (or subtracted)
+                PresentQuenchThickness = incrementState.EqulQuenchThickness
+
+                PresentTemperature_top_quench = LidSurfaceTemperature(Temperature_top_MO, Temperature_top_MO, quenchThickness, Diffusivity_quench, density_quench, \
+                                                                        Heat_capacity_quench, 'quench')
+
+                # Mass of new quench added
+                # Equal to thinkness of new quench (present minus old value), multiplied by surface area of Moon minus surface area of holes, multiplied by density of quench
+                if (quenchThickness < Max_Quench_Thickness):
+                    MassQuenchAdded += (PresentQuenchThickness - quenchThickness) * (surfArea_Moon - TotalHoleArea) * density_quench
+
+
+            # If conduction has started or there is quench crust...
             if CrustBuildOn == 1 and ImpactsSwitch == True:
-                HoleThickness_times_HoleArea_Sum = sum(HoleThickness_times_HoleArea_array)
-            
-        else:                    
-            timeStep = time2Dump
-        
-        
-    # Update global quench crust thickness
-    if QuenchSwitch == True and (quenchThickness < Max_Quench_Thickness):
-        quenchThickness += (PresentQuenchThickness - quenchThickness) - Reduce_Global_Quench_Due_Impacts
-        
-        
-    if QuenchSwitch == True:
-        # Reduce magma ocean volume by the volume of the additional quench that solidified during this timestep
-        MO_volume_current -= MassQuenchAdded / density_MO 
-        
-        # If volume of the magma ocean is less than 0 then stop the iterations
-        if MO_volume_current < (percMO_remain_end/100) * MO_volume_initial:
-            break    
-                    
-        # Remaining magma ocean liquid fraction
-        fractionLiquid = MO_volume_current / MO_volume_initial        
-                
-                
-    # CrustalThickness is only the thickness in non-hole areas so the actual gloabl crustal thickness is an average...        
-    if CrustBuildOn == 1 and holeTracker:
-                                                
-        CrustalThickness = CrustalThickness + Extra_Crust_Due_Impacts #- Reduce_Global_Crust_Due_Impacts
-        CrustThicknessImpMoon = HoleThickness_times_HoleArea_Sum / TotalHoleArea
-            
-        # Add impacted crustal thickness to array
-        CrustalThickness_Impacted_array.append(CrustThicknessImpMoon)
-        Time_array_impactedCrust.append(ellapsedTime)
-            
-        CrustalThickness_global = (CrustalThickness * (surfArea_Moon - TotalHoleArea) / surfArea_Moon) + (CrustThicknessImpMoon * TotalHoleArea / surfArea_Moon)
-            
+
+                [areaHoles, MassImpactors_thisTimestep, EnergyImpactors_thisTimestep] = PuncturingImpacts(ellapsedTime/3.154e7, timeStep/3.154e7, mass2area)
+
+                AreaHolesAdded_thisTimestep += areaHoles
+
+                # If areaHoles is 0 then skip
+                if areaHoles != 0:
+
+                    # The crust that was present before the impact cannot just disappear, here it will be spreadout over the rest of the Moon
+
+                    vol_Crust_excavated_inHoleAreas = (TotalHoleArea / surfArea_Moon) * areaHoles * (HoleThickness_times_HoleArea_Sum / TotalHoleArea)
+
+                    vol_Crust_excavated_nonImpactedAreas = ((surfArea_Moon - TotalHoleArea) / surfArea_Moon) * areaHoles * CrustalThickness
+
+                    vol_Crust_excavated = vol_Crust_excavated_inHoleAreas + vol_Crust_excavated_nonImpactedAreas
+
+                    Extra_Crust_Due_Impacts = vol_Crust_excavated / surfArea_Moon
+
+                    holeTracker_copy.thickness += Extra_Crust_Due_Impacts
+                    holeTracker_copy.area *= (1 - (areaHoles / surfArea_Moon))
+
+                    PresentQuenchThickness_inHole = incrementState.EqulQuenchThickness
+
+                    PresentTemperature_top_quench_inHole = LidSurfaceTemperature(Temperature_top_MO, Temperature_top_MO, PresentQuenchThickness_inHole, \
+                                                                                    Diffusivity_quench, density_quench, Heat_capacity_quench, 'newHole')
+
+                    # Note that area of new hole is going to be reduced by a factor depending on the area that already has holes
+                    holeTracker_copy.Append(areaHoles, PresentQuenchThickness_inHole, PresentTemperature_top_quench_inHole)
+
+                    # Mass of new quench added is additional thickness added multiplied by the area of hole, multiplied by density of quench
+                    MassQuenchAdded += PresentQuenchThickness_inHole * areaHoles * density_quench
+
+            elif quenchThickness != 0 and ImpactsSwitch == True:
+
+                [areaHoles, MassImpactors_thisTimestep, EnergyImpactors_thisTimestep] = PuncturingImpacts(ellapsedTime/3.154e7, timeStep/3.154e7, mass2area)
+
+                AreaHolesAdded_thisTimestep += areaHoles
+
+                # If areaHoles is 0 then skip
+                if areaHoles != 0:
+
+                    if TotalHoleArea != 0:
+                        # Quench that was present before the impact cannot just disappear
+
+                        vol_Quench_excavated_inHoleAreas = (TotalHoleArea / surfArea_Moon) * areaHoles * (HoleThickness_times_HoleArea_Sum / TotalHoleArea)
+
+                        vol_Quench_excavated_nonImpactedAreas = ((surfArea_Moon - TotalHoleArea) / surfArea_Moon) * areaHoles * quenchThickness
+
+                        vol_Quench_excavated = vol_Quench_excavated_inHoleAreas + vol_Quench_excavated_nonImpactedAreas
+
+                        holeTracker_copy.area *= (1 - (areaHoles / surfArea_Moon))
+
+
+                    PresentQuenchThickness_inHole = incrementState.EqulQuenchThickness
+
+                    PresentTemperature_top_quench_inHole = LidSurfaceTemperature(Temperature_top_MO, Temperature_top_MO, PresentQuenchThickness_inHole, \
+                                                                                    Diffusivity_quench, density_quench, Heat_capacity_quench, 'newHole')
+
+                    holeTracker_copy.Append(areaHoles, PresentQuenchThickness_inHole, PresentTemperature_top_quench_inHole)
+
+                    # Mass of new quench added is additional thickness added multiplied by the area of hole, multiplied by density of quench MINUS
+                    # Mass of quench that was present but was melted by impacts
+                    MassQuenchAdded += PresentQuenchThickness_inHole * areaHoles * density_quench - density_quench * vol_Quench_excavated
+
+            # Heat of fusion energy for the additional quench crust that formed in this timestep
+            quenchFormEnergy = MassQuenchAdded * Heat_fusion_MO
+
+            # General heating
+            AdditionalHeating = GH.GeneralHeating(GeneralHeatingSwitch, HeatingRate, timeStep)
+
+            # Energy to be released from the top (heat of fusion, secular cooling, heat of fusion of quench, additional heat)
+            # quenchFormEnergy is negative because Stefan problem already has dumped that much energy
+            Energy2Dump = solidifEnergy + coolingEnergy - quenchFormEnergy + AdditionalHeating
+
+            # If switch on, also add kinetic energy imparted by impacts
+            if KineticEnergySwitch == True:
+                Energy2Dump += KEefficiency * EnergyImpactors_thisTimestep
+
+
+            # RELEASE ENERGY
+
+            # Pick energy dumping mechanism (radiation or conduction)
+            if quenchThickness == 0 and CrustBuildOn == 0:
+
+                Rad_Flux = incrementState.Rad_Flux
+
+                Lum_Radiation = surfArea_Moon * Rad_Flux
+
+                Lum_dump = Lum_Radiation
+
+
+            elif QuenchSwitch == True and CrustBuildOn == 0:
+
+                # If user wants to include impacts
+                if ImpactsSwitch == True:
+
+                    # Find what the surface temperature is...
+                    Temperature_top_quench = LidSurfaceTemperature(Temperature_melt, Temperature_melt, quenchThickness, Diffusivity_quench, density_quench, \
+                                                                    Heat_capacity_quench, 'quenchMelt')
+
+                    TotalHoleArea = np.sum(holeTracker_copy.area)
+
+                    # Holes with quench crust on top conduct, holes without any quench crust radiate
+                    coveredHoles = holeTracker_copy.thickness != 0
+                    openHoles = ~coveredHoles
+
+                    Lum_holes = np.sum(holeTracker_copy.area[coveredHoles] * Diffusivity_quench * density_quench * Heat_capacity_quench * \
+                                        (Temperature_melt - holeTracker_copy.temperature[coveredHoles]) / holeTracker_copy.thickness[coveredHoles]) + \
+                                np.sum(holeTracker_copy.area[openHoles] * incrementState.Rad_Flux)
+
+                    Lum_cond_restMoon = (surfArea_Moon - TotalHoleArea) * Diffusivity_quench * density_quench * Heat_capacity_quench * (Temperature_melt - Temperature_top_quench) / quenchThickness
+
+                    Lum_tot = Lum_holes + Lum_cond_restMoon
+
+                    if surfArea_Moon < TotalHoleArea:
+                        raise SimulationError("Total Hole Area Exceeds Total Surface Area of Moon (Quench Phase)")
+
+                # If not including impacts, then they have no effect
+                else:
+
+                    Lum_tot = surfArea_Moon * Diffusivity_quench * density_quench * Heat_capacity_quench * (Temperature_melt - PresentTemperature_top_quench) / quenchThickness
+
+                Lum_dump = Lum_tot
+
+
+            elif CrustBuildOn == 1:
+
+                # If user wants to include impacts
+                if ImpactsSwitch == True:
+
+                    # Find what the surface temperature is...
+                    Temperature_top_crust = LidSurfaceTemperature(Temperature_top_MO, Temperature_top_MO, CrustalThickness, Diffusivity_crust, density_crust, \
+                                                                    Heat_capacity_crust, 'crust')
+
+                    TotalHoleArea = np.sum(holeTracker_copy.area)
+
+                    # Holes with crust on top conduct, holes without any crust radiate
+                    coveredHoles = holeTracker_copy.thickness != 0
+                    openHoles = ~coveredHoles
+
+                    Lum_holes = np.sum(holeTracker_copy.area[coveredHoles] * Diffusivity_crust * density_crust * Heat_capacity_crust * \
+                                        (Temperature_melt - holeTracker_copy.temperature[coveredHoles]) / holeTracker_copy.thickness[coveredHoles]) + \
+                                np.sum(holeTracker_copy.area[openHoles] * incrementState.Rad_Flux)
+
+                    Lum_cond_restMoon = (surfArea_Moon - TotalHoleArea) * Diffusivity_crust * density_crust * Heat_capacity_crust * (Temperature_top_MO - Temperature_top_crust) / CrustalThickness
+
+                    Lum_tot = Lum_holes + Lum_cond_restMoon
+
+                    if surfArea_Moon < TotalHoleArea:
+                        raise SimulationError("Total Hole Area Exceeds Total Surface Area of Moon (Plag Phase)")
+
+                # If not including impacts, then they have no effect
+                elif ImpactsSwitch == False:
+
+                    # Find what the surface temperature is...
+                    Temperature_top_crust = LidSurfaceTemperature(Temperature_top_MO, Temperature_top_MO, CrustalThickness, Diffusivity_crust, density_crust, \
+                                                                    Heat_capacity_crust, 'crust')
+
+                    Lum_tot = surfArea_Moon * Diffusivity_crust * density_crust * Heat_capacity_crust * (Temperature_top_MO - Temperature_top_crust) / CrustalThickness
+
+                Lum_dump = Lum_tot
+
+
+            # Solve for the timestep directly (energy to dump is Energy2Dump_fixed + HeatingRate * timeStep)
+            if linearBudget:
+
+                Energy2Dump_fixed = Energy2Dump - AdditionalHeating
+
+                timeStep = TS.LinearTimestep(Energy2Dump_fixed, HeatingRate if GeneralHeatingSwitch == True else 0, Lum_dump)
+
+                AdditionalHeating = GH.GeneralHeating(GeneralHeatingSwitch, HeatingRate, timeStep)
+
+                Energy2Dump = Energy2Dump_fixed + AdditionalHeating
+
+            # Time needed to release energy through radiation or conduction
+            time2Dump = Energy2Dump / Lum_dump
+
+            # Check if timestep is acceptable
+            if linearBudget:
+                timestepAcceptable = True
+                timestepSolver.evaluations = 1
+            else:
+                timestepAcceptable, nextTimeStep = timestepSolver.Update(timeStep, time2Dump)
+
+            if timestepAcceptable:
+                holeTracker = holeTracker_copy
+
+                if CrustBuildOn == 1 and ImpactsSwitch == True:
+                    HoleThickness_times_HoleArea_Sum = np.sum(HoleThickness_times_HoleArea_array)
+
+            else:
+                timeStep = nextTimeStep
+
+
+        # Update global quench crust thickness
+        if QuenchSwitch == True and (quenchThickness < Max_Quench_Thickness):
+            quenchThickness += (PresentQuenchThickness - quenchThickness) - Reduce_Global_Quench_Due_Impacts
+
+
+        if QuenchSwitch == True:
+            # Reduce magma ocean volume by the volume of the additional quench that solidified during this timestep
+            MO_volume_current -= MassQuenchAdded / density_MO
+
+            # If volume of the magma ocean is less than 0 then stop the iterations
+            if MO_volume_current < (percMO_remain_end/100) * MO_volume_initial:
+                break
+
+            # Remaining magma ocean liquid fraction
+            fractionLiquid = MO_volume_current / MO_volume_initial
+
+
+        # First impact of the run
+        if MassImpactors_thisTimestep > 0 and CumMassAddedImpacts == 0:
+            regimeTransition = True
+
+
+        # CrustalThickness is only the thickness in non-hole areas so the actual gloabl crustal thickness is an average...
+        if CrustBuildOn == 1 and len(holeTracker) != 0:
+
+            CrustalThickness = CrustalThickness + Extra_Crust_Due_Impacts #- Reduce_Global_Crust_Due_Impacts
+            CrustThicknessImpMoon = HoleThickness_times_HoleArea_Sum / TotalHoleArea
+
+            # Record impacted crustal thickness
+            impactedCrustRecorder.Record(regimeTransition, ellapsedTime, CrustThicknessImpMoon)
+
+            CrustalThickness_global = (CrustalThickness * (surfArea_Moon - TotalHoleArea) / surfArea_Moon) + (CrustThicknessImpMoon * TotalHoleArea / surfArea_Moon)
+
+        else:
+            CrustalThickness_global = CrustalThickness
+
+
+        # Check to see if there are holes that have hole thickness about equal to the non-impacted surface crustal thickness
+        # If so, remove those holes from holeTracker
+        if CrustBuildOn == 0:
+
+            # Keep only holes that have less quench than the global quench crust thickness
+            holeTracker.Keep(holeTracker.thickness < quenchThickness)
+
+        elif CrustBuildOn == 1:
+
+            # Keep only holes that have less crust than the global non-impacted crustal thickness
+            holeTracker.Keep(holeTracker.thickness < CrustalThickness)
+
+
+        if len(holeTracker) != 0:
+
+            # Cumulative hole area added to the Moon over time
+            totalHoleAreaCum += AreaHolesAdded_thisTimestep
+
+            # Record total hole area (% of surface), mean hole thickness and temperature, area of holes added per year during this timestep,
+            # cumulative hole area added (% of surface) and number of holes
+            holeRecorder.Record(regimeTransition, ellapsedTime, (np.sum(holeTracker.area) / surfArea_Moon) * 100, np.sum(holeTracker.thickness) / len(holeTracker), \
+                                np.sum(holeTracker.temperature) / len(holeTracker), AreaHolesAdded_thisTimestep/(timeStep/3.154e7), \
+                                (totalHoleAreaCum/surfArea_Moon)*100, len(holeTracker))
+
+        # Updated total mass added by impacts
+        CumMassAddedImpacts += MassImpactors_thisTimestep
+
+        # Updated total energy added by impacts
+        CumEnergyAddedImpacts += KEefficiency * EnergyImpactors_thisTimestep
+
+        # Updated total energy added by general heating
+        CumGenHeatAdded += AdditionalHeating
+
+        # Updated total energy dumped
+        CumEnergyDumped += Energy2Dump
+
+        # Updated ellapsed time
+        ellapsedTime += time2Dump
+
+        # Record ellapsed time, liquid fraction, CMB location and temperature, crustal thickness, number of tries for the timestep and volume of this increment
+        seriesRecorder.Record(regimeTransition, ellapsedTime, fractionLiquid, CMB, CMB_Temperature, CrustalThickness, CrustalThickness_global, \
+                              timestepSolver.evaluations, volSize)
+        solverStats['TimestepEvaluations'] += timestepSolver.evaluations
+        solverStats['VolumeIncrements'] += 1
+
+        # Adapt the volume of the next increment to how much this one changed things
+        volumeStepper.Update(VS.RelativeChange(CMB_Temperature, CMB_Temperature_start), VS.RelativeChange(quenchThickness, quenchThickness_start), \
+                             VS.RelativeChange(CrustalThickness_global, CrustalThickness_global_start), \
+                             (TotalHoleArea - TotalHoleArea_increment_start) / surfArea_Moon, time2Dump / ellapsedTime)
+
+        # Save the state of the loop (streamed output is written out first so that the spool files match the checkpoint)
+        if checkpointTimer is not None and checkpointTimer.Due(interations):
+
+            if outputWriter is not None:
+                for recorder in (seriesRecorder, holeRecorder, impactedCrustRecorder):
+                    recorder.Flush()
+                spoolSizes = outputWriter.Sync()
+            else:
+                spoolSizes = None
+
+            loopVariables = locals()
+            CP.SaveCheckpoint(checkpointFile, params, iMagma_version, interations, dict((name, loopVariables[name]) for name in LoopStateNames), \
+                              previousRunSeconds + (datetime.datetime.now() - TimeStamp_start).total_seconds(), spoolSizes)
+            checkpointTimer.Saved()
+
+    #################################################################################################################################################
+
+
+    ####### POST-PROCESSING #########################################################################################################################
+
+    # Mass bookkeeping
+    Mass_solid_interior_added = density_MO * (4/3) * np.pi * (pow(CMB, 3) - pow(Radius_moon - MO_depth_initial, 3))
+
+    # The way this is done, there will be some error since assuming all crust density is plagioclase density
+    Mass_crust_in_holes = np.sum(holeTracker.area * holeTracker.thickness * density_crust)
+    Last_Total_Hole_Area = np.sum(holeTracker.area)
+
+    Mass_crust_nonImpacted = CrustalThickness * (surfArea_Moon - Last_Total_Hole_Area) * density_crust
+
+    Mass_remaining_liquid = fractionLiquid * MO_volume_initial * density_MO
+
+    Mass_final_MO_crystallized = Mass_solid_interior_added + Mass_crust_in_holes + Mass_crust_nonImpacted + Mass_remaining_liquid
+
+    percSurfwithHoles = (Last_Total_Hole_Area / surfArea_Moon) * 100
+
+
+    # Always record the last increment of the run
+    for recorder in (seriesRecorder, holeRecorder, impactedCrustRecorder):
+        recorder.Finish()
+
+    # Views of the recorded time series (no copies), or if they were streamed write the rest of them and finish the output files
+    if outputWriter is None:
+        series = seriesRecorder.AsDict()
+        series.update(holeRecorder.AsDict())
+        series.update(impactedCrustRecorder.AsDict())
     else:
-        CrustalThickness_global = CrustalThickness
-        
-                
-    # Check to see if there are holes that have hole thickness about equal to the non-impacted surface crustal thickness
-    # If so, remove those holes from holeTracker
-    if CrustBuildOn == 0:
-            
-        # Keep only holes that have less quench than the global quench crust thickness
-        holeTracker = [item for item in holeTracker if item[1] < quenchThickness]
-                            
-    elif CrustBuildOn == 1:
-            
-        # Keep only holes that have less crust than the global non-impacted crustal thickness
-        holeTracker = [item for item in holeTracker if item[1] < CrustalThickness]
-            
-        
-    if holeTracker:
-        # Add total hole area to array
-        tempHolder = np.array(holeTracker)
-        
-        holeAreaTracker_array.append((sum(tempHolder[:,0]) / surfArea_Moon) * 100)
-        holeThicknessTracker_array.append(sum(tempHolder[:,1]) / len(tempHolder[:,1]))
-        holeTemperatureTracker_array.append(sum(tempHolder[:,2]) / len(tempHolder[:,2]))
-        
-        holeTrackerElements_array.append(len(tempHolder))
-        
-        # Add area of holes added during this timestep to array
-        holeAreaCreatedTracker_array.append(AreaHolesAdded_thisTimestep/(timeStep/3.154e7))
-        
-        # Cumulative hole area added to the Moon over time
-        totalHoleAreaCum += AreaHolesAdded_thisTimestep
-        totalHoleAreaCum_array.append((totalHoleAreaCum/surfArea_Moon)*100)
-        
-        Time_array_holes.append(ellapsedTime)
-                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                                            
-    # Add crustal thickness to array
-    CrustalThickness_array.append(CrustalThickness)
-                
-    # Add global crustal thickness to array
-    CrustalThickness_Global_array.append(CrustalThickness_global)
-        
-    # Add CMB temperature to array
-    CMB_Temperature_array.append(CMB_Temperature)
-                
-    # Add new CMB location to array
-    CMB_array.append(CMB)  
-        
-    # Add new liquid fraction to array
-    LiqFrac_array.append(fractionLiquid)
+        for recorder in (seriesRecorder, holeRecorder, impactedCrustRecorder):
+            recorder.Flush()
+        series = outputWriter.Close(OutputFormat != 'npz', OutputFormat != 'csv')
 
-    # Updated total mass added by impacts
-    CumMassAddedImpacts += MassImpactors_thisTimestep
+        # Series that never got a value (e.g. holes in a run without impacts) have no spool file
+        if series is not None:
+            for recorder in (seriesRecorder, holeRecorder, impactedCrustRecorder):
+                for name in recorder.names:
+                    series.setdefault(name, np.empty(0))
     
-    # Updated total energy added by impacts
-    CumEnergyAddedImpacts += KEefficiency * EnergyImpactors_thisTimestep
+    ellapsedTime_yrs = ellapsedTime/3.154e7
     
-    # Updated total energy added by general heating
-    CumGenHeatAdded += AdditionalHeating    
-        
-    # Updated total energy dumped
-    CumEnergyDumped += Energy2Dump
-        
-    # Updated ellapsed time
-    ellapsedTime += time2Dump
-            
-    # Store ellapsed time in array
-    Time_array.append(ellapsedTime)
-             
-#####################################################################################################################################################
-    
-    
-####### POST-PROCESSING #############################################################################################################################                   
-    
-# Mass bookkeeping
-Mass_solid_interior_added = density_MO * (4/3) * np.pi * (pow(CMB, 3) - pow(Radius_moon - MO_depth_initial, 3)) 
-    
-Mass_crust_in_holes = 0
-Last_Total_Hole_Area = 0
+    TimeStamp_end = datetime.datetime.now()
     
-# The way this is done, there will be some error since assuming all crust density is plagioclase density
-for valHoles in holeTracker:
-    Mass_crust_in_holes += valHoles[0] * valHoles[1] * density_crust
-    Last_Total_Hole_Area += valHoles[0]
+    scriptRunDuration = TimeStamp_end - TimeStamp_start
 
-Mass_crust_nonImpacted = CrustalThickness * (surfArea_Moon - Last_Total_Hole_Area) * density_crust
-    
-Mass_remaining_liquid = fractionLiquid * MO_volume_initial * density_MO
-    
-Mass_final_MO_crystallized = Mass_solid_interior_added + Mass_crust_in_holes + Mass_crust_nonImpacted + Mass_remaining_liquid
+    # Checkpoint is not needed once the run is over
+    if checkpointTimer is not None:
+        CP.RemoveCheckpoint(checkpointFile)
 
-percSurfwithHoles = (Last_Total_Hole_Area / surfArea_Moon) * 100
+    tempArray = np.array([RunNumber, iMagma_version, previousRunSeconds + scriptRunDuration.total_seconds(), vol_increments, timeStep_tol*100, ImpactsSwitch, QuenchSwitch, \
+                            GeneralHeatingSwitch, LargestImpactorSize, MoonLocationDebrisCalc, mass2area, MO_depth_initial, MO_depth_plagBuild, \
+                            plag_fraction, percMO_remain_end, Max_Quench_Thickness, density_MO, density_crust, density_quench, Heat_fusion_MO, \
+                            Heat_capacity_MO, Heat_capacity_crust, Heat_capacity_quench, therm_exp_coeff_MO, Diffusivity_MO, Diffusivity_crust, \
+                            Diffusivity_quench, dy_viscosity_MO, adiabslope, Temperature_melt, Temperature_equl, Emissivity, MO_mass_initial, \
+                            Mass_final_MO_crystallized, CumMassAddedImpacts, CumEnergyAddedImpacts, HeatingRate, CumGenHeatAdded, fractionLiquid*100, \
+                            crustBuildingStartTime_yrs, percSurfwithHoles, ellapsedTime_yrs, CrustalThickness_global], dtype=float)
+
+    return SimulationResult(params, series, tempArray, holeTracker, solverStats, outputWriter is not None)
 
-    
-plotTime = np.asarray(Time_array)
-plotLiqFrac = np.asarray(LiqFrac_array)
-plotCrustalThickness = np.asarray(CrustalThickness_array)
-plotCrustalThickness_impacted = np.asarray(CrustalThickness_Impacted_array)
-plotCrustalThickness_global = np.asarray(CrustalThickness_Global_array)
-plotCMB_Temperature = np.asarray(CMB_Temperature_array)
-plot_holeAreaTracker = np.asarray(holeAreaTracker_array)
-plot_holeThicknessTracker = np.asarray(holeThicknessTracker_array)
-plot_holeTemperatureTracker = np.asarray(holeTemperatureTracker_array)
-plot_holeAreaCreatedTracker = np.asarray(holeAreaCreatedTracker_array)
-plot_totalHoleAreaCum = np.asarray(totalHoleAreaCum_array)
-plot_holeTrackerElements = np.asarray(holeTrackerElements_array)
-plotTime_holes = np.asarray(Time_array_holes)
-plotTime_impactedCrust = np.asarray(Time_array_impactedCrust)
-
-# Write to a CSV file 
-Output_file = np.vstack((plotTime, plotLiqFrac))
-Output_file4 = np.vstack((plotTime, plotCMB_Temperature))
-Output_file7 = np.vstack((plotTime, plotCrustalThickness, plotCrustalThickness_global))
-Output_file8 = np.vstack((plotTime_holes, plot_holeAreaTracker, plot_holeThicknessTracker, plot_holeTemperatureTracker, \
-                            plot_holeAreaCreatedTracker, plot_totalHoleAreaCum, plot_holeTrackerElements))
-Output_file9 = np.vstack((plotTime_impactedCrust, plotCrustalThickness_impacted))
-
-if ImpactsSwitch == True and QuenchSwitch == True:
-    np.savetxt(UserPath + "wImpacts_wQuench.csv", Output_file, delimiter=",")
-    np.savetxt(UserPath + "wImpacts_wQuench_TemperatureCMB.csv", Output_file4, delimiter=",")
-    np.savetxt(UserPath + "wImpacts_wQuench_CrustalThickness.csv", Output_file7, delimiter=",")
-    np.savetxt(UserPath + "wImpacts_wQuench_HoleTracker.csv", Output_file8, delimiter=",")
-    np.savetxt(UserPath + "wImpacts_wQuench_impactedCrust.csv", Output_file9, delimiter=",")
-                    
-elif ImpactsSwitch == False and QuenchSwitch == True:
-    np.savetxt(UserPath + "noImpacts_wQuench.csv", Output_file, delimiter=",")
-    np.savetxt(UserPath + "noImpacts_wQuench_TemperatureCMB.csv", Output_file4, delimiter=",")
-    np.savetxt(UserPath + "noImpacts_wQuench_CrustalThickness.csv", Output_file7, delimiter=",")
-    
-elif ImpactsSwitch == False and QuenchSwitch == False:
-    np.savetxt(UserPath + "noImpacts_noQuench.csv", Output_file, delimiter=",")
-    np.savetxt(UserPath + "noImpacts_noQuench_TemperatureCMB.csv", Output_file4, delimiter=",")
-    np.savetxt(UserPath + "noImpacts_noQuench_CrustalThickness.csv", Output_file7, delimiter=",")
-    
 #####################################################################################################################################################
-    
-ellapsedTime_yrs = ellapsedTime/3.154e7
-    
-TimeStamp_end = datetime.datetime.now()
-    
-scriptRunDuration = TimeStamp_end - TimeStamp_start
-
-tempArray = np.array([RunNumber, iMagma_version, scriptRunDuration.total_seconds(), vol_increments, timeStep_tol*100, ImpactsSwitch, QuenchSwitch, \
-                        GeneralHeatingSwitch, LargestImpactorSize, MoonLocationDebrisCalc, mass2area, MO_depth_initial, MO_depth_plagBuild, \
-                        plag_fraction, percMO_remain_end, Max_Quench_Thickness, density_MO, density_crust, density_quench, Heat_fusion_MO, \
-                        Heat_capacity_MO, Heat_capacity_crust, Heat_capacity_quench, therm_exp_coeff_MO, Diffusivity_MO, Diffusivity_crust, \
-                        Diffusivity_quench, dy_viscosity_MO, adiabslope, Temperature_melt, Temperature_equl, Emissivity, MO_mass_initial, \
-                        Mass_final_MO_crystallized, CumMassAddedImpacts, CumEnergyAddedImpacts, HeatingRate, CumGenHeatAdded, fractionLiquid*100, \
-                        crustBuildingStartTime_yrs, percSurfwithHoles, ellapsedTime_yrs, CrustalThickness_global])
-                                                
-# Append output to the CSV file                                                                    
-with open(UserPath + 'scoreCard.csv', 'a') as f:
-    np.savetxt(f, tempArray.reshape(1, tempArray.shape[0]), delimiter=',', fmt='%.7e')
+
+
+####### OUTPUT FILES ################################################################################################################################
+
+# Write the time series of a run to UserPath as a result bundle and/or CSV files (OutputFormat option)
+def WriteOutputFiles(result, UserPath):
+
+    prefix = result.OutputPrefix()
+
+    if prefix is None:
+        return
+
+    OutputFormat = result.params.get('OutputFormat', OptionalParameterDefaults['OutputFormat'])
+
+    # CSV files of a streamed run were already written by run_simulation
+    if OutputFormat in ('csv', 'both') and not result.streamed:
+        for suffix, Output_array in result.OutputArrays():
+            np.savetxt(UserPath + prefix + suffix, Output_array, delimiter=",")
+
+    if OutputFormat in ('npz', 'both'):
+        RB.WriteBundle(UserPath + prefix + RB.BundleSuffix, result.series, result.scoreCard, ScoreCardColumnNames, result.params, \
+                       iMagma_version, OutputFiles(result.params), result.holeTracker.AsArray(), result.stats)
+
+
+# Append the scorecard of a run to scoreCard.csv in UserPath
+def WriteScoreCard(result, UserPath):
+
+    with open(UserPath + 'scoreCard.csv', 'a') as f:
+        np.savetxt(f, result.scoreCard.reshape(1, result.scoreCard.shape[0]), delimiter=',', fmt='%.7e')
+
+#####################################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    InputParams = ReadInputFile('inputFile.csv')
+
+    Result = run_simulation(InputParams)
+
+    WriteOutputFiles(Result, InputParams['UserPath'])
+    WriteScoreCard(Result, InputParams['UserPath'])
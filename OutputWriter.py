@@ -0,0 +1,194 @@
+"""
+
+Streaming writer for the output files of a run (noImpacts_wQuench.csv, *_TemperatureCMB.csv, ...)
+
+The output files have one row per time series (e.g. ellapsed time and liquid fraction) and one column per recorded
+increment, so they can only be written once a run is over. To avoid holding all the series in memory until then (and
+losing everything if a long run dies late), the series are handed to this writer in chunks while the run goes on. A
+background thread formats each chunk and appends it as one line to a spool file per series in <prefix>.partial/, so
+the loop never waits on the disk. When the run is over the spool lines of each series are joined into the rows of
+the output files, which are then byte for byte the same as the files written by np.savetxt at the end of a run.
+
+The spool files of a run that did not finish can be read with ReadPartialOutput. A run resuming from a checkpoint (see
+Checkpoint.py) keeps the spool files, cut back to their sizes when the checkpoint was saved.
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import os
+import shutil
+import threading
+import queue
+
+# Format of each value in the output files (default format of np.savetxt)
+ValueFormat = '%.18e'
+
+
+# Directory with the spool files of the output files starting with prefix
+def SpoolDirectory(prefix):
+    return prefix + '.partial'
+
+
+class StreamingOutputWriter(object):
+
+    # prefix is the path of the output files without their suffix (e.g. UserPath + 'noImpacts_wQuench')
+    # outputFiles is a list of (suffix, names of the series in the rows of that file)
+    # spoolSizes (from Sync) continues the spool files of an earlier run from a checkpoint instead of starting new ones
+    def __init__(self, prefix, outputFiles, maxQueuedChunks=16, spoolSizes=None):
+
+        self.prefix = prefix
+        self.outputFiles = outputFiles
+        self.spoolDir = SpoolDirectory(prefix)
+
+        if spoolSizes is None:
+
+            # Spool files left by an earlier run with the same prefix are out of date
+            shutil.rmtree(self.spoolDir, ignore_errors=True)
+            os.makedirs(self.spoolDir)
+
+        else:
+
+            # Chunks written after the checkpoint was saved are written again by the resumed run
+            for fileName in os.listdir(self.spoolDir):
+                spoolName = os.path.join(self.spoolDir, fileName)
+                if fileName in spoolSizes:
+                    with open(spoolName, 'r+b') as f:
+                        f.truncate(spoolSizes[fileName])
+                else:
+                    os.remove(spoolName)
+
+        self._queue = queue.Queue(maxQueuedChunks)
+        self._files = {}                      # Open spool file of each series (only used by the background thread)
+        self._error = None                    # Exception raised in the background thread (raised again by Write and Close)
+        self._closed = False
+
+        self._thread = threading.Thread(target=self._Run, name='iMagma output writer')
+        self._thread.start()
+
+    # Queue a chunk of values of some series (block has one row per name); returns right away unless the queue is full
+    def Write(self, names, block):
+
+        if self._error is not None:
+            raise self._error
+
+        self._queue.put((names, block))
+
+    # Wait until every queued chunk is in the spool files; returns the sizes of the spool files (e.g. to save in a checkpoint)
+    def Sync(self):
+
+        self._queue.join()
+
+        if self._error is not None:
+            raise self._error
+
+        return dict((fileName, os.path.getsize(os.path.join(self.spoolDir, fileName))) for fileName in os.listdir(self.spoolDir))
+
+    # Write the queued chunks, join the spool files into the output files (if writeFiles) and remove the spool files
+    # Returns the series as a dictionary of arrays if readSeries (e.g. to also write them to a result bundle), otherwise None
+    def Close(self, writeFiles=True, readSeries=False):
+
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+        if self._error is not None:
+            raise self._error
+
+        series = ReadPartialOutput(self.prefix) if readSeries else None
+
+        for suffix, names in (self.outputFiles if writeFiles else []):
+
+            tempName = self.prefix + suffix + '.tmp'
+
+            with open(tempName, 'w') as out:
+                for name in names:
+                    self._WriteRow(out, name)
+
+            os.replace(tempName, self.prefix + suffix)
+
+        shutil.rmtree(self.spoolDir, ignore_errors=True)
+
+        return series
+
+    # Background thread: append each chunk to the spool files until Close is called
+    # (also stops once the main thread has died and the queue is empty, so that the chunks of a crashed run still reach the disk)
+    def _Run(self):
+
+        try:
+            while True:
+
+                try:
+                    item = self._queue.get(timeout=1.0)
+                except queue.Empty:
+                    if not threading.main_thread().is_alive():
+                        break
+                    continue
+
+                if item is None:
+                    break
+
+                names, block = item
+
+                try:
+                    for name, values in zip(names, block):
+                        f = self._SpoolFile(name)
+                        f.write(','.join(map(ValueFormat.__mod__, values.tolist())) + '\n')
+                        f.flush()
+                finally:
+                    self._queue.task_done()
+
+        except Exception as error:
+            self._error = error
+
+        finally:
+            for f in self._files.values():
+                f.close()
+
+    def _SpoolFile(self, name):
+
+        if name not in self._files:
+            self._files[name] = open(os.path.join(self.spoolDir, name + '.txt'), 'a')
+
+        return self._files[name]
+
+    # Write the row of one series (its spool lines joined by commas)
+    def _WriteRow(self, out, name):
+
+        spoolName = os.path.join(self.spoolDir, name + '.txt')
+
+        if os.path.isfile(spoolName):
+            with open(spoolName, 'r') as f:
+                for i, line in enumerate(f):
+                    if i != 0:
+                        out.write(',')
+                    out.write(line.rstrip('\n'))
+
+        out.write('\n')
+
+
+# Series written so far by a run that has not finished (or was killed), as a dictionary of arrays
+# Only complete chunks are read (series written together, e.g. the rows of _HoleTracker.csv, can differ by the last chunk if the run was killed)
+def ReadPartialOutput(prefix):
+
+    spoolDir = SpoolDirectory(prefix)
+    series = {}
+
+    for fileName in sorted(os.listdir(spoolDir)):
+
+        if not fileName.endswith('.txt'):
+            continue
+
+        chunks = []
+
+        with open(os.path.join(spoolDir, fileName), 'r') as f:
+            for line in f:
+                if line.endswith('\n'):
+                    chunks.append(np.array(line.split(','), dtype=float))
+
+        series[fileName[:-len('.txt')]] = np.concatenate(chunks) if chunks else np.empty(0)
+
+    return series
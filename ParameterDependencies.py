@@ -0,0 +1,107 @@
+"""
+
+Which input parameters of a run are dead (do not change the run) under its switch settings, and the effective parameter
+set of a run with the dead parameters left out
+
+    - with ImpactsSwitch False there are no holes or impactors, so the impacts parameters (mass2area, ImpactsFile,
+      LargestImpactorSize, MoonLocationDebrisCalc, KineticEnergySwitch, KEefficiency, plag_holeFill_vs_gblCrust) are not used
+    - with GeneralHeatingSwitch False no heat is added, so HeatingRate is not used
+    - with QuenchSwitch False (and no impacts, whose holes fill with quench crust) the quench constants are not used
+
+A parameter sweep multiplies the number of runs by every array of ParameterSearchHEAD.py, including those of dead
+parameters, so many of its runs are the same run. SweepExecutor runs each distinct effective parameter set once and gives
+its scorecard to every equivalent run, with the run number and dead parameter columns of that run (EquivalentScoreCard),
+so GrandScoreCard.csv still has one row per requested run.
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import json
+
+import MAIN
+import ResultBundle as RB
+
+# Parameters that do not change a run, and the switch settings under which they do not
+DeadParameterRules = [(('mass2area', 'ImpactsFile', 'LargestImpactorSize', 'MoonLocationDebrisCalc', 'KineticEnergySwitch', 'KEefficiency', \
+                        'plag_holeFill_vs_gblCrust'), lambda params: params['ImpactsSwitch'] == False), \
+                      (('HeatingRate',), lambda params: params['GeneralHeatingSwitch'] == False), \
+                      (('Temperature_melt', 'Diffusivity_quench', 'density_quench', 'Heat_capacity_quench', 'Max_Quench_Thickness'), \
+                       lambda params: params['QuenchSwitch'] == False and params['ImpactsSwitch'] == False)]
+
+# Parameters that name a run rather than set it
+RunIdentityParameters = ('homePath', 'UserPath', 'RunNumber')
+
+
+# Names of the input parameters that do not change a run
+def DeadParameters(params):
+
+    dead = set()
+
+    for names, isDead in DeadParameterRules:
+        if isDead(params):
+            dead.update(names)
+
+    return dead
+
+
+# Input parameters and optional settings (filled in with their defaults) that change a run
+def EffectiveParameters(params):
+
+    dead = DeadParameters(params)
+    effective = {}
+
+    for name, convert in MAIN.InputParameterNames:
+
+        if name in dead or name in RunIdentityParameters:
+            continue
+
+        value = params[name]
+        effective[name] = convert(value) if isinstance(value, str) or convert in (float, int, str) else bool(value)
+
+    for name, default in MAIN.OptionalParameterDefaults.items():
+        effective[name] = params.get(name, default)
+
+    return effective
+
+
+# Key of the effective parameter set of a run (runs with the same key are the same run)
+def EffectiveKey(params):
+    return json.dumps(EffectiveParameters(params), default=RB.JSONValue, sort_keys=True)
+
+
+# Scorecard of a run from the scorecard of an equivalent run: the run number and the columns of the dead parameters are
+# those of the run (as if it had been run itself)
+def EquivalentScoreCard(scoreCard, params):
+
+    scoreCard = scoreCard.copy()
+    scoreCard[0] = params.get('RunNumber', 0)
+
+    dead = DeadParameters(params)
+
+    for column, name in MAIN.ScoreCardInputColumns:
+        if name in dead:
+            scoreCard[MAIN.ScoreCardColumnNames.index(column)] = float(params[name])
+
+    return scoreCard
+
+
+# Group runs by their effective parameter set: list of (index of the run that is done, indices of the equivalent runs)
+# in the order of the first run of each group
+def EquivalentRuns(jobs):
+
+    groups = {}
+    order = []
+
+    for idx, params in enumerate(jobs):
+
+        key = EffectiveKey(params)
+
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+
+        groups[key].append(idx)
+
+    return [(groups[key][0], groups[key][1:]) for key in order]
@@ -15,7 +15,13 @@ from __future__ import division
 import numpy as np
 import os
 import csv
-import subprocess
+import itertools
+
+import MAIN
+import SweepExecutor as SE
+import SweepSpec as SS
+import ResultCache as RC
+import ResultsIndex as RI
 
 ################################################################################################################
 
@@ -24,11 +30,25 @@ QuenchSwitch = True            # Set True to allow quench crust to form and Fals
 KineticEnergySwitch = False     # Set True to add kinetic energy imparted by re-impacts and False to turn it off
 GeneralHeatingSwitch = False   # Set True to allow additional heating of the magma ocean and False to turn it off
 useDefaults = False            # 'True' to use default values & 'False' to use parameter search
+MaxWorkers = None              # Number of runs at the same time (None uses all available cores)
+SweepSpecFile = None           # Sweep spec file in this directory (e.g. 'mySweep.json', see SweepSpec.py) to use instead of the parameter search below
+ResultCacheDir = None          # Directory of the result cache shared by all sweeps (e.g. RC.DefaultCacheDirectory, see ResultCache.py) or None for no cache
+ResultsIndexFile = None        # SQLite results index to add the finished runs to (e.g. RI.DefaultIndexFile, see ResultsIndex.py) or None
 
 UserPath = os.getcwd() + '/'   # Define path
 
 ################################################################################################################
 
+
+# Executor of the sweep (with the result cache and results index set above)
+def SweepExecutor():
+
+    cache = RC.ResultCache(ResultCacheDir) if ResultCacheDir is not None else None
+    index = RI.ResultsIndex(ResultsIndexFile) if ResultsIndexFile is not None else None
+
+    return SE.SweepExecutor(MaxWorkers, cache=cache, index=index)
+
+
 if useDefaults == True:
 
     ############### DEFAULTS ###################################################################################
@@ -96,19 +116,31 @@ if useDefaults == True:
                                     percMO_remain_end, plag_holeFill_vs_gblCrust, ImpactsFile, RunNumber, LargestImpactorSize, MoonLocationDebrisCalc, HeatingRate, KineticEnergySwitch, \
                                     KEefficiency, plag_fraction])
     
-    os.mkdir(UserPath + str(RunNumber))
+    if not os.path.isdir(workingPath):
+        os.mkdir(workingPath)
                                                                                                                                         
-    # Write input file for MAIN.py as a CSV file                                                                    
+    # Write input file for MAIN.py as a CSV file (kept as a record of the run)
     with open(workingPath + 'inputFile.csv', 'w') as f:
         inputCSV = csv.writer(f, delimiter=',')
         inputCSV.writerow(necessaryInputs)
-                                                                        
-    os.chdir(workingPath)
-    os.system('python ' + UserPath + 'MAIN.py')
-    os.chdir(UserPath)
+
+    jobResult = SE.RunJob(MAIN.ReadInputFile(workingPath + 'inputFile.csv'))
+
+    if jobResult.status != 0:
+        print('Error in Run %s: %s' % (jobResult.runNumber, jobResult.error))
 
                 
 
+elif SweepSpecFile is not None:
+
+    ############### SWEEP SPEC ########################################################################
+
+    jobs = SS.SweepJobs(SS.LoadSweepSpec(UserPath + SweepSpecFile), UserPath)
+
+    if __name__ == '__main__':
+        SweepExecutor().Run(jobs, UserPath)
+
+
 elif useDefaults == False:
     
     ############### PARAMETER SEARCH ##################################################################
@@ -173,59 +205,32 @@ elif useDefaults == False:
     vol_increments_array = np.array([150000])
     
     
-    for adiabslope in adiabslope_array:
-        for MO_depth_initial in MO_depth_initial_array:
-            for MO_depth_plagBuild in MO_depth_plagBuild_array:
-                for Heat_fusion_MO in Heat_fusion_MO_array:
-                    for Heat_capacity_MO in Heat_capacity_MO_array:
-                        for dy_viscosity_MO in dy_viscosity_MO_array:
-                            for Temperature_equl in Temperature_equl_array:
-                                for Diffusivity_crust in Diffusivity_crust_array:
-                                    for Heat_capacity_crust in Heat_capacity_crust_array:
-                                        for Max_Quench_Thickness in Max_Quench_Thickness_array:
-                                            for Heat_capacity_quench in Heat_capacity_quench_array:
-                                                for Temperature_melt in Temperature_melt_array:
-                                                    for Emissivity in Emissivity_array:
-                                                        for mass2area in mass2area_array:
-                                                            for HeatingRate in HeatingRate_array:
-                                                                for vol_increments in vol_increments_array:
-                                                                    for ImpactsSwitch in ImpactsSwitch_array:
-                                                                        for KEefficiency in KEefficiency_array:
-                                            
-                                                                            try:
-                                                                    
-                                                                                workingPath = UserPath + str(RunNumber) + '/'
-                                                                   
-                                                                                necessaryInputs = np.array([UserPath, workingPath, ImpactsSwitch, QuenchSwitch, GeneralHeatingSwitch, adiabslope, \
-                                                                                                MO_depth_initial, MO_depth_plagBuild, density_MO, Heat_fusion_MO, Heat_capacity_MO, \
-                                                                                                therm_exp_coeff_MO, Diffusivity_MO, dy_viscosity_MO, Temperature_equl, Diffusivity_crust, \
-                                                                                                density_crust, Heat_capacity_crust, Emissivity, mass2area, acc_grav, Temperature_melt, \
-                                                                                                Diffusivity_quench, density_quench, Heat_capacity_quench, Max_Quench_Thickness, \
-                                                                                                vol_increments, percMO_remain_end, plag_holeFill_vs_gblCrust, ImpactsFile, RunNumber, \
-                                                                                                LargestImpactorSize, MoonLocationDebrisCalc, HeatingRate, KineticEnergySwitch, KEefficiency, \
-                                                                                                plag_fraction])
-                                                                    
-                                                                                os.mkdir(UserPath + str(RunNumber))
-                                                                
-                                                                                # Write input file for MAIN.py as a CSV file                                                                    
-                                                                                with open(workingPath + 'inputFile.csv', 'w') as f:
-                                                                                    inputCSV = csv.writer(f, delimiter=',')
-                                                                                    inputCSV.writerow(necessaryInputs)
-                                                                    
-                                                                                os.chdir(workingPath)
-                                                                   
-                                                                                subprocess.Popen('python ' + UserPath + 'MAIN.py', shell=True)
-                                                                    
-                                                                                os.chdir(UserPath)
-                                                                                                             
-                                                                                RunNumber += 1
-                                                                                                      
-                                                                            # If an error occurs, note it in the output file and move on with the rest of the iterations
-                                                                            except Exception as e:
-                                                                    
-                                                                                with open(UserPath + str(RunNumber) + '/' + 'errorFile.csv', 'w') as f:
-                                                                                        np.savetxt(f, str(e))
-                                                                                                                                                               
-                                                                                RunNumber += 1
-                                                
-                                                                                continue
+    # Every combination of the varied parameters (last array varies fastest, same order as nested loops over the arrays)
+    jobs = []
+
+    for (adiabslope, MO_depth_initial, MO_depth_plagBuild, Heat_fusion_MO, Heat_capacity_MO, dy_viscosity_MO, Temperature_equl, Diffusivity_crust, \
+         Heat_capacity_crust, Max_Quench_Thickness, Heat_capacity_quench, Temperature_melt, Emissivity, mass2area, HeatingRate, vol_increments, \
+         ImpactsSwitch, KEefficiency) in itertools.product(adiabslope_array, MO_depth_initial_array, MO_depth_plagBuild_array, Heat_fusion_MO_array, \
+                                                           Heat_capacity_MO_array, dy_viscosity_MO_array, Temperature_equl_array, Diffusivity_crust_array, \
+                                                           Heat_capacity_crust_array, Max_Quench_Thickness_array, Heat_capacity_quench_array, \
+                                                           Temperature_melt_array, Emissivity_array, mass2area_array, HeatingRate_array, \
+                                                           vol_increments_array, ImpactsSwitch_array, KEefficiency_array):
+
+        workingPath = UserPath + str(RunNumber) + '/'
+
+        necessaryInputs = [UserPath, workingPath, ImpactsSwitch, QuenchSwitch, GeneralHeatingSwitch, adiabslope, MO_depth_initial, MO_depth_plagBuild, \
+                           density_MO, Heat_fusion_MO, Heat_capacity_MO, therm_exp_coeff_MO, Diffusivity_MO, dy_viscosity_MO, Temperature_equl, \
+                           Diffusivity_crust, density_crust, Heat_capacity_crust, Emissivity, mass2area, acc_grav, Temperature_melt, Diffusivity_quench, \
+                           density_quench, Heat_capacity_quench, Max_Quench_Thickness, vol_increments, percMO_remain_end, plag_holeFill_vs_gblCrust, \
+                           ImpactsFile, RunNumber, LargestImpactorSize, MoonLocationDebrisCalc, HeatingRate, KineticEnergySwitch, KEefficiency, \
+                           plag_fraction]
+
+        # Parameters are handed to the runs in memory (no inputFile.csv)
+        jobs.append(MAIN.InputParameters(necessaryInputs))
+
+        RunNumber += 1
+
+    # Run the combinations on a bounded pool of worker processes (failed runs write errorFile.csv in their directory and are listed in SweepLog.csv)
+    # Worker processes may import this script again, which must not start another sweep
+    if __name__ == '__main__':
+        SweepExecutor().Run(jobs, UserPath)
@@ -20,29 +20,8 @@ from __future__ import division
 def QuenchCrust(CMB_Temperature, Temperature_top_MO, current_MO_depth, Heat_capacity_MO, Heat_fusion_MO, density_MO, Diffusivity_MO, Ra_number, \
                 Emissivity, SB, Temperature_equl, Diffusivity_quench, density_quench, Heat_capacity_quench, Temperature_melt, Max_Quench_Thickness, timeStep):
 
-    # Calculate the conductive heat flux of the magma ocean
-    cond_flux_MO = Diffusivity_MO * density_MO * Heat_capacity_MO * (CMB_Temperature - Temperature_melt) / current_MO_depth
-    
-    if cond_flux_MO < 0:
-        print('CMB_Temperature: ', CMB_Temperature)
-        print('Temperature_melt: ', Temperature_melt)
-        print('current_MO_depth: ', current_MO_depth)
-    
-    # Calculate Nusselt number [from Niemela et al 2000] 
-    Nu = 0.124 * pow(Ra_number, 0.309)    
-    
-    # Calculate the convective heat flux of the magma ocean
-    convec_flux_MO = Nu * cond_flux_MO
-    
-    # Calculate temperature at the top of quench crust
-    EqulTemperature_top_quench = pow((convec_flux_MO/(Emissivity * SB)) + pow(Temperature_equl, 4), (1/4))
-    
-    # Calculate quench crust thickness
-    EqulQuenchThickness = Diffusivity_quench * density_quench * Heat_capacity_quench * (Temperature_melt - EqulTemperature_top_quench) / convec_flux_MO
-    
-    # Very thick quench crust will sink (e.g. Hawaiian and Io lava) so we need to cap it at some reasonable thickness
-    if EqulQuenchThickness > Max_Quench_Thickness:
-        EqulQuenchThickness = Max_Quench_Thickness
+    EqulQuenchThickness = QuenchCrustEquilibrium(CMB_Temperature, current_MO_depth, Heat_capacity_MO, density_MO, Diffusivity_MO, Ra_number, Emissivity, SB, \
+                                                 Temperature_equl, Diffusivity_quench, density_quench, Heat_capacity_quench, Temperature_melt, Max_Quench_Thickness)[4]
     
     ## How long does it take for quenchThickness of crust to form?
     #def f(lambda_1):
@@ -66,3 +45,35 @@ def QuenchCrust(CMB_Temperature, Temperature_top_MO, current_MO_depth, Heat_capa
     #    PresentQuenchThickness = Max_Quench_Thickness
                                                                                                 
     return EqulQuenchThickness
+
+
+# Equilibrium quench crust quantities, which only depend on the state of the magma ocean (not on the timestep)
+# Returns conductive flux, Nusselt number, convective flux, temperature at the top of quench crust and quench crust thickness
+def QuenchCrustEquilibrium(CMB_Temperature, current_MO_depth, Heat_capacity_MO, density_MO, Diffusivity_MO, Ra_number, Emissivity, SB, Temperature_equl, \
+                           Diffusivity_quench, density_quench, Heat_capacity_quench, Temperature_melt, Max_Quench_Thickness):
+
+    # Calculate the conductive heat flux of the magma ocean
+    cond_flux_MO = Diffusivity_MO * density_MO * Heat_capacity_MO * (CMB_Temperature - Temperature_melt) / current_MO_depth
+    
+    if cond_flux_MO < 0:
+        print('CMB_Temperature: ', CMB_Temperature)
+        print('Temperature_melt: ', Temperature_melt)
+        print('current_MO_depth: ', current_MO_depth)
+    
+    # Calculate Nusselt number [from Niemela et al 2000] 
+    Nu = 0.124 * pow(Ra_number, 0.309)    
+    
+    # Calculate the convective heat flux of the magma ocean
+    convec_flux_MO = Nu * cond_flux_MO
+    
+    # Calculate temperature at the top of quench crust
+    EqulTemperature_top_quench = pow((convec_flux_MO/(Emissivity * SB)) + pow(Temperature_equl, 4), (1/4))
+    
+    # Calculate quench crust thickness
+    EqulQuenchThickness = Diffusivity_quench * density_quench * Heat_capacity_quench * (Temperature_melt - EqulTemperature_top_quench) / convec_flux_MO
+    
+    # Very thick quench crust will sink (e.g. Hawaiian and Io lava) so we need to cap it at some reasonable thickness
+    if EqulQuenchThickness > Max_Quench_Thickness:
+        EqulQuenchThickness = Max_Quench_Thickness
+
+    return cond_flux_MO, Nu, convec_flux_MO, EqulTemperature_top_quench, EqulQuenchThickness
@@ -0,0 +1,104 @@
+"""
+
+Policies that decide which increments of a run are recorded in the time series (and so written to the output files)
+
+By default every volume increment is recorded, so the output files have vol_increments columns even though the plots
+only need a few hundred points on log-time axes. The other policies keep
+    'stride':  every Nth increment
+    'logtime': about a fixed number of increments per decade of ellapsed time
+    'change':  an increment only when a watched quantity has changed by more than a relative threshold since the last
+               increment that was kept
+The first increment offered to a recorder is always kept. SeriesRecorder.Record also keeps increments that are forced
+(regime transitions such as the start of plag crust building or the first impact) and the last increment of the run.
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+
+# Keep every increment (original behaviour)
+class RecordAll(object):
+
+    # Whether to keep an increment at ellapsed time time with watched values values (called once per increment)
+    def Keep(self, time, values):
+        return True
+
+    # Called after an increment was kept (also when it was forced)
+    def Kept(self, time, values):
+        pass
+
+
+# Keep every stride-th increment
+class RecordStride(RecordAll):
+
+    def __init__(self, stride):
+
+        self.stride = max(int(stride), 1)
+        self.count = 0                         # Number of increments offered since the last one kept
+
+    def Keep(self, time, values):
+
+        self.count += 1
+        return self.count >= self.stride
+
+    def Kept(self, time, values):
+        self.count = 0
+
+
+# Keep about pointsPerDecade increments per decade of ellapsed time
+class RecordLogTime(RecordAll):
+
+    def __init__(self, pointsPerDecade):
+
+        self.factor = pow(10, 1 / pointsPerDecade)     # Ratio between the times of consecutive increments kept
+        self.nextTime = None                           # Next time to keep an increment at (None until the first one is kept)
+
+    def Keep(self, time, values):
+        return self.nextTime is None or time >= self.nextTime
+
+    def Kept(self, time, values):
+
+        if time > 0:
+            self.nextTime = time * self.factor
+
+
+# Keep an increment when any watched value has changed by more than threshold (relative) since the last increment kept
+class RecordChange(RecordAll):
+
+    def __init__(self, threshold):
+
+        self.threshold = threshold
+        self.lastValues = None                 # Watched values of the last increment kept
+
+    def Keep(self, time, values):
+
+        if self.lastValues is None:
+            return True
+
+        scale = np.maximum(np.abs(values), np.abs(self.lastValues))
+        change = np.abs(values - self.lastValues)
+
+        return np.any(change > self.threshold * scale)
+
+    def Kept(self, time, values):
+        self.lastValues = values
+
+
+# Policy for the RecordPolicy option of run_simulation ('all', 'stride', 'logtime' or 'change')
+def MakeRecordingPolicy(name, stride=10, pointsPerDecade=50, threshold=0.01):
+
+    if name == 'all':
+        return RecordAll()
+
+    elif name == 'stride':
+        return RecordStride(stride)
+
+    elif name == 'logtime':
+        return RecordLogTime(pointsPerDecade)
+
+    elif name == 'change':
+        return RecordChange(threshold)
+
+    raise ValueError('Unknown recording policy: %s' % name)
@@ -0,0 +1,165 @@
+"""
+
+Binary result bundle of a run (one compressed .npz file per run, e.g. noImpacts_wQuench.npz)
+
+The bundle holds every time series of the run as a named float64 array (the names are the keys of the series of
+MAIN.run_simulation, e.g. Time, LiqFrac, CrustalThickness_global), the scorecard, the holes left at the end of the run
+and a metadata header (JSON) with the input parameters, the iMagma version, the scorecard column names and the layout
+of the CSV output files. Reading a bundle back is a binary load of only the arrays that are asked for, instead of
+parsing multi-megabyte text files with np.genfromtxt. The CSV output files can still be written from a bundle with
+ExportCSV, or from the command line with
+
+    python ResultBundle.py noImpacts_wQuench.npz
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import os
+import sys
+import json
+
+BundleSuffix = '.npz'                 # File name of a bundle is the prefix of the output files + BundleSuffix
+MetadataKey = '_metadata'             # Key of the metadata header in the .npz file
+ScoreCardKey = '_scoreCard'           # Key of the scorecard in the .npz file
+FinalHolesKey = '_finalHoles'         # Key of the holes remaining at the end of the run ([area, thickness, temperature] of each hole)
+
+
+# JSON value of a parameter that json cannot write itself (e.g. NumPy floats from a parameter sweep)
+def JSONValue(value):
+
+    if hasattr(value, 'item'):
+        return value.item()
+
+    return str(value)
+
+
+# Write the bundle of a run (written to a temporary file and renamed, so a bundle is never left half written)
+# outputFiles is the layout of the CSV output files (list of (suffix, names of the series in the rows of that file))
+def WriteBundle(fileName, series, scoreCard, scoreCardNames, params, version, outputFiles, finalHoles=None, stats=None):
+
+    metadata = {'iMagmaVersion': version, 'params': params, 'scoreCardColumns': list(scoreCardNames), \
+                'outputFiles': [[suffix, list(names)] for suffix, names in outputFiles], 'stats': stats or {}}
+
+    arrays = dict((name, np.asarray(values, dtype=float)) for name, values in series.items())
+    arrays[ScoreCardKey] = np.asarray(scoreCard, dtype=float)
+    arrays[FinalHolesKey] = np.empty((0, 3)) if finalHoles is None else np.asarray(finalHoles, dtype=float)
+    arrays[MetadataKey] = np.array(json.dumps(metadata, default=JSONValue))
+
+    tempName = '%s.%d.tmp' % (fileName, os.getpid())
+
+    try:
+        with open(tempName, 'wb') as f:
+            np.savez_compressed(f, **arrays)
+        os.replace(tempName, fileName)
+    except BaseException:
+        if os.path.exists(tempName):
+            os.remove(tempName)
+        raise
+
+
+class ResultBundle(object):
+
+    def __init__(self, fileName):
+
+        self.fileName = fileName
+        self._npz = np.load(fileName)
+        self.metadata = json.loads(str(self._npz[MetadataKey]))
+
+        self.params = self.metadata['params']                     # Input parameters of the run
+        self.version = self.metadata['iMagmaVersion']             # Version of iMagma that made the bundle
+        self.stats = self.metadata['stats']                       # Solver statistics of the run
+
+    # Names of the time series in the bundle
+    @property
+    def names(self):
+        return [name for name in self._npz.files if not name.startswith('_')]
+
+    def __contains__(self, name):
+        return name in self.names
+
+    # One time series (only that array is read from the file)
+    def __getitem__(self, name):
+
+        if name not in self:
+            raise KeyError(name)
+
+        return self._npz[name]
+
+    # Dictionary of time series (all of them if names is not given)
+    def Series(self, names=None):
+        return dict((name, self[name]) for name in (names if names is not None else self.names))
+
+    @property
+    def scoreCard(self):
+        return self._npz[ScoreCardKey]
+
+    @property
+    def finalHoles(self):
+        return self._npz[FinalHolesKey]
+
+    # Scorecard as a dictionary keyed by the column names
+    def ScoreCardDict(self):
+        return dict(zip(self.metadata['scoreCardColumns'], self.scoreCard))
+
+    # Array of one CSV output file (same rows as the file, e.g. for '_CrustalThickness.csv' time, crust and global crust thickness)
+    def OutputArray(self, suffix):
+
+        for fileSuffix, names in self.metadata['outputFiles']:
+            if fileSuffix == suffix:
+                return np.vstack([self[name] for name in names])
+
+        raise KeyError(suffix)
+
+    # Write the CSV output files of the run (same files as MAIN.py writes with OutputFormat 'csv')
+    def ExportCSV(self, prefix):
+
+        for suffix, names in self.metadata['outputFiles']:
+            np.savetxt(prefix + suffix, self.OutputArray(suffix), delimiter=",")
+
+    def Close(self):
+        self._npz.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
+
+
+# Read the bundle of a run
+def ReadResult(fileName):
+    return ResultBundle(fileName)
+
+
+# Array of a CSV output file (e.g. .../noImpacts_wQuench_CrustalThickness.csv), read from the bundle of the run if there is one,
+# otherwise from the CSV file itself (so post-processing works for runs with either output format)
+def LoadOutputFile(csvFileName):
+
+    stem = csvFileName[:-len('.csv')] if csvFileName.endswith('.csv') else csvFileName
+
+    # Bundle prefix is the start of the file name (e.g. noImpacts_wQuench for noImpacts_wQuench_CrustalThickness.csv)
+    parts = stem.split('_')
+
+    for count in range(len(parts), 0, -1):
+
+        prefix = '_'.join(parts[:count])
+        suffix = csvFileName[len(prefix):]
+
+        if os.path.isfile(prefix + BundleSuffix):
+            with ResultBundle(prefix + BundleSuffix) as bundle:
+                try:
+                    return bundle.OutputArray(suffix)
+                except KeyError:
+                    pass
+
+    return np.genfromtxt(csvFileName, delimiter=',')
+
+
+if __name__ == '__main__':
+
+    for bundleFileName in sys.argv[1:]:
+        with ResultBundle(bundleFileName) as bundle:
+            bundle.ExportCSV(bundleFileName[:-len(BundleSuffix)])
@@ -0,0 +1,264 @@
+"""
+
+Content-addressed cache of run results shared by every sweep on a machine, so a parameter set that was already run
+(e.g. the same baseline run in Converge/, ParaSearch/ and wHeating/) is copied from the cache instead of run again
+
+Each run is keyed by the SHA-256 hash of its canonical input parameters (every input parameter and optional run setting
+that changes the results, leaving out the parameters its switches make dead, numbers converted as in
+MAIN.InputParameterNames and optional settings filled in with their defaults), the iMagma version and the content hash
+of the impacts table (ImpactTables.ImpactTableHash, only for runs with impacts). The run directory, run number, impacts
+file name and output-only settings (output format, streaming and checkpoints) are not part of the key. An entry is a
+directory named by the key holding the output files of the run and its scoreCard.csv (written last, so an entry without
+one is incomplete). Files are written to a temporary name and renamed, so sweep workers can share the cache.
+
+A hit copies the output files to the UserPath of the run and writes its scoreCard.csv with the run number and dead
+parameters of the run (result bundles keep the parameters of the run that made them). CSV output files are exported
+from the bundle of an entry if the run asks for them and the entry only has the bundle. The cache is kept below maxBytes
+by removing the least recently used entries down to EvictFraction of maxBytes (the mtime of scoreCard.csv of an entry
+is updated on every hit). The entries are only all scanned when the total size (size at the last scan, in
+CacheSize.txt, plus the sizes of the entries added since, in CacheAdded.txt) passes maxBytes, or once every
+ScanInterval stores, so storing a run does not stat every entry of a big cache. Used by SweepExecutor, e.g.
+
+    import ResultCache as RC
+    SE.SweepExecutor(maxWorkers=8, cache=RC.ResultCache()).Run(jobs, UserPath)
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+
+import MAIN
+import ImpactTables as IT
+import ResultBundle as RB
+import ParameterDependencies as PD
+
+DefaultCacheDirectory = os.path.join(os.path.expanduser('~'), '.iMagmaCache', 'results')
+SizeFileName = 'CacheSize.txt'        # Total size of the entries at the last scan (bytes)
+AddedFileName = 'CacheAdded.txt'      # Size of each entry added since the last scan (bytes, one line per entry)
+ScanInterval = 1000                   # Largest number of stores between scans
+EvictFraction = 0.9                   # A cache bigger than maxBytes is cut to this fraction of maxBytes (so the next stores do not scan it again)
+
+# Input parameters and optional settings that do not change the results of a run
+KeyExcludedParameters = ('homePath', 'UserPath', 'RunNumber', 'ImpactsFile', 'OutputFormat', 'StreamOutput', 'StreamChunkSize', \
+                         'CheckpointInterval', 'CheckpointWallTime', 'CheckpointFile', 'RestartFromCheckpoint')
+
+
+# Canonical input parameters of a run (the part of the key that comes from params; parameters that are dead under the switches
+# of the run are left out, see ParameterDependencies.py)
+def CanonicalParameters(params):
+
+    canonical = {}
+    dead = PD.DeadParameters(params)
+
+    for name, convert in MAIN.InputParameterNames:
+
+        if name in KeyExcludedParameters or name in dead:
+            continue
+
+        value = params[name]
+
+        if convert in (float, int):
+            canonical[name] = convert(value)
+        elif isinstance(value, str):
+            canonical[name] = convert(value)
+        else:
+            canonical[name] = bool(value)
+
+    for name, default in MAIN.OptionalParameterDefaults.items():
+        if name not in KeyExcludedParameters:
+            canonical[name] = params.get(name, default)
+
+    return canonical
+
+
+# Key of a run in the cache (hex SHA-256)
+def RunKey(params, canonical=None):
+
+    canonical = canonical if canonical is not None else CanonicalParameters(params)
+    tableHash = IT.ImpactTableHash(params['homePath'] + params['ImpactsFile']) if canonical['ImpactsSwitch'] == True else None
+
+    content = json.dumps({'params': canonical, 'iMagmaVersion': MAIN.iMagma_version, 'impactTable': tableHash}, \
+                         default=RB.JSONValue, sort_keys=True)
+
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+# Copy a file in one step (copy to a temporary file and rename) so other processes never see a partial file
+def _AtomicCopy(source, destination):
+
+    handle, tempName = tempfile.mkstemp(dir=os.path.dirname(destination), suffix='.tmp')
+    os.close(handle)
+
+    try:
+        shutil.copyfile(source, tempName)
+        os.replace(tempName, destination)
+    except BaseException:
+        if os.path.exists(tempName):
+            os.remove(tempName)
+        raise
+
+
+class ResultCache(object):
+
+    def __init__(self, directory=None, maxBytes=10 * 1024**3):
+
+        self.directory = directory if directory is not None else DefaultCacheDirectory      # Directory holding the entries
+        self.maxBytes = maxBytes                                                             # Largest total size of the entries (bytes)
+
+    def _EntryPath(self, key):
+        return os.path.join(self.directory, key)
+
+    # Output files a run writes with its OutputFormat (file names without the UserPath)
+    @staticmethod
+    def _OutputFileNames(params):
+
+        prefix = MAIN.OutputPrefix(params)
+
+        if prefix is None:
+            return [], []
+
+        OutputFormat = params.get('OutputFormat', MAIN.OptionalParameterDefaults['OutputFormat'])
+
+        csvFiles = [prefix + suffix for suffix, names in MAIN.OutputFiles(params)] if OutputFormat in ('csv', 'both') else []
+        bundleFiles = [prefix + RB.BundleSuffix] if OutputFormat in ('npz', 'both') else []
+
+        return csvFiles, bundleFiles
+
+    # Copy the results of a run from the cache to its UserPath and return its scorecard (with the run number and dead parameters of the run),
+    # or None if the cache has no complete entry for the run
+    def Fetch(self, params):
+
+        entry = self._EntryPath(RunKey(params))
+        userPath = params['UserPath']
+
+        if not os.path.isfile(os.path.join(entry, 'scoreCard.csv')):
+            return None
+
+        csvFiles, bundleFiles = self._OutputFileNames(params)
+        prefix = MAIN.OutputPrefix(params)
+        bundleName = os.path.join(entry, prefix + RB.BundleSuffix) if prefix is not None else None
+
+        missing = [fileName for fileName in bundleFiles + csvFiles if not os.path.isfile(os.path.join(entry, fileName))]
+
+        # CSV files can be exported from the bundle, a bundle cannot be made from CSV files
+        if any(fileName in bundleFiles for fileName in missing) or (missing and not os.path.isfile(bundleName)):
+            return None
+
+        try:
+
+            if not os.path.isdir(userPath):
+                os.makedirs(userPath)
+
+            for fileName in bundleFiles + csvFiles:
+                if fileName not in missing:
+                    shutil.copyfile(os.path.join(entry, fileName), userPath + fileName)
+
+            if missing:
+                with RB.ReadResult(bundleName) as bundle:
+                    bundle.ExportCSV(userPath + prefix)
+
+            scoreCard = PD.EquivalentScoreCard(np.genfromtxt(os.path.join(entry, 'scoreCard.csv'), delimiter=','), params)
+
+            with open(userPath + 'scoreCard.csv', 'w') as f:
+                np.savetxt(f, scoreCard.reshape(1, scoreCard.shape[0]), delimiter=',', fmt='%.7e')
+
+            # Most recently used entry
+            os.utime(os.path.join(entry, 'scoreCard.csv'))
+
+        # Entry removed by another process while it was copied
+        except (IOError, OSError):
+            return None
+
+        return scoreCard
+
+    # Add the results a finished run wrote to its UserPath (files already in the entry are kept), then remove the least
+    # recently used entries if the cache is too big
+    def Store(self, params):
+
+        entry = self._EntryPath(RunKey(params))
+        userPath = params['UserPath']
+
+        if not os.path.isdir(entry):
+            os.makedirs(entry, exist_ok=True)
+
+        csvFiles, bundleFiles = self._OutputFileNames(params)
+        addedBytes = 0
+
+        for fileName in bundleFiles + csvFiles + ['scoreCard.csv']:
+            if os.path.isfile(userPath + fileName) and not os.path.isfile(os.path.join(entry, fileName)):
+                _AtomicCopy(userPath + fileName, os.path.join(entry, fileName))
+                addedBytes += os.path.getsize(os.path.join(entry, fileName))
+
+        if addedBytes > 0:
+            self._Added(addedBytes)
+
+    # Record the size of a stored entry, and scan the entries (Evict) if the total size may be more than maxBytes or
+    # ScanInterval entries were added since the last scan
+    def _Added(self, addedBytes):
+
+        with open(os.path.join(self.directory, AddedFileName), 'a') as f:
+            f.write('%d\n' % addedBytes)
+
+        try:
+            with open(os.path.join(self.directory, SizeFileName), 'r') as f:
+                scannedBytes = int(f.read())
+            with open(os.path.join(self.directory, AddedFileName), 'r') as f:
+                added = [int(line) for line in f if line.strip().isdigit()]
+        # No scan yet (or its size file was being replaced)
+        except (IOError, OSError, ValueError):
+            self.Evict()
+            return
+
+        if scannedBytes + sum(added) > self.maxBytes or len(added) >= ScanInterval:
+            self.Evict()
+
+    # Remove the least recently used entries of a cache bigger than maxBytes until it is no bigger than EvictFraction of maxBytes,
+    # and record its size
+    def Evict(self):
+
+        # Entries added while the entries are scanned are counted again by the next scan (so the total is never too small)
+        try:
+            os.remove(os.path.join(self.directory, AddedFileName))
+        except (IOError, OSError):
+            pass
+
+        entries = []
+        totalBytes = 0
+
+        for item in os.scandir(self.directory):
+
+            if not item.is_dir():
+                continue
+
+            try:
+                size = sum(f.stat().st_size for f in os.scandir(item.path) if f.is_file())
+                lastUsed = os.stat(os.path.join(item.path, 'scoreCard.csv')).st_mtime
+            except (IOError, OSError):
+                continue
+
+            entries.append((lastUsed, size, item.path))
+            totalBytes += size
+
+        targetBytes = self.maxBytes * EvictFraction if totalBytes > self.maxBytes else totalBytes
+
+        for lastUsed, size, path in sorted(entries):
+
+            if totalBytes <= targetBytes:
+                break
+
+            shutil.rmtree(path, ignore_errors=True)
+            totalBytes -= size
+
+        handle, tempName = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+
+        with os.fdopen(handle, 'w') as f:
+            f.write('%d' % totalBytes)
+
+        os.replace(tempName, os.path.join(self.directory, SizeFileName))
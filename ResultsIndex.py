@@ -0,0 +1,160 @@
+"""
+
+Local SQLite index of the results of every run of every sweep, so runs can be picked with an indexed query (e.g. all
+runs with impacts and mass2area = 1e6) instead of reading the GrandScoreCard.csv of many sweep directories and picking
+columns by position
+
+The index is one table (runs) with one row per run directory, so the same run done in two sweeps (e.g. Converge/ and
+ParaSearch/) has a row for each sweep, and a run directory done again with other parameters replaces its row. The hash
+of each run (RunHash of its input parameters, or of its scorecard parameter columns for runs whose parameters are not
+known) is indexed, so the sweeps that did a run can be found by it. Every scorecard column is a named column (IndexColumnNames: the input parameter name for
+the columns set by an input parameter, e.g. ImpactsSwitch, mass2area, HeatingRate, and a short name for the others, e.g.
+TotalCoolingTime_yrs, FinalCrustalThickness_m). Each row also has the sweep directory, run directory and the path prefix
+of the output files of the run (ResultBundle.LoadOutputFile(output_prefix + '_CrustalThickness.csv') reads a time series
+whichever output format the run used). The commonly filtered parameters are indexed (IndexedColumns).
+
+Runs are added by SweepExecutor (index=) as they finish and by Combinator.py (--index) for sweeps done without it, e.g.
+
+    import ResultsIndex as RI
+    with RI.ResultsIndex() as index:
+        rows = index.ScoreCards('ImpactsSwitch = 1 AND mass2area = ?', (1e6,))
+
+where rows has the scorecard columns in the order of MAIN.ScoreCardColumnNames (same as a GrandScoreCard.csv array).
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import os
+import time
+import json
+import sqlite3
+import hashlib
+
+import MAIN
+import ResultBundle as RB
+import ParameterDependencies as PD
+
+DefaultIndexFile = os.path.join(os.path.expanduser('~'), '.iMagmaCache', 'iMagmaResults.sqlite')
+
+# Names of the scorecard columns in the index (same order as MAIN.ScoreCardColumnNames)
+_parameterNames = dict(MAIN.ScoreCardInputColumns)
+_parameterNames['Timestep Tolerance (%)'] = 'TimestepTolerance_percent'
+
+_outputNames = {'Run Name': 'RunNumber', 'iMagma Version': 'iMagmaVersion', 'Run Duration (sec)': 'RunDuration_sec', \
+                'Initial Magma Ocean Mass (kg)': 'InitialMagmaOceanMass_kg', 'Solidified Magma Ocean Mass (kg)': 'SolidifiedMagmaOceanMass_kg', \
+                'Total Mass Added By Re-impacts (kg)': 'TotalMassAddedByReimpacts_kg', 'Total Energy Added By Re-impacts (J)': 'TotalEnergyAddedByReimpacts_J', \
+                'Total Additional Heat Added (J)': 'TotalAdditionalHeatAdded_J', 'Remaining Liquid (%)': 'RemainingLiquid_percent', \
+                'Plag Building Start Time (yrs)': 'PlagBuildingStartTime_yrs', 'Percentage of Surface w/ Holes': 'SurfaceWithHoles_percent', \
+                'Total Cooling Time (yrs)': 'TotalCoolingTime_yrs', 'Final Crustal Thickness (m)': 'FinalCrustalThickness_m'}
+
+IndexColumnNames = [_parameterNames.get(column) or _outputNames[column] for column in MAIN.ScoreCardColumnNames]
+
+# Columns with an index (parameters runs are usually picked by)
+IndexedColumns = ['run_hash', 'ImpactsSwitch', 'QuenchSwitch', 'GeneralHeatingSwitch', 'mass2area', 'HeatingRate', 'Emissivity', 'LargestImpactorSize', \
+                  'MoonLocationDebrisCalc', 'MO_depth_initial', 'dy_viscosity_MO', 'adiabslope', 'vol_increments', 'sweep_path']
+
+# Columns of the runs table before the scorecard columns (a row is keyed by run_path)
+_runColumns = ['run_hash TEXT', 'sweep_path TEXT', 'run_path TEXT PRIMARY KEY', 'output_prefix TEXT', 'impacts_file TEXT', 'params TEXT', 'indexed_time REAL']
+
+
+# Hash of a run: hash of the iMagma version and its input parameters and optional settings (filled in with their defaults;
+# run directory and run number left out), or, if its parameters are not known, of the iMagma version and parameter columns of its scorecard
+def RunHash(scoreCard, params=None):
+
+    if params is not None:
+        values = dict((name, params[name]) for name, convert in MAIN.InputParameterNames if name not in PD.RunIdentityParameters)
+        values.update((name, params.get(name, default)) for name, default in MAIN.OptionalParameterDefaults.items())
+        content = json.dumps(['params', MAIN.iMagma_version, values], default=RB.JSONValue, sort_keys=True)
+    else:
+        columns = [MAIN.ScoreCardColumnNames.index(column) for column, name in MAIN.ScoreCardInputColumns]
+        content = json.dumps(['scorecard', float(scoreCard[1])] + [float(scoreCard[i]) for i in columns])
+
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
+
+
+class ResultsIndex(object):
+
+    def __init__(self, fileName=None):
+
+        self.fileName = fileName if fileName is not None else DefaultIndexFile
+
+        directory = os.path.dirname(os.path.abspath(self.fileName))
+        if not os.path.isdir(directory):
+            os.makedirs(directory, exist_ok=True)
+
+        # Several sweeps may add runs at the same time (write-ahead log, and wait for a writer instead of failing)
+        self.connection = sqlite3.connect(self.fileName, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+
+        columns = _runColumns + ['"%s" REAL' % name for name in IndexColumnNames]
+
+        with self.connection:
+
+            self.connection.execute('CREATE TABLE IF NOT EXISTS runs (%s)' % ', '.join(columns))
+            for name in IndexedColumns:
+                self.connection.execute('CREATE INDEX IF NOT EXISTS runs_%s ON runs ("%s")' % (name, name))
+
+    # Row of the runs table for a run (scoreCard in the order of MAIN.ScoreCardColumnNames, runPath the directory of the run ending in /)
+    # outputPath is the directory of the output files if they are not in runPath (run given the results of an equivalent run)
+    @staticmethod
+    def _Row(scoreCard, runPath, params=None, outputPath=None):
+
+        runPath = os.path.abspath(runPath) + '/'
+        outputPath = os.path.abspath(outputPath) + '/' if outputPath is not None else runPath
+        sweepPath = os.path.dirname(os.path.dirname(runPath)) + '/'
+
+        # Output files of a run without known parameters are found from its switch columns
+        if params is not None:
+            prefix = MAIN.OutputPrefix(params)
+        else:
+            prefix = MAIN.OutputPrefix({'ImpactsSwitch': bool(scoreCard[MAIN.ScoreCardColumnNames.index('Impacts')]), \
+                                        'QuenchSwitch': bool(scoreCard[MAIN.ScoreCardColumnNames.index('Quench')])})
+
+        return [RunHash(scoreCard, params), sweepPath, runPath, outputPath + prefix if prefix is not None else None, \
+                params.get('ImpactsFile') if params is not None else None, \
+                json.dumps(params, default=RB.JSONValue, sort_keys=True) if params is not None else None, time.time()] + \
+               [float(value) for value in scoreCard]
+
+    # Add runs given as (scoreCard, runPath, params or None, outputPath or None) in one transaction (replacing the row of a run
+    # directory that was added before)
+    def AddMany(self, runs):
+
+        rows = [self._Row(*run) for run in runs]
+        placeholders = ', '.join(['?'] * (len(_runColumns) + len(IndexColumnNames)))
+
+        with self.connection:
+            self.connection.executemany('INSERT OR REPLACE INTO runs VALUES (%s)' % placeholders, rows)
+
+    # Add (or replace) one run
+    def Add(self, scoreCard, runPath, params=None, outputPath=None):
+        self.AddMany([(scoreCard, runPath, params, outputPath)])
+
+    # Rows of the runs table (as dictionaries) that match an SQL condition on the named columns, e.g. 'ImpactsSwitch = 1 AND mass2area = ?'
+    def Query(self, where='1', args=(), columns='*', orderBy='sweep_path, RunNumber'):
+
+        cursor = self.connection.execute('SELECT %s FROM runs WHERE %s ORDER BY %s' % (columns, where, orderBy), tuple(args))
+        names = [description[0] for description in cursor.description]
+
+        return [dict(zip(names, row)) for row in cursor]
+
+    # Scorecards (one row per run, columns of MAIN.ScoreCardColumnNames) of the runs that match an SQL condition
+    def ScoreCards(self, where='1', args=(), orderBy='sweep_path, RunNumber'):
+
+        columns = ', '.join('"%s"' % name for name in IndexColumnNames)
+        cursor = self.connection.execute('SELECT %s FROM runs WHERE %s ORDER BY %s' % (columns, where, orderBy), tuple(args))
+
+        rows = cursor.fetchall()
+
+        return np.array(rows, dtype=float) if rows else np.empty((0, len(IndexColumnNames)))
+
+    def Close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
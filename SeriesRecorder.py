@@ -0,0 +1,132 @@
+"""
+
+Recorder for the time series written out by MAIN.py (ellapsed time, liquid fraction, CMB temperature, crust thickness,
+hole statistics, ...)
+
+Each recorder holds a group of series that get one value per recorded increment (e.g. all the series written to
+_HoleTracker.csv). The values are stored in one preallocated float64 array with one contiguous row per series, so
+recording an increment is a single store instead of one Python list append per series, and the series are handed
+back as views of that array (no copy or list-to-array conversion at the end of a run). Storage is doubled when full.
+
+A recorder can also be given a sink (e.g. OutputWriter.StreamingOutputWriter.Write), in which case every chunkSize values
+are handed to the sink and dropped from the recorder, so only the values not yet handed over are kept in memory.
+
+Increments given to Record (instead of Append) are only kept when the recording policy of the recorder says so (see
+RecordingPolicy.py), when they are forced (regime transitions) or when they are the last increment of the run (Finish).
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+
+class SeriesRecorder(object):
+
+    # watch names the series looked at by the policy (default all but the first, which is the ellapsed time)
+    def __init__(self, names, capacity=1024, sink=None, chunkSize=4096, policy=None, watch=None):
+
+        if sink is not None:
+            capacity = chunkSize
+
+        self.names = list(names)                                        # Names of the series (in the order of the values given to Append)
+        self._index = dict((name, i) for i, name in enumerate(self.names))
+        self._data = np.empty((len(self.names), max(int(capacity), 1)))  # One row per series
+        self.n = 0                                                      # Number of values held in each series
+        self.sink = sink                                                # Called as sink(names, block) with each chunk of values
+        self.chunkSize = chunkSize                                      # Number of values in each chunk handed to the sink
+        self.numFlushed = 0                                             # Number of values already handed to the sink
+        self.policy = policy                                            # Recording policy used by Record (None keeps every increment)
+        self._watch = [self._index[name] for name in (watch if watch is not None else self.names[1:])]
+        self._pending = None                                            # Values of the last increment given to Record if it was not kept
+
+    # State saved in checkpoints (the sink is not saved, it is set again when a run resumes)
+    def __getstate__(self):
+
+        state = self.__dict__.copy()
+        state['sink'] = None
+
+        return state
+
+    # Number of values recorded in each series (including the ones handed to the sink)
+    def __len__(self):
+        return self.numFlushed + self.n
+
+    # Add one value to every series (values in the order of names; storage is doubled when full)
+    def Append(self, *values):
+
+        if self.n == self._data.shape[1]:
+
+            newData = np.empty((self._data.shape[0], 2 * self._data.shape[1]))
+            newData[:,:self.n] = self._data[:,:self.n]
+            self._data = newData
+
+        self._data[:,self.n] = values
+        self.n += 1
+
+        if self.sink is not None and self.n >= self.chunkSize:
+            self.Flush()
+
+    # Add many values to every series at once (block has one row per series, in the order of names)
+    def Extend(self, block):
+
+        block = np.asarray(block, dtype=float)
+        count = block.shape[1]
+
+        if self.n + count > self._data.shape[1]:
+
+            newData = np.empty((self._data.shape[0], max(2 * self._data.shape[1], self.n + count)))
+            newData[:,:self.n] = self._data[:,:self.n]
+            self._data = newData
+
+        self._data[:,self.n:self.n + count] = block
+        self.n += count
+
+        if self.sink is not None and self.n >= self.chunkSize:
+            self.Flush()
+
+    # Add the values of an increment if the recording policy keeps it or force is True (values in the order of names, the first is the ellapsed time)
+    def Record(self, force, *values):
+
+        if self.policy is None:
+            self.Append(*values)
+            return
+
+        watched = np.array(values, dtype=float)[self._watch]
+
+        if force or self.policy.Keep(values[0], watched):
+            self.Append(*values)
+            self.policy.Kept(values[0], watched)
+            self._pending = None
+        else:
+            self._pending = values
+
+    # Add the last increment given to Record if it was not kept (so the final state of a run is always recorded)
+    def Finish(self):
+
+        if self._pending is not None:
+            self.Append(*self._pending)
+            self._pending = None
+
+    # Hand the values held to the sink (copied, since the storage is reused)
+    def Flush(self):
+
+        if self.sink is None or self.n == 0:
+            return
+
+        self.sink(self.names, self._data[:,:self.n].copy())
+        self.numFlushed += self.n
+        self.n = 0
+
+    # View of one series (changing it changes the recorder; a later Append that grows the storage does not change it)
+    # With a sink only the values not yet handed over are in the view
+    def Series(self, name):
+        return self._data[self._index[name],:self.n]
+
+    # Dictionary of views of all the series
+    def AsDict(self):
+        return dict((name, self._data[i,:self.n]) for i, name in enumerate(self.names))
+
+    # All series as one (number of series x n) array view, e.g. to write them out in one go
+    def AsArray(self):
+        return self._data[:,:self.n]
@@ -9,6 +9,7 @@ By: Viranga Perera & Alan P. Jackson
 """
 
 from __future__ import division
+import numpy as np
 
 def SurfaceTemperature(Temperature_top_MO, Temperature_top_lid_guess, LidThickness, Diffusivity_lid, density_lid, Heat_capacity_lid, SB, Emissivity, Temperature_equl):
 
@@ -34,3 +35,91 @@ def SurfaceTemperature(Temperature_top_MO, Temperature_top_lid_guess, LidThickne
         Tsurf = Temperature_top_MO
     	
     return Tsurf
+
+
+# Same as SurfaceTemperature but for arrays of lids (e.g. all the holes in HoleTracker) at once
+# The conductive flux above is evaluated at the guess, so a single update gives the same value as the loop for every lid
+def SurfaceTemperatureArray(Temperature_top_MO, Temperature_top_lid_guess, LidThickness, Diffusivity_lid, density_lid, Heat_capacity_lid, SB, Emissivity, Temperature_equl):
+
+    Temperature_top_lid_guess = np.asarray(Temperature_top_lid_guess, dtype=float)
+    LidThickness = np.broadcast_to(np.asarray(LidThickness, dtype=float), Temperature_top_lid_guess.shape)
+
+    Tsurf = np.full(Temperature_top_lid_guess.shape, float(Temperature_top_MO))
+
+    hasLid = LidThickness != 0
+
+    CondFlux = Diffusivity_lid * density_lid * Heat_capacity_lid * (Temperature_top_MO - Temperature_top_lid_guess[hasLid]) / LidThickness[hasLid]
+
+    Tsurf[hasLid] = np.power((CondFlux / (SB * Emissivity) + pow(Temperature_equl, 4.0)), 0.25)
+
+    return Tsurf
+
+
+# Solve the radiative/conductive balance at the top of many lids at once with a bracketed Newton iteration
+#
+#   Emissivity * SB * (Tsurf^4 - Temperature_equl^4) = Diffusivity_lid * density_lid * Heat_capacity_lid * (Temperature_top_MO - Tsurf) / LidThickness
+#
+# The root always lies between Temperature_equl and Temperature_top_MO, so Newton steps that leave that bracket are replaced by bisection.
+# Temperature_top_lid_guess can be the temperatures of the previous timestep (warm start). Arguments can be scalars or arrays (broadcast together).
+# Returns the surface temperatures and the number of iterations each lid needed (0 for lids with no thickness).
+def SolveSurfaceTemperature(Temperature_top_MO, LidThickness, Diffusivity_lid, density_lid, Heat_capacity_lid, SB, Emissivity, Temperature_equl, \
+                            Temperature_top_lid_guess=None, tol=1e-8, maxIter=50):
+
+    if Temperature_top_lid_guess is None:
+        Temperature_top_lid_guess = Temperature_top_MO
+
+    Ttop, Thick, K, Tguess = np.broadcast_arrays(np.asarray(Temperature_top_MO, dtype=float), np.asarray(LidThickness, dtype=float), \
+                                                  np.asarray(Diffusivity_lid, dtype=float) * density_lid * Heat_capacity_lid, \
+                                                  np.asarray(Temperature_top_lid_guess, dtype=float))
+
+    Tsurf = np.array(Ttop, dtype=float)
+    iterations = np.zeros(Tsurf.shape, dtype=int)
+
+    # Only lids with a thickness need to be solved (no lid means the surface is the top of the magma ocean)
+    idx = np.flatnonzero(Thick != 0)
+
+    Ttop_a = Ttop.ravel()[idx]
+    Kappa_a = K.ravel()[idx] / Thick.ravel()[idx]
+    Tequl4 = pow(Temperature_equl, 4.0)
+    radCoeff = Emissivity * SB
+
+    lo = np.minimum(Ttop_a, Temperature_equl)
+    hi = np.maximum(Ttop_a, Temperature_equl)
+    T = np.clip(Tguess.ravel()[idx], lo, hi)
+
+    Tsurf_flat = Tsurf.reshape(-1)
+    iterations_flat = iterations.reshape(-1)
+
+    for iteration in range(maxIter):
+
+        if idx.size == 0:
+            break
+
+        f = radCoeff * (pow(T, 4) - Tequl4) - Kappa_a * (Ttop_a - T)
+        dfdT = 4 * radCoeff * pow(T, 3) + Kappa_a
+
+        # f increases with T, so the sign of f tells which side of the root T is on
+        hi = np.where(f > 0, T, hi)
+        lo = np.where(f < 0, T, lo)
+
+        newT = T - f / dfdT
+
+        outside = (newT < lo) | (newT > hi)
+        newT[outside] = 0.5 * (lo[outside] + hi[outside])
+
+        iterations_flat[idx] += 1
+
+        converged = (np.abs(newT - T) <= tol * np.abs(newT)) | (f == 0)
+
+        Tsurf_flat[idx[converged]] = newT[converged]
+
+        keep = ~converged
+        idx, Ttop_a, Kappa_a, lo, hi, T = idx[keep], Ttop_a[keep], Kappa_a[keep], lo[keep], hi[keep], newT[keep]
+
+    # Lids that did not converge within maxIter keep their last iterate
+    Tsurf_flat[idx] = T
+
+    if Tsurf.ndim == 0:
+        return float(Tsurf), int(iterations)
+
+    return Tsurf, iterations
@@ -0,0 +1,337 @@
+"""
+
+Runs the jobs of a parameter sweep (one iMagma run per parameter combination) on a bounded pool of worker processes
+
+ParameterSearchHEAD.py used to start MAIN.py with subprocess.Popen for every combination without waiting, so a big grid
+started thousands of processes at once and never found out whether a run failed. The executor keeps at most one run per
+worker (by default one worker per available core), hands each run its input parameters in memory (no os.chdir or
+inputFile.csv; the worker calls MAIN.run_simulation and writes the usual output files and scoreCard.csv to the UserPath
+of the run), and collects the exit status (0 for a finished run, 1 for a failed one), error and wall time of every run.
+Scorecards are appended to SweepScoreCard.csv as the runs finish, and the status of every run to SweepLog.csv. When the
+sweep ends (or stops) the scorecards are written to GrandScoreCard.csv in run number order (same file as Combinator.py
+writes), so Combinator.py --watch is the only process writing GrandScoreCard.csv while the sweep runs. Failed runs are
+tried again up to maxRetries times. The state of every run is kept in a manifest (see SweepManifest.py), so running an
+interrupted sweep again only does the runs that are not done yet. With a result cache (see ResultCache.py) runs already
+done in any sweep are copied from the cache instead of run. Runs that only differ in parameters their switches make dead
+(see ParameterDependencies.py) are run once, and the other runs are given its scorecard (SweepLog.csv names the run that
+was done in Same As Run). Finished runs can also be added to a results index (see ResultsIndex.py), e.g.
+
+    import SweepExecutor as SE
+    results = SE.SweepExecutor(maxWorkers=8, cache=RC.ResultCache()).Run(jobs, UserPath)
+
+where jobs is a list of input parameter dictionaries (see MAIN.InputParameters).
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import os
+import csv
+import time
+import traceback
+import concurrent.futures
+
+import MAIN
+import SweepManifest as SM
+import ParameterDependencies as PD
+
+GrandScoreCardName = 'GrandScoreCard.csv'
+LiveScoreCardName = 'SweepScoreCard.csv'
+SweepLogName = 'SweepLog.csv'
+SweepLogColumnNames = ['Run Name', 'Exit Status', 'Wall Time (sec)', 'Error', 'Same As Run']
+
+
+# Outcome of one run of a sweep
+class JobResult(object):
+
+    def __init__(self, runNumber, userPath, status, wallTime, scoreCard=None, error=None, sameAs=None):
+
+        self.runNumber = runNumber          # RunNumber of the run
+        self.userPath = userPath            # Directory the run wrote its output files to
+        self.status = status                # Exit status (0 finished, 1 failed)
+        self.wallTime = wallTime            # Wall time of the run (sec)
+        self.scoreCard = scoreCard          # Scorecard values of a finished run (same order as MAIN.ScoreCardColumnNames)
+        self.error = error                  # Error message of a failed run
+        self.sameAs = sameAs                # RunNumber of the run whose results this run was given (same effective parameters), None if it was run itself
+
+
+# Number of cores this process may run on
+def AvailableCores():
+
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+
+    return os.cpu_count() or 1
+
+
+# Do one run in a worker process: run the cooling loop and write the output files and scoreCard.csv to the UserPath of the run
+# A failed run writes its error to errorFile.csv in its UserPath (looked for by Combinator.py)
+# A finished run is added to cache (ResultCache.ResultCache) if one is given
+def RunJob(params, cache=None):
+
+    startTime = time.time()
+    userPath = params['UserPath']
+
+    try:
+
+        if not os.path.isdir(userPath):
+            os.makedirs(userPath)
+
+        # Files left by an earlier try of this run (scoreCard.csv is appended to)
+        for fileName in ('scoreCard.csv', 'errorFile.csv'):
+            if os.path.isfile(userPath + fileName):
+                os.remove(userPath + fileName)
+
+        result = MAIN.run_simulation(params)
+
+        MAIN.WriteOutputFiles(result, userPath)
+        MAIN.WriteScoreCard(result, userPath)
+
+        # A cache that cannot be written to does not fail the run
+        if cache is not None:
+            try:
+                cache.Store(params)
+            except (IOError, OSError) as e:
+                print('Run %s not added to the result cache: %s' % (params.get('RunNumber', 0), e))
+
+        return JobResult(params.get('RunNumber', 0), userPath, 0, time.time() - startTime, result.scoreCard)
+
+    except Exception as e:
+
+        error = '%s: %s' % (type(e).__name__, e)
+
+        if os.path.isdir(userPath):
+            with open(userPath + 'errorFile.csv', 'w') as f:
+                f.write(traceback.format_exc())
+
+        return JobResult(params.get('RunNumber', 0), userPath, 1, time.time() - startTime, error=error)
+
+
+# Result of a run that was not run because an equivalent run (same effective parameters, see ParameterDependencies.py) was
+# The scorecard of the equivalent run is written to scoreCard.csv in the UserPath of the run (time series are only in the UserPath of the equivalent run)
+def EquivalentResult(params, result):
+
+    userPath = params['UserPath']
+
+    if result.scoreCard is None:
+        return JobResult(params.get('RunNumber', 0), userPath, result.status, 0., error=result.error, sameAs=result.runNumber)
+
+    scoreCard = PD.EquivalentScoreCard(result.scoreCard, params)
+
+    if not os.path.isdir(userPath):
+        os.makedirs(userPath)
+
+    with open(userPath + 'scoreCard.csv', 'w') as f:
+        np.savetxt(f, scoreCard.reshape(1, scoreCard.shape[0]), delimiter=',', fmt='%.7e')
+
+    return JobResult(params.get('RunNumber', 0), userPath, result.status, 0., scoreCard, sameAs=result.runNumber)
+
+
+# Write the scorecards of the finished runs of a sweep to GrandScoreCard.csv in UserPath in run number order (to a temporary file
+# that is renamed, so a Combinator.py pass at the same time never reads a partial file)
+def WriteGrandScoreCard(UserPath, results):
+
+    finished = sorted((result for result in results if result is not None and result.scoreCard is not None), key=lambda result: result.runNumber)
+    tempName = '%s.%d.tmp' % (UserPath + GrandScoreCardName, os.getpid())
+
+    with open(tempName, 'w') as f:
+        csv.writer(f).writerow(MAIN.ScoreCardColumnNames)
+        if finished:
+            np.savetxt(f, np.vstack([result.scoreCard for result in finished]), delimiter=',', fmt='%.7e')
+
+    os.replace(tempName, UserPath + GrandScoreCardName)
+
+
+class SweepExecutor(object):
+
+    # maxWorkers limits the number of runs at the same time (None uses all available cores)
+    # maxRetries is the number of times a failed run is tried again (in this sweep and in later sweeps resuming it)
+    # cache (ResultCache.ResultCache) gives runs that were already done in any sweep without running them, and keeps the finished runs
+    # With collapse, runs of a sweep that only differ in dead parameters (see ParameterDependencies.py) are run once
+    # index (ResultsIndex.ResultsIndex) is given every finished run
+    def __init__(self, maxWorkers=None, maxRetries=2, cache=None, collapse=True, index=None):
+
+        self.maxWorkers = max(int(maxWorkers), 1) if maxWorkers is not None else AvailableCores()
+        self.maxRetries = maxRetries
+        self.cache = cache
+        self.collapse = collapse
+        self.index = index
+
+    # Run every job (input parameter dictionary) and return their JobResults in the order the jobs were given
+    # Scorecards and statuses are written to SweepScoreCard.csv and SweepLog.csv in UserPath as the runs finish, and the scorecards
+    # to GrandScoreCard.csv when the sweep ends; onResult (if given) is also called with each JobResult as its run finishes
+    # With resume, runs recorded as done in the manifest of an earlier sweep in UserPath (see SweepManifest.py) that still have a valid
+    # scoreCard.csv are not run again, and failed runs are only tried again while they have retries left
+    def Run(self, jobs, UserPath, onResult=None, resume=True):
+
+        jobs = list(jobs)
+        results = [None] * len(jobs)
+        runIds = [str(params.get('RunNumber', idx)) for idx, params in enumerate(jobs)]
+
+        manifest = SM.SweepManifest(UserPath + SM.ManifestName if resume else os.devnull)
+
+        # Runs that are done (the first run of each effective parameter set) and the runs given their results
+        equivalents = dict(PD.EquivalentRuns(jobs)) if self.collapse else dict((idx, []) for idx in range(len(jobs)))
+
+        try:
+            self._Run(jobs, UserPath, onResult, resume, results, runIds, manifest, equivalents)
+        finally:
+            WriteGrandScoreCard(UserPath, results)
+
+        return results
+
+    # Run the jobs of Run (results are filled in as the runs finish)
+    def _Run(self, jobs, UserPath, onResult, resume, results, runIds, manifest, equivalents):
+
+        with manifest, open(UserPath + LiveScoreCardName, 'w') as liveScoreCard, open(UserPath + SweepLogName, 'w') as sweepLog:
+
+            csv.writer(liveScoreCard).writerow(MAIN.ScoreCardColumnNames)
+            logWriter = csv.writer(sweepLog)
+            logWriter.writerow(SweepLogColumnNames)
+
+            # outputPath is the directory of the output files of a run given the results of an equivalent run
+            def Record(idx, result, outputPath=None):
+
+                results[idx] = result
+
+                if result.scoreCard is not None:
+                    np.savetxt(liveScoreCard, result.scoreCard.reshape(1, result.scoreCard.shape[0]), delimiter=',', fmt='%.7e')
+                    liveScoreCard.flush()
+
+                    if self.index is not None:
+                        self.index.Add(result.scoreCard, result.userPath, jobs[idx], outputPath)
+
+                logWriter.writerow([result.runNumber, result.status, '%.3f' % result.wallTime, result.error or '', result.sameAs or ''])
+                sweepLog.flush()
+
+                if result.status != 0 and result.sameAs is None:
+                    print('Error in Run %s: %s' % (result.runNumber, result.error))
+
+                if onResult is not None:
+                    onResult(result)
+
+            def Finished(idx, result):
+
+                Record(idx, result)
+
+                # Equivalent runs are kept in the manifest with the run they were given the results of (so their parameters are
+                # known, e.g. to Combinator.py --index), but are never run themselves
+                for other in equivalents[idx]:
+
+                    # Output files left by an earlier sweep in which the run was run itself with other parameters
+                    stored = manifest[runIds[other]].get('params') if runIds[other] in manifest else None
+                    if stored is not None and stored != SM.ManifestParameters(jobs[other]):
+                        SM.RemoveResults(jobs[other]['UserPath'], stored)
+
+                    Record(other, EquivalentResult(jobs[other], result), result.userPath)
+                    manifest.Add(runIds[other], jobs[other])
+                    manifest.Update(runIds[other], status=SM.Done if result.status == 0 else SM.Failed, sameAs=result.runNumber)
+
+            # Runs left to do (runs done in an earlier sweep are finished straight away with the scorecard they wrote)
+            toRun = []
+
+            for idx in equivalents:
+
+                params = jobs[idx]
+                runId = runIds[idx]
+
+                stored = manifest[runId].get('params') if runId in manifest else None
+                changed = stored is not None and stored != SM.ManifestParameters(params)
+                scoreCard = None
+
+                if resume and not changed and SM.ValidScoreCard(params['UserPath'], params.get('RunNumber', 0)):
+
+                    scoreCard = np.genfromtxt(params['UserPath'] + 'scoreCard.csv', delimiter=',')
+
+                    # Scorecard left by a run with other parameters that are not in the manifest (e.g. a sweep run without resume or
+                    # by an older ParameterSearchHEAD.py)
+                    if not SM.ScoreCardMatches(scoreCard, params):
+                        changed = True
+                        scoreCard = None
+
+                # New run, or a run whose parameters changed since the earlier sweep (whose results are removed so they are not taken as done)
+                if runId not in manifest or changed:
+                    manifest.Add(runId, params)
+
+                if changed:
+                    if stored is not None:
+                        SM.RemoveResults(params['UserPath'], stored)
+                    SM.RemoveResults(params['UserPath'], params)
+
+                entry = manifest[runId]
+
+                # Scorecard written by a run whose status was not recorded (sweep killed just as the run finished) also counts as done
+                if scoreCard is not None:
+                    manifest.Update(runId, status=SM.Done)
+                    Finished(idx, JobResult(params.get('RunNumber', 0), params['UserPath'], 0, entry.get('wallTime') or np.nan, scoreCard))
+
+                elif entry['status'] == SM.Failed and entry['attempts'] > self.maxRetries:
+                    Finished(idx, JobResult(params.get('RunNumber', 0), params['UserPath'], 1, entry.get('wallTime') or np.nan, error=entry.get('error')))
+
+                # Runs already done with the same parameters in any sweep are copied from the result cache
+                elif self.cache is not None and self.cache.Fetch(params) is not None:
+                    scoreCard = np.genfromtxt(params['UserPath'] + 'scoreCard.csv', delimiter=',')
+                    manifest.Update(runId, status=SM.Done, error=None, wallTime=0.)
+                    Finished(idx, JobResult(params.get('RunNumber', 0), params['UserPath'], 0, 0., scoreCard))
+
+                # Pending runs, failed runs with retries left, runs left running by a sweep or worker that died and done runs without a valid scorecard
+                else:
+                    manifest.Update(runId, status=SM.Pending)
+                    toRun.append(idx)
+
+            if resume:
+                manifest.Compact()
+
+            pool = concurrent.futures.ProcessPoolExecutor(self.maxWorkers)
+
+            try:
+
+                # Keep only a few jobs per worker queued, so a big sweep does not hold every job in the pool at once
+                pending = {}
+
+                while toRun or pending:
+
+                    while toRun and len(pending) < 2 * self.maxWorkers:
+
+                        idx = toRun.pop(0)
+
+                        # A pool whose worker died cannot take more jobs, so the rest of the sweep goes to a new pool
+                        try:
+                            future = pool.submit(RunJob, jobs[idx], self.cache)
+                        except concurrent.futures.process.BrokenProcessPool:
+                            pool.shutdown(wait=False)
+                            pool = concurrent.futures.ProcessPoolExecutor(self.maxWorkers)
+                            future = pool.submit(RunJob, jobs[idx], self.cache)
+
+                        manifest.Update(runIds[idx], status=SM.Running)
+                        pending[future] = idx
+
+                    done, notDone = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+
+                    for future in done:
+
+                        idx = pending.pop(future)
+                        attempts = manifest[runIds[idx]]['attempts'] + 1
+
+                        # Worker process died (e.g. killed or out of memory) rather than the run raising an error
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            result = JobResult(jobs[idx].get('RunNumber', 0), jobs[idx]['UserPath'], 1, np.nan, error='%s: %s' % (type(e).__name__, e))
+
+                        if result.status == 0:
+                            manifest.Update(runIds[idx], status=SM.Done, attempts=attempts, error=None, wallTime=result.wallTime)
+                            Finished(idx, result)
+
+                        elif attempts <= self.maxRetries:
+                            manifest.Update(runIds[idx], status=SM.Pending, attempts=attempts, error=result.error, wallTime=result.wallTime)
+                            toRun.append(idx)
+
+                        else:
+                            manifest.Update(runIds[idx], status=SM.Failed, attempts=attempts, error=result.error, wallTime=result.wallTime)
+                            Finished(idx, result)
+
+            finally:
+                pool.shutdown()
@@ -0,0 +1,175 @@
+"""
+
+Manifest of a parameter sweep (SweepManifest.jsonl in the UserPath of the sweep), so an interrupted sweep can be resumed
+
+The manifest maps the ID of every run (its RunNumber, which is also the name of its directory) to its input parameters,
+its status (pending, running, done or failed), the number of times it was tried, its last error and its wall time. It is
+a journal: one JSON line per run with all of that, then one line per change of status, with the last line of a run
+winning. Changes are therefore appended (cheap even for sweeps of 10,000 runs) and a sweep killed part way through
+leaves at worst a half written last line, which is ignored. The journal is written out compactly again (one line per
+run) each time a sweep starts.
+
+SweepExecutor.Run uses the manifest to skip runs that are done and still have a valid scoreCard.csv, to try failed runs
+again up to a limit and to take back runs that were left running by an executor or worker that died.
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import os
+import json
+
+import MAIN
+import ResultBundle as RB
+
+ManifestName = 'SweepManifest.jsonl'
+
+# Status of a run
+Pending = 'pending'
+Running = 'running'
+Done = 'done'
+Failed = 'failed'
+
+
+# Parameters as they are stored in the manifest (JSON values, so that parameters of a new sweep can be compared with stored ones)
+def ManifestParameters(params):
+    return json.loads(json.dumps(params, default=RB.JSONValue, sort_keys=True))
+
+
+# Whether the UserPath of a run has a complete scoreCard.csv written by that run (one row of every scorecard column, starting with its RunNumber)
+def ValidScoreCard(userPath, runNumber):
+
+    fileName = userPath + 'scoreCard.csv'
+
+    if not os.path.isfile(fileName):
+        return False
+
+    try:
+        scoreCard = np.genfromtxt(fileName, delimiter=',')
+    except ValueError:
+        return False
+
+    return scoreCard.shape == (len(MAIN.ScoreCardColumnNames),) and scoreCard[0] == float(runNumber)
+
+
+# Whether the input parameter columns of a scorecard are those of params (a scorecard left by a run with other parameters,
+# e.g. by a sweep without a manifest, is not the result of params). Scorecards are written with 8 significant digits
+def ScoreCardMatches(scoreCard, params):
+
+    for column, name in MAIN.ScoreCardInputColumns:
+
+        if name in MAIN.OptionalParameterDefaults:
+            value = float(params.get(name, MAIN.OptionalParameterDefaults[name]))
+        else:
+            value = float(params[name])
+
+        # Written as a percentage
+        if name == 'TimestepTolerance':
+            value *= 100
+
+        if not np.isclose(scoreCard[MAIN.ScoreCardColumnNames.index(column)], value, rtol=1e-6, atol=0.):
+            return False
+
+    return True
+
+
+# Remove the results a run with params left in userPath (scoreCard.csv, errorFile.csv and its output files), so a run whose
+# parameters changed is done again instead of being taken as done with the results of its old parameters
+def RemoveResults(userPath, params):
+
+    fileNames = ['scoreCard.csv', 'errorFile.csv']
+    prefix = MAIN.OutputPrefix(params)
+
+    if prefix is not None:
+        fileNames += [prefix + suffix for suffix, names in MAIN.OutputFiles(params)] + [prefix + RB.BundleSuffix]
+
+    for fileName in fileNames:
+        if os.path.isfile(userPath + fileName):
+            os.remove(userPath + fileName)
+
+
+class SweepManifest(object):
+
+    def __init__(self, fileName):
+
+        self.fileName = fileName
+        self.runs = {}                 # Entry of each run (dictionary with params, status, attempts, error, wallTime and sameAs for equivalent runs) keyed by run ID
+        self.order = []                # Run IDs in the order they were added
+
+        if os.path.isfile(fileName):
+
+            with open(fileName, 'r') as f:
+                for line in f:
+
+                    # Last line of a sweep that was killed while writing it
+                    try:
+                        change = json.loads(line)
+                    except ValueError:
+                        continue
+
+                    runId = change.pop('run')
+
+                    if runId not in self.runs:
+                        self.runs[runId] = {}
+                        self.order.append(runId)
+
+                    self.runs[runId].update(change)
+
+        self._journal = None
+
+    def __contains__(self, runId):
+        return runId in self.runs
+
+    def __getitem__(self, runId):
+        return self.runs[runId]
+
+    # Write every run as one line (to a temporary file that is renamed) and append changes to it from then on
+    def Compact(self):
+
+        self.Close()
+
+        tempName = '%s.%d.tmp' % (self.fileName, os.getpid())
+
+        try:
+            with open(tempName, 'w') as f:
+                for runId in self.order:
+                    f.write(json.dumps(dict(self.runs[runId], run=runId), default=RB.JSONValue) + '\n')
+            os.replace(tempName, self.fileName)
+        except BaseException:
+            if os.path.exists(tempName):
+                os.remove(tempName)
+            raise
+
+        self._journal = open(self.fileName, 'a')
+
+    # Add a run as pending (replaces the entry of a run with the same ID)
+    def Add(self, runId, params):
+
+        if runId not in self.runs:
+            self.order.append(runId)
+
+        self.runs[runId] = {}
+        self.Update(runId, params=ManifestParameters(params), status=Pending, attempts=0, error=None, wallTime=None)
+
+    # Change some fields of a run (e.g. Update(runId, status=Done, wallTime=12.3))
+    def Update(self, runId, **fields):
+
+        self.runs[runId].update(fields)
+
+        if self._journal is not None:
+            self._journal.write(json.dumps(dict(fields, run=runId), default=RB.JSONValue) + '\n')
+            self._journal.flush()
+
+    def Close(self):
+
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.Close()
@@ -0,0 +1,409 @@
+"""
+
+Declarative parameter sweeps: a sweep specification file lists the fixed and varied input parameters and the design used
+to pick the parameter sets (runs) of the sweep
+
+A full grid over the varied parameters (the nested loops of ParameterSearchHEAD.py) grows as the product of the number of
+values of each parameter. The other designs pick a number of runs given in the spec (samples) however many parameters
+vary:
+    'grid':   every combination of the levels of the varied parameters
+    'oat':    one at a time, the base run plus every level of one varied parameter with the others at their base value
+    'lhs':    Latin hypercube sample (every parameter range is cut into samples strata and each stratum is used once)
+    'sobol':  Sobol low-discrepancy sequence (scrambled with the seed)
+    'random': independent uniform samples
+The random designs are reproducible with the seed of the spec.
+
+A spec is a JSON (.json), TOML (.toml) or CSV (.csv) file. In JSON
+
+    {"design": "lhs", "samples": 200, "seed": 1, "runNumberStart": 1,
+     "fixed": {"ImpactsSwitch": false, "QuenchSwitch": true, "ImpactsFile": "AlanData_100km_10Re.csv", ...},
+     "varied": {"adiabslope": {"min": 1e-4, "max": 2e-4},
+                "dy_viscosity_MO": {"min": 1e2, "max": 1e5, "scale": "log"},
+                "Emissivity": {"values": [0.5, 0.75, 1.0]}}}
+
+Ranges (min, max, optional scale 'linear' or 'log') are sampled continuously, and for 'grid' and 'oat' cut into levels
+values (default 3); value lists are used as they are. base sets the value used by 'oat' for the other runs (default the
+middle of the range or of the list). TOML has the same tables. A CSV spec has one setting per row:
+
+    design,lhs
+    samples,200
+    seed,1
+    fixed,ImpactsSwitch,False
+    varied,adiabslope,1e-4,2e-4
+    varied,dy_viscosity_MO,1e2,1e5,3,log
+    values,Emissivity,0.5,0.75,1.0
+
+Fixed parameters can also be the optional run settings of MAIN.run_simulation (e.g. RecordPolicy). Every input parameter
+of MAIN.InputParameterNames except homePath, UserPath and RunNumber has to be fixed or varied. Run a spec with
+
+    python SweepSpec.py mySweep.json [maxWorkers]
+
+from the directory of the sweep (same as ParameterSearchHEAD.py with SweepSpecFile set).
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import os
+import sys
+import csv
+import ast
+import json
+import itertools
+
+import MAIN
+
+try:
+    from scipy.stats import qmc
+except ImportError:
+    qmc = None
+
+Designs = ('grid', 'oat', 'lhs', 'sobol', 'random')
+
+# Input parameters given by the sweep itself rather than the spec
+SweepParameterNames = ('homePath', 'UserPath', 'RunNumber')
+
+
+####### SPEC FILES ##################################################################################################################################
+
+# Value of a CSV cell (numbers and True/False as Python values, anything else as text)
+def _CSVValue(text):
+
+    try:
+        return ast.literal_eval(text.strip())
+    except (ValueError, SyntaxError):
+        return text.strip()
+
+
+def _ReadCSVSpec(fileName):
+
+    spec = {'fixed': {}, 'varied': {}}
+
+    with open(fileName, 'r') as f:
+        for row in csv.reader(f):
+
+            row = [cell for cell in row if cell.strip() != '']
+
+            if len(row) == 0 or row[0].startswith('#'):
+                continue
+
+            kind = row[0].strip()
+
+            if kind == 'fixed':
+                spec['fixed'][row[1].strip()] = _CSVValue(row[2])
+            elif kind == 'varied':
+                varied = {'min': _CSVValue(row[2]), 'max': _CSVValue(row[3])}
+                if len(row) > 4:
+                    varied['levels'] = _CSVValue(row[4])
+                if len(row) > 5:
+                    varied['scale'] = row[5].strip()
+                spec['varied'][row[1].strip()] = varied
+            elif kind == 'values':
+                spec['varied'][row[1].strip()] = {'values': [_CSVValue(cell) for cell in row[2:]]}
+            else:
+                spec[kind] = _CSVValue(row[1])
+
+    return spec
+
+
+# Read a sweep spec (.json, .toml or .csv) into a dictionary (same layout as the JSON file)
+def LoadSweepSpec(fileName):
+
+    extension = os.path.splitext(fileName)[1].lower()
+
+    if extension == '.json':
+        with open(fileName, 'r') as f:
+            spec = json.load(f)
+
+    elif extension == '.toml':
+        try:
+            import tomllib
+        except ImportError:
+            import tomli as tomllib
+        with open(fileName, 'rb') as f:
+            spec = tomllib.load(f)
+
+    elif extension == '.csv':
+        spec = _ReadCSVSpec(fileName)
+
+    else:
+        raise ValueError('Unknown sweep spec format: %s' % fileName)
+
+    CheckSweepSpec(spec)
+
+    return spec
+
+
+# Raise ValueError if the spec does not give a value to every input parameter or has unknown settings
+def CheckSweepSpec(spec):
+
+    design = spec.get('design', 'grid')
+
+    if design not in Designs:
+        raise ValueError('Unknown sweep design: %s (use one of %s)' % (design, ', '.join(Designs)))
+
+    if design in ('lhs', 'sobol', 'random') and int(spec.get('samples', 0)) < 1:
+        raise ValueError("Sweep design '%s' needs samples" % design)
+
+    fixed, varied = spec.get('fixed', {}), spec.get('varied', {})
+    inputNames = [name for name, convert in MAIN.InputParameterNames if name not in SweepParameterNames]
+
+    for name in list(fixed) + list(varied):
+        if name not in inputNames and name not in MAIN.OptionalParameterDefaults:
+            raise ValueError('Unknown parameter in sweep spec: %s' % name)
+
+    for name in set(fixed) & set(varied):
+        raise ValueError('Parameter is both fixed and varied in sweep spec: %s' % name)
+
+    for name in inputNames:
+        if name not in fixed and name not in varied:
+            raise ValueError('Parameter missing from sweep spec: %s' % name)
+
+    for name, values in varied.items():
+        if 'values' not in values and ('min' not in values or 'max' not in values):
+            raise ValueError('Varied parameter %s needs min and max or values' % name)
+
+#####################################################################################################################################################
+
+
+####### DESIGNS (points in the unit hypercube) ######################################################################################################
+
+def LatinHypercube(samples, dimensions, rng):
+
+    points = np.empty((samples, dimensions))
+
+    for dim in range(dimensions):
+        points[:,dim] = (rng.permutation(samples) + rng.random(samples)) / samples
+
+    return points
+
+
+# Primitive polynomials over GF(2) (as integers with bit k the coefficient of x^k) in order of degree, as used for the Sobol sequence
+def _PrimitivePolynomials(count):
+
+    polynomials = []
+    degree = 1
+
+    while len(polynomials) < count:
+
+        order = 2**degree - 1
+        primeFactors = [q for q in range(2, order + 1) if order % q == 0 and all(q % p != 0 for p in range(2, int(q**0.5) + 1))]
+
+        for poly in range(2**degree + 1, 2**(degree + 1), 2):
+
+            # x has order 2^degree - 1 modulo a primitive polynomial
+            def PowerOfX(exponent):
+
+                result, base = 1, 2
+                while exponent:
+                    if exponent & 1:
+                        result = _MultiplyMod(result, base, poly, degree)
+                    base = _MultiplyMod(base, base, poly, degree)
+                    exponent >>= 1
+
+                return result
+
+            if PowerOfX(order) == 1 and all(PowerOfX(order // q) != 1 for q in primeFactors):
+                polynomials.append((degree, poly))
+
+        degree += 1
+
+    return polynomials[:count]
+
+
+# Product of two polynomials over GF(2) modulo poly (of degree degree)
+def _MultiplyMod(a, b, poly, degree):
+
+    result = 0
+
+    while b:
+        if b & 1:
+            result ^= a
+        b >>= 1
+        a <<= 1
+        if a >> degree & 1:
+            a ^= poly
+
+    return result
+
+
+# Sobol sequence (with a random digital shift) built in, for when SciPy is not installed
+# The first dimension is the van der Corput sequence, the others use primitive polynomials with random odd initial direction numbers
+def _Sobol(samples, dimensions, rng, bits=31):
+
+    directions = np.zeros((dimensions, bits), dtype=np.int64)
+    directions[0] = [1 << (bits - k - 1) for k in range(bits)]
+
+    for dim, (degree, poly) in enumerate(_PrimitivePolynomials(dimensions - 1), 1):
+
+        m = [int(rng.integers(0, 2**k)) * 2 + 1 for k in range(degree)]
+
+        for k in range(degree, bits):
+            value = m[k - degree] ^ (m[k - degree] << degree)
+            for j in range(1, degree):
+                if poly >> (degree - j) & 1:
+                    value ^= m[k - j] << j
+            m.append(value)
+
+        directions[dim] = [m[k] << (bits - k - 1) for k in range(bits)]
+
+    points = np.empty((samples, dimensions))
+    current = rng.integers(0, 2**bits, size=dimensions, dtype=np.int64)     # Random digital shift of the first point
+
+    for idx in range(samples):
+
+        points[idx] = current / 2.0**bits
+
+        # Gray code order: flip the direction number of the lowest zero bit of idx
+        bit = 0
+        while idx >> bit & 1:
+            bit += 1
+        current = current ^ directions[:,bit]
+
+    return points
+
+
+def Sobol(samples, dimensions, rng):
+
+    if qmc is not None:
+        return qmc.Sobol(dimensions, scramble=True, seed=rng).random(samples)
+
+    return _Sobol(samples, dimensions, rng)
+
+
+# Points of a sampling design in [0, 1) for every varied parameter (samples x number of varied parameters)
+def UnitSamples(design, samples, dimensions, seed=None):
+
+    rng = np.random.default_rng(seed)
+
+    if design == 'lhs':
+        return LatinHypercube(samples, dimensions, rng)
+    elif design == 'sobol':
+        return Sobol(samples, dimensions, rng)
+    elif design == 'random':
+        return rng.random((samples, dimensions))
+
+    raise ValueError('Not a sampling design: %s' % design)
+
+#####################################################################################################################################################
+
+
+####### PARAMETER SETS ##############################################################################################################################
+
+# Value of a varied parameter at a point u in [0, 1)
+def ValueAt(varied, u):
+
+    if 'values' in varied:
+        values = varied['values']
+        return values[min(int(u * len(values)), len(values) - 1)]
+
+    low, high = float(varied['min']), float(varied['max'])
+
+    if varied.get('scale', 'linear') == 'log':
+        return float(np.exp(np.log(low) + u * (np.log(high) - np.log(low))))
+
+    return low + u * (high - low)
+
+
+# Levels of a varied parameter for the 'grid' and 'oat' designs
+def _Levels(varied):
+
+    if 'values' in varied:
+        return list(varied['values'])
+
+    levels = int(varied.get('levels', 3))
+
+    if levels == 1:
+        return [ValueAt(varied, 0.5)]
+
+    return [ValueAt(varied, u) for u in np.linspace(0, 1, levels)]
+
+
+# Value of a varied parameter in the base run of the 'oat' design
+def _Base(varied):
+
+    if 'base' in varied:
+        return varied['base']
+
+    if 'values' in varied:
+        return varied['values'][(len(varied['values']) - 1) // 2]
+
+    return ValueAt(varied, 0.5)
+
+
+# Values of the varied parameters of every run of the sweep (list of dictionaries)
+def DesignPoints(spec):
+
+    design = spec.get('design', 'grid')
+    varied = spec.get('varied', {})
+    names = sorted(varied)
+
+    if design == 'grid':
+        return [dict(zip(names, values)) for values in itertools.product(*[_Levels(varied[name]) for name in names])]
+
+    if design == 'oat':
+
+        base = dict((name, _Base(varied[name])) for name in names)
+        points = [base]
+
+        for name in names:
+            for value in _Levels(varied[name]):
+                if value != base[name]:
+                    points.append(dict(base, **{name: value}))
+
+        return points
+
+    unit = UnitSamples(design, int(spec['samples']), len(names), spec.get('seed'))
+
+    return [dict((name, ValueAt(varied[name], u)) for name, u in zip(names, point)) for point in unit]
+
+
+# Input parameter dictionaries of every run of the sweep (runs in UserPath/RunNumber/, numbered from runNumberStart in the spec)
+def SweepJobs(spec, UserPath):
+
+    CheckSweepSpec(spec)
+
+    return JobsFromPoints(spec, DesignPoints(spec), UserPath, int(spec.get('runNumberStart', 1)))
+
+
+# Input parameter dictionaries of runs with the fixed parameters of the spec and the varied parameters of points, numbered from runNumber
+def JobsFromPoints(spec, points, UserPath, runNumber):
+
+    fixed = spec.get('fixed', {})
+    jobs = []
+
+    for point in points:
+
+        values = dict(fixed, **point)
+        values.update(homePath=UserPath, UserPath=UserPath + str(runNumber) + '/', RunNumber=runNumber)
+
+        # Integer parameters picked from a continuous range are rounded
+        for name, convert in MAIN.InputParameterNames:
+            if convert is int and not isinstance(values[name], str):
+                values[name] = int(round(values[name]))
+
+        params = MAIN.InputParameters([values[name] for name, convert in MAIN.InputParameterNames])
+
+        for name in MAIN.OptionalParameterDefaults:
+            if name in values:
+                params[name] = values[name]
+
+        jobs.append(params)
+        runNumber += 1
+
+    return jobs
+
+#####################################################################################################################################################
+
+
+if __name__ == '__main__':
+
+    import SweepExecutor as SE
+
+    UserPath = os.getcwd() + '/'
+
+    jobs = SweepJobs(LoadSweepSpec(sys.argv[1]), UserPath)
+
+    SE.SweepExecutor(int(sys.argv[2]) if len(sys.argv) > 2 else None).Run(jobs, UserPath)
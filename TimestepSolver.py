@@ -0,0 +1,124 @@
+"""
+
+Solvers for the timestep of each volume increment
+
+Each volume increment of the magma ocean has to dump a certain amount of energy. The timestep is correct when it is
+equal to the time needed to dump that energy (time2Dump), but time2Dump can itself depend on the timestep (additional
+heating, impacts during the timestep). The solvers below find the timestep that satisfies timeStep = time2Dump(timeStep)
+to within a relative tolerance.
+
+When the energy to dump is linear in the timestep (no impacts) the timestep is found directly with LinearTimestep.
+Otherwise MAIN.py evaluates time2Dump for the timestep the solver proposes until the solver accepts it.
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+
+# Raised when no acceptable timestep can be found
+class TimestepError(ArithmeticError):
+    pass
+
+
+# Timestep when the energy to dump is Energy2Dump_fixed + HeatingRate * timeStep and the luminosity does not depend on the timestep
+def LinearTimestep(Energy2Dump_fixed, HeatingRate, Luminosity):
+
+    netLuminosity = Luminosity - HeatingRate
+
+    if netLuminosity <= 0:
+        raise TimestepError('Additional heating (%g W) is greater than the heat lost by the Moon (%g W)' % (HeatingRate, Luminosity))
+
+    return Energy2Dump_fixed / netLuminosity
+
+
+# Original iteration of iMagma: use time2Dump as the next timestep until the two agree
+class FixedPointSolver(object):
+
+    def __init__(self, tol=0.02, maxIter=100):
+
+        self.tol = tol                    # Relative tolerance between timestep and time2Dump
+        self.maxIter = maxIter            # Maximum number of time2Dump evaluations per increment
+        self.evaluations = 0              # Number of time2Dump evaluations in the current increment
+
+    # Whether MAIN.py should use LinearTimestep when the energy to dump is linear in the timestep
+    directLinear = False
+
+    # Start a new increment from the timestep of the previous increment
+    def Start(self, timeStep):
+        self.evaluations = 0
+        return timeStep
+
+    # Check a time2Dump evaluation; returns (acceptable, next timestep to try)
+    def Update(self, timeStep, time2Dump):
+
+        self.evaluations += 1
+
+        if abs(timeStep - time2Dump) <= self.tol * abs(time2Dump):
+            return True, timeStep
+
+        if self.evaluations >= self.maxIter:
+            raise TimestepError('Timestep did not converge in %d iterations (timestep %g s, time2Dump %g s)' % (self.maxIter, timeStep, time2Dump))
+
+        return False, self.NextTimestep(timeStep, time2Dump)
+
+    def NextTimestep(self, timeStep, time2Dump):
+        return time2Dump
+
+
+# Secant iteration on g(timeStep) = time2Dump(timeStep) - timeStep, kept inside a bracket of the root
+# (falls back to bisection when the secant step leaves the bracket, e.g. when impacts make time2Dump jump)
+class SecantSolver(FixedPointSolver):
+
+    directLinear = True
+
+    def Start(self, timeStep):
+
+        self.lastTimeStep = None
+        self.lastResidual = None
+        self.lo = 0.0
+        self.hi = np.inf
+
+        return FixedPointSolver.Start(self, timeStep)
+
+    def Update(self, timeStep, time2Dump):
+
+        acceptable, nextTimeStep = FixedPointSolver.Update(self, timeStep, time2Dump)
+
+        # If the bracket has shrunk below the tolerance then time2Dump jumps across the root, so take the current evaluation
+        if not acceptable and self.hi - self.lo <= self.tol * timeStep:
+            return True, timeStep
+
+        return acceptable, nextTimeStep
+
+    def NextTimestep(self, timeStep, time2Dump):
+
+        residual = time2Dump - timeStep
+
+        # Root is above the timestep if time2Dump is larger than it, otherwise below
+        if residual > 0:
+            self.lo = max(self.lo, timeStep)
+        else:
+            self.hi = min(self.hi, timeStep)
+
+        # First step of an increment is a fixed point step (same as the original iteration)
+        if self.lastResidual is None or residual == self.lastResidual:
+            nextTimeStep = time2Dump
+        else:
+            nextTimeStep = timeStep - residual * (timeStep - self.lastTimeStep) / (residual - self.lastResidual)
+
+        if not (self.lo < nextTimeStep < self.hi):
+            if np.isinf(self.hi):
+                nextTimeStep = max(time2Dump, 2 * self.lo)
+            else:
+                nextTimeStep = 0.5 * (self.lo + self.hi)
+
+        self.lastTimeStep = timeStep
+        self.lastResidual = residual
+
+        return nextTimeStep
+
+
+# Solvers that can be picked with the TimestepSolver option of run_simulation
+TimestepSolvers = {'fixedpoint': FixedPointSolver, 'secant': SecantSolver}
@@ -0,0 +1,78 @@
+"""
+
+Size of the volume of magma ocean that solidifies in each increment
+
+FixedVolumeStepper is the original scheme (the magma ocean is divided into vol_increments equal volumes).
+
+AdaptiveVolumeStepper grows or shrinks the volume of each increment from an estimate of the local error, which is
+the relative change of the tracked quantities (CMB temperature, quench/crust thickness, hole area, ellapsed time)
+over the last increment. When all of them change by much less than the tolerance the volume grows, so smooth
+stretches of the cooling are crossed in a few large increments while the start of plag crust building and bursts
+of impacts get small ones. The volume can also be cut so that an increment ends exactly on a regime boundary.
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+
+# Relative change between two values of a tracked quantity (zero if both are zero)
+def RelativeChange(newValue, oldValue):
+
+    scale = max(abs(newValue), abs(oldValue))
+
+    if scale == 0:
+        return 0.0
+
+    return (newValue - oldValue) / scale
+
+
+class FixedVolumeStepper(object):
+
+    def __init__(self, volSize):
+        self.volSize = volSize
+
+    # Volume to solidify in the next increment
+    def StepSize(self, *boundaryVolumes):
+        return self.volSize
+
+    # Adjust the volume after an increment from the relative changes of the tracked quantities
+    def Update(self, *relativeChanges):
+        pass
+
+
+class AdaptiveVolumeStepper(FixedVolumeStepper):
+
+    def __init__(self, volSize, volSize_min, volSize_max, tol, safety=0.9, maxGrowth=2.0, maxShrink=0.2):
+
+        FixedVolumeStepper.__init__(self, min(max(volSize, volSize_min), volSize_max))
+
+        self.volSize_min = volSize_min          # Smallest volume of an increment (m^3)
+        self.volSize_max = volSize_max          # Largest volume of an increment (m^3)
+        self.tol = tol                          # Largest relative change allowed in any tracked quantity per increment
+        self.safety = safety                    # Aim a bit below the tolerance so that the volume is not cut every other increment
+        self.maxGrowth = maxGrowth              # Largest factor the volume can grow by in one increment
+        self.maxShrink = maxShrink              # Smallest factor the volume can shrink by in one increment
+
+    # Volumes (m^3) left until each regime boundary (e.g. depth where plag starts to build); non-positive values are ignored
+    def StepSize(self, *boundaryVolumes):
+
+        volSize = self.volSize
+
+        for boundaryVolume in boundaryVolumes:
+            if boundaryVolume > 0 and boundaryVolume < volSize:
+                volSize = max(boundaryVolume, self.volSize_min)
+
+        return volSize
+
+    def Update(self, *relativeChanges):
+
+        errorRatio = max(abs(change) for change in relativeChanges) / self.tol
+
+        # Changes are (to first order) proportional to the volume, so scale the volume to bring the largest change to the tolerance
+        if errorRatio == 0:
+            factor = self.maxGrowth
+        else:
+            factor = min(max(self.safety / errorRatio, self.maxShrink), self.maxGrowth)
+
+        self.volSize = min(max(self.volSize * factor, self.volSize_min), self.volSize_max)
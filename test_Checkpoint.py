@@ -0,0 +1,87 @@
+"""
+
+Tests of Checkpoint.py with MAIN.run_simulation (run with python -m pytest)
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import os
+
+import MAIN
+import Checkpoint as CP
+from test_SweepExecutor import BaseValues
+
+
+def _Params(UserPath, **changes):
+
+    params = MAIN.InputParameters([UserPath, UserPath] + BaseValues)
+    params.update({'CheckpointInterval': 7, 'OutputFormat': 'csv'})
+    params.update(changes)
+
+    return params
+
+
+# Run that leaves its last checkpoint in UserPath (as a killed run would); returns the checkpoint
+def _LeaveCheckpoint(monkeypatch, params):
+
+    monkeypatch.setattr(CP, 'RemoveCheckpoint', lambda fileName: None)
+    MAIN.run_simulation(params)
+    monkeypatch.undo()
+
+    with open(params['UserPath'] + MAIN.OptionalParameterDefaults['CheckpointFile'], 'rb') as f:
+        return CP.pickle.load(f)
+
+
+# Checkpoints loaded by the runs of MAIN.run_simulation
+def _CountLoads(monkeypatch):
+
+    loaded = []
+    loadCheckpoint = CP.LoadCheckpoint
+
+    def CountedLoadCheckpoint(*args):
+        checkpoint = loadCheckpoint(*args)
+        loaded.append(checkpoint)
+        return checkpoint
+
+    monkeypatch.setattr(CP, 'LoadCheckpoint', CountedLoadCheckpoint)
+
+    return loaded
+
+
+# A run only carries on from a checkpoint with RestartFromCheckpoint, and then gives the results of a run that was never stopped
+def test_RestartFromCheckpoint(tmp_path, monkeypatch):
+
+    UserPath = str(tmp_path) + '/'
+    columns = [i for i, name in enumerate(MAIN.ScoreCardColumnNames) if name != 'Run Duration (sec)']
+
+    _LeaveCheckpoint(monkeypatch, _Params(UserPath))
+    loaded = _CountLoads(monkeypatch)
+
+    fresh = MAIN.run_simulation(_Params(UserPath))
+    assert loaded == []
+
+    _LeaveCheckpoint(monkeypatch, _Params(UserPath))
+    loaded = _CountLoads(monkeypatch)
+
+    restarted = MAIN.run_simulation(_Params(UserPath, RestartFromCheckpoint=True))
+    assert len(loaded) == 1 and loaded[0]['increment'] > 0
+    assert np.array_equal(restarted.scoreCard[columns], fresh.scoreCard[columns])
+    assert not os.path.exists(UserPath + MAIN.OptionalParameterDefaults['CheckpointFile'])
+
+
+# A checkpoint saved by another iMagma version (or for other input parameters) is not used
+def test_CheckpointOfOtherVersionIgnored(tmp_path, monkeypatch):
+
+    UserPath = str(tmp_path) + '/'
+    params = _Params(UserPath, RestartFromCheckpoint=True)
+    checkpointFile = UserPath + MAIN.OptionalParameterDefaults['CheckpointFile']
+
+    checkpoint = _LeaveCheckpoint(monkeypatch, params)
+
+    assert checkpoint['version'] == MAIN.iMagma_version
+    assert CP.LoadCheckpoint(checkpointFile, params, MAIN.iMagma_version) is not None
+    assert CP.LoadCheckpoint(checkpointFile, params, MAIN.iMagma_version + 0.01) is None
+    assert CP.LoadCheckpoint(checkpointFile, dict(params, Emissivity=0.5), MAIN.iMagma_version) is None
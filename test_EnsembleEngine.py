@@ -0,0 +1,70 @@
+"""
+
+Tests of EnsembleEngine.py against MAIN.run_simulation (run with python -m pytest)
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+
+import MAIN
+import EnsembleEngine as EE
+import TimestepSolver as TS
+from test_SweepExecutor import BaseValues
+
+# Parameter sets of one ensemble (changes to the base parameters of test_SweepExecutor.py): quench and heating on and off,
+# other numbers of increments and other physics, and a run that fails (heating greater than the heat lost by the Moon)
+EnsembleCases = [{}, \
+                 {'Emissivity': 0.5}, \
+                 {'QuenchSwitch': False}, \
+                 {'GeneralHeatingSwitch': False}, \
+                 {'QuenchSwitch': False, 'GeneralHeatingSwitch': False, 'vol_increments': 1000}, \
+                 {'MO_depth_initial': 500000.0, 'dy_viscosity_MO': 10.0, 'Max_Quench_Thickness': 1, 'HeatingRate': 1e9}, \
+                 {'HeatingRate': 1e20}]
+
+
+def _Params(changes, RunNumber):
+
+    params = MAIN.InputParameters(['./', './%d/' % RunNumber] + BaseValues)
+    params.update(changes)
+    params['RunNumber'] = RunNumber
+
+    return params
+
+
+# Result of run_simulation, or the exception it raised
+def _Run(params):
+
+    try:
+        return MAIN.run_simulation(params)
+    except (MAIN.SimulationError, TS.TimestepError, FloatingPointError) as e:
+        return e
+
+
+# Every run of an ensemble (including a failing one) gives the same scorecard and time series as run_simulation, or the same error
+def test_EnsembleMatchesRunSimulation():
+
+    paramsList = [_Params(changes, RunNumber) for RunNumber, changes in enumerate(EnsembleCases, 1)]
+    assert all(EE.SupportsEnsemble(params) for params in paramsList)
+
+    ensemble = EE.RunEnsemble(paramsList)
+
+    for params, result in zip(paramsList, ensemble):
+
+        reference = _Run(params)
+
+        if isinstance(reference, Exception):
+            assert type(result) is type(reference) and str(result) == str(reference)
+            continue
+
+        # Run Duration (sec) differs
+        columns = [i for i, name in enumerate(MAIN.ScoreCardColumnNames) if name != 'Run Duration (sec)']
+        np.testing.assert_allclose(result.scoreCard[columns], reference.scoreCard[columns], rtol=1e-12)
+
+        assert sorted(result.series) == sorted(reference.series)
+        for name in reference.series:
+            np.testing.assert_allclose(result.series[name], reference.series[name], rtol=1e-12, err_msg=name)
+
+    assert any(isinstance(result, TS.TimestepError) for result in ensemble)
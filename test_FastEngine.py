@@ -0,0 +1,133 @@
+"""
+
+Tests of FastEngine.py against the reference loop of MAIN.run_simulation (run with python -m pytest)
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import sys
+import importlib.util
+import pytest
+
+import MAIN
+import FastEngine as FE
+import TimestepSolver as TS
+from test_SweepExecutor import BaseValues
+
+# Impacts table of the same form as AlanData (time (yrs), mass flux and energy flux columns)
+ImpactTimes = np.geomspace(1, 1e7, 400)
+AlanData = np.column_stack([ImpactTimes, 1e19 * ImpactTimes**-1.2, 1e26 * ImpactTimes**-1.2])
+
+# Run settings checked (changes to the base parameters of test_SweepExecutor.py)
+NoImpactsCases = [{}, \
+                  {'QuenchSwitch': False, 'GeneralHeatingSwitch': False}, \
+                  {'GeneralHeatingSwitch': False, 'TimestepSolver': 'fixedpoint'}, \
+                  {'HeatingRate': 1e20}]
+ImpactsCases = [{'ImpactsSwitch': True}, \
+                {'ImpactsSwitch': True, 'ImpactIntegration': 'midpoint'}, \
+                {'ImpactsSwitch': True, 'KineticEnergySwitch': True, 'GeneralHeatingSwitch': False}]
+
+
+def _Params(changes, Engine):
+
+    params = MAIN.InputParameters(['./', './1/'] + BaseValues)
+    params.update(changes)
+    params['Engine'] = Engine
+
+    return params
+
+
+# Result of a run, or the exception it raised
+def _Run(params):
+
+    try:
+        return MAIN.run_simulation(params, AlanData if params['ImpactsSwitch'] else None)
+    except (MAIN.SimulationError, TS.TimestepError, FloatingPointError) as e:
+        return e
+
+
+# Same results to rtol (machine code may order floating point operations differently from Python)
+def _AssertSameRun(engine, reference, rtol=1e-12):
+
+    if isinstance(reference, Exception):
+        assert type(engine) is type(reference) and str(engine) == str(reference)
+        return
+
+    # Run Duration (sec) differs
+    columns = [i for i, name in enumerate(MAIN.ScoreCardColumnNames) if name != 'Run Duration (sec)']
+    np.testing.assert_allclose(engine.scoreCard[columns], reference.scoreCard[columns], rtol=rtol)
+
+    assert sorted(engine.series) == sorted(reference.series)
+    for name in reference.series:
+        np.testing.assert_allclose(engine.series[name], reference.series[name], rtol=rtol, err_msg=name)
+
+
+# FastEngine loaded with Numba hidden (its functions are then plain Python) and used by MAIN.run_simulation for 'jit' runs
+@pytest.fixture
+def PurePythonEngine(monkeypatch):
+
+    monkeypatch.setitem(sys.modules, 'numba', None)
+
+    spec = importlib.util.spec_from_file_location('FastEnginePurePython', FE.__file__)
+    engine = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(engine)
+
+    assert engine.numba is None
+    engine.Available = True
+
+    # Count the runs done by the engine (so a test cannot pass by running the reference loop twice)
+    coolingLoop = engine.CoolingLoop
+    engine.calls = 0
+
+    def CountedCoolingLoop(*args):
+        engine.calls += 1
+        return coolingLoop(*args)
+
+    engine.CoolingLoop = CountedCoolingLoop
+    monkeypatch.setattr(MAIN, 'FE', engine)
+
+    return engine
+
+
+# The engine (as plain Python) gives the same runs as the reference loop, with and without impacts, including failing runs
+@pytest.mark.parametrize('changes', NoImpactsCases + ImpactsCases)
+def test_PurePythonEngineMatchesReference(PurePythonEngine, changes):
+
+    reference = _Run(_Params(changes, 'reference'))
+    engine = _Run(_Params(changes, 'jit'))
+
+    assert PurePythonEngine.calls == 1
+    _AssertSameRun(engine, reference)
+
+
+# The engine compiled by Numba gives the same runs as the reference loop
+@pytest.mark.parametrize('changes', NoImpactsCases[:1] + ImpactsCases[:1])
+def test_CompiledEngineMatchesReference(changes):
+
+    pytest.importorskip('numba')
+
+    reference = _Run(_Params(changes, 'reference'))
+    engine = _Run(_Params(changes, 'jit'))
+
+    _AssertSameRun(engine, reference, rtol=1e-9)
+
+
+# A run whose engine Numba cannot compile uses the reference loop (and the engine is turned off)
+def test_CompileFailureFallsBackToReference(monkeypatch):
+
+    numba = pytest.importorskip('numba')
+
+    def FailingCoolingLoop(*args):
+        raise numba.core.errors.TypingError('cannot type CoolingLoop')
+
+    monkeypatch.setattr(FE, 'CoolingLoop', FailingCoolingLoop)
+    monkeypatch.setattr(FE, 'Available', True)
+
+    with pytest.warns(UserWarning, match='reference loop'):
+        engine = _Run(_Params({}, 'jit'))
+
+    assert FE.Available is False
+    _AssertSameRun(engine, _Run(_Params({}, 'reference')))
@@ -0,0 +1,49 @@
+"""
+
+Tests of ResultsIndex.py (run with python -m pytest)
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+
+import MAIN
+import ResultsIndex as RI
+
+
+# The same run added from two sweeps keeps a row for each sweep
+def test_SameRunInTwoSweepsKeepsBothRows(tmp_path):
+
+    scoreCard = np.arange(len(MAIN.ScoreCardColumnNames), dtype=float)
+    convergePath = str(tmp_path / 'Converge') + '/'
+    paraSearchPath = str(tmp_path / 'ParaSearch') + '/'
+
+    with RI.ResultsIndex(str(tmp_path / 'index.sqlite')) as index:
+
+        index.Add(scoreCard, convergePath + '1/')
+        index.Add(scoreCard, paraSearchPath + '1/')
+        index.Add(scoreCard, paraSearchPath + '1/')
+
+        assert len(index.ScoreCards('sweep_path = ?', (convergePath,))) == 1
+        assert len(index.ScoreCards('sweep_path = ?', (paraSearchPath,))) == 1
+        assert len(index.Query('run_hash = ?', (RI.RunHash(scoreCard),))) == 2
+
+
+# A run directory done again with other parameters replaces its row
+def test_RunDoneAgainReplacesItsRow(tmp_path):
+
+    oldScoreCard = np.arange(len(MAIN.ScoreCardColumnNames), dtype=float)
+    newScoreCard = oldScoreCard + 1.
+    sweepPath = str(tmp_path / 'sweep') + '/'
+
+    with RI.ResultsIndex(str(tmp_path / 'index.sqlite')) as index:
+
+        index.Add(oldScoreCard, sweepPath + '1/')
+        index.Add(newScoreCard, sweepPath + '1/')
+
+        rows = index.Query('sweep_path = ?', (sweepPath,))
+        assert len(rows) == 1
+        assert rows[0]['run_hash'] == RI.RunHash(newScoreCard) != RI.RunHash(oldScoreCard)
+        assert np.array_equal(index.ScoreCards('sweep_path = ?', (sweepPath,)), [newScoreCard])
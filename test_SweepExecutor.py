@@ -0,0 +1,117 @@
+"""
+
+Tests of SweepExecutor.py (run with python -m pytest)
+
+By: Viranga Perera & Alan P. Jackson
+
+"""
+
+from __future__ import division
+import numpy as np
+import os
+
+import MAIN
+import SweepExecutor as SE
+import SweepManifest as SM
+
+# Input values of a short run without impacts (MAIN.InputParameterNames after homePath and UserPath)
+BaseValues = [False, True, True, 0.00015, 1000000.0, 100000.0, 3000, 418700, 1256.1, 3e-05, 1e-06, 1000.0, 250, 1e-06, 2700, 1256.1, \
+              1.0, 10000000.0, 1.6, 1000, 1e-06, 2700, 1256.1, 10, 3000, 1, 1.0, 'AlanData_test.csv', 1, 100, 10, 10000000000.0, False, 1.0, 0.45]
+
+
+# One-run sweep in UserPath with the given Emissivity
+def _Jobs(UserPath, Emissivity):
+
+    params = MAIN.InputParameters([UserPath, UserPath + '1/'] + BaseValues)
+    params['Emissivity'] = Emissivity
+
+    return [params]
+
+
+# A sweep run again with changed parameters does the run again instead of taking the scorecard of the old parameters as done
+def test_RerunWithChangedParametersRecomputes(tmp_path):
+
+    sweepPath = str(tmp_path / 'sweep') + '/'
+    freshPath = str(tmp_path / 'fresh') + '/'
+    column = MAIN.ScoreCardColumnNames.index('Emissivity')
+    coolingTime = MAIN.ScoreCardColumnNames.index('Total Cooling Time (yrs)')
+
+    os.makedirs(sweepPath)
+    os.makedirs(freshPath)
+
+    first, = SE.SweepExecutor(1).Run(_Jobs(sweepPath, 1.0), sweepPath)
+    rerun, = SE.SweepExecutor(1).Run(_Jobs(sweepPath, 0.5), sweepPath)
+    fresh, = SE.SweepExecutor(1).Run(_Jobs(freshPath, 0.5), freshPath)
+
+    assert first.status == 0 and rerun.status == 0 and fresh.status == 0
+    assert rerun.scoreCard[column] == 0.5
+    assert rerun.scoreCard[coolingTime] == fresh.scoreCard[coolingTime]
+    assert rerun.scoreCard[coolingTime] != first.scoreCard[coolingTime]
+
+    grandScoreCard = np.genfromtxt(sweepPath + SE.GrandScoreCardName, delimiter=',', skip_header=1)
+    freshGrandScoreCard = np.genfromtxt(freshPath + SE.GrandScoreCardName, delimiter=',', skip_header=1)
+    assert grandScoreCard[column] == 0.5
+    assert grandScoreCard[coolingTime] == freshGrandScoreCard[coolingTime]
+
+
+# A sweep run again with changed parameters after its manifest was lost (or a sweep run without resume) does the run again
+# instead of taking the scorecard left by the old parameters as done
+def test_RerunWithoutManifestRecomputes(tmp_path):
+
+    sweepPath = str(tmp_path / 'sweep') + '/'
+    freshPath = str(tmp_path / 'fresh') + '/'
+    column = MAIN.ScoreCardColumnNames.index('Emissivity')
+    coolingTime = MAIN.ScoreCardColumnNames.index('Total Cooling Time (yrs)')
+
+    os.makedirs(sweepPath)
+    os.makedirs(freshPath)
+
+    first, = SE.SweepExecutor(1).Run(_Jobs(sweepPath, 1.0), sweepPath)
+    os.remove(sweepPath + SM.ManifestName)
+    rerun, = SE.SweepExecutor(1).Run(_Jobs(sweepPath, 0.5), sweepPath)
+    fresh, = SE.SweepExecutor(1).Run(_Jobs(freshPath, 0.5), freshPath)
+
+    assert first.status == 0 and rerun.status == 0
+    assert not np.isnan(rerun.wallTime)
+    assert rerun.scoreCard[column] == 0.5
+    assert rerun.scoreCard[coolingTime] == fresh.scoreCard[coolingTime]
+
+    grandScoreCard = np.genfromtxt(sweepPath + SE.GrandScoreCardName, delimiter=',', skip_header=1)
+    assert grandScoreCard[column] == 0.5
+
+
+# A sweep run again with the same parameters after its manifest was lost takes the scorecards left in its run directories as done
+def test_RerunWithoutManifestKeepsMatchingScoreCard(tmp_path):
+
+    sweepPath = str(tmp_path / 'sweep') + '/'
+    os.makedirs(sweepPath)
+
+    first, = SE.SweepExecutor(1).Run(_Jobs(sweepPath, 1.0), sweepPath)
+    os.remove(sweepPath + SM.ManifestName)
+    rerun, = SE.SweepExecutor(1).Run(_Jobs(sweepPath, 1.0), sweepPath)
+
+    assert rerun.status == 0 and np.isnan(rerun.wallTime)
+    assert np.array_equal(rerun.scoreCard, np.genfromtxt(sweepPath + '1/scoreCard.csv', delimiter=','))
+
+
+# Runs finishing out of order are written to GrandScoreCard.csv in run number order when the sweep ends
+def test_GrandScoreCardInRunNumberOrder(tmp_path):
+
+    sweepPath = str(tmp_path / 'sweep') + '/'
+    os.makedirs(sweepPath)
+
+    jobs = []
+    for RunNumber, Emissivity in [(2, 0.5), (1, 1.0)]:
+        params = MAIN.InputParameters([sweepPath, sweepPath + '%d/' % RunNumber] + BaseValues)
+        params.update({'Emissivity': Emissivity, 'RunNumber': RunNumber})
+        jobs.append(params)
+
+    results = SE.SweepExecutor(1).Run(jobs, sweepPath)
+
+    liveScoreCard = np.genfromtxt(sweepPath + SE.LiveScoreCardName, delimiter=',', skip_header=1)
+    grandScoreCard = np.genfromtxt(sweepPath + SE.GrandScoreCardName, delimiter=',', skip_header=1)
+    column = MAIN.ScoreCardColumnNames.index('Emissivity')
+
+    assert len(liveScoreCard) == len(results) == 2
+    assert list(grandScoreCard[:, column]) == [1.0, 0.5]
+    assert not [name for name in os.listdir(sweepPath) if name.endswith('.tmp')]